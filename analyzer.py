@@ -1,9 +1,23 @@
 import cast_upgrade_1_6_23
-from cast.analysers import ua, log, CustomObject, create_link, Bookmark
+from cast.analysers import ua, log
 from cast.application import open_source_file
 import os, traceback
 from collections import defaultdict
-from symbols import Library, Module
+from easytrieve_parser import is_root
+from symbols import Library, Module, MemberFile
+from lexer import EasyTrieveLexer
+from ast_cache import AstCache
+from settings import get_setting
+from parallel import analyse_modules
+from instrumentation import Instrumentation, count_tree, get_peak_memory
+from kb_writer import KbWriter, CastBackend, LocalBackend
+from scheduling import get_scheduler, default_scheduler, measure_size
+from budget import Budget, BudgetExceeded
+import sniffer
+import incremental
+import ebcdic
+import mapping
+import light_parser
 
 
 class EaysytrieveExtension(ua.Extension):
@@ -14,6 +28,68 @@ class EaysytrieveExtension(ua.Extension):
         # main container of symbols
         self.library = Library()
         
+        # tokenisation back ends, see lexer
+        lexer = EasyTrieveLexer()
+        if lexer.backend == 'splitter':
+            log.info('Lexer back end : splitter, splitter : ' + lexer.splitter)
+        else:
+            log.info('Lexer back end : ' + lexer.backend)
+            if get_setting('splitter', None) is not None:
+                log.warning('EASYTRIEVE_SPLITTER is only used by the splitter lexer back end, see EASYTRIEVE_LEXER')
+        
+        # writes in knowledge base are buffered, 'local' back end writes nothing 
+        # and is used for measures
+        backend = LocalBackend() if get_setting('kb_backend', 'cast') == 'local' else CastBackend()
+        self.library.kb_writer = KbWriter(backend, get_setting('kb_batch_size', 1000))
+        
+        # parse once : the second pass reuses the ASTs of the first pass
+        self.ast_cache = None
+        if get_setting('parse_once', True):
+            # budget in Mb, spilled on disk after
+            self.ast_cache = AstCache(get_setting('ast_memory_budget', 512) * 1024 * 1024,
+                                      get_setting('ast_spill_directory', None))
+        
+        # number of processes for the second pass, 1 for serial 
+        self.workers = get_setting('workers', 1)
+        
+        # incremental analysis : unchanged files are replayed from a manifest
+        self.manifest = None
+        manifest_path = get_setting('manifest', None)
+        if manifest_path:
+            self.manifest = incremental.Manifest(manifest_path)
+        # path -> content digest
+        self.digests = {}
+        # path -> record of previous analysis of unchanged files
+        self.records = {}
+        
+        # timings per file and per phase
+        self.instrumentation = Instrumentation()
+        # .json or .csv file receiving the timings 
+        self.timing_report = get_setting('timing_report', None)
+        # number of slowest files logged
+        self.slowest_files = get_setting('slowest_files', 10)
+        
+        # streaming : modules are reduced to stubs once saved, bounding memory
+        self.streaming = get_setting('streaming', False)
+        
+        # order of analysis of modules by workers : library, largest or cost
+        self.scheduler = get_scheduler(get_setting('scheduler', default_scheduler))
+        # path -> time spent in first pass
+        self.first_pass_times = {}
+        
+        # limits of parsing of one file, beyond only the declarations are kept
+        self.budget = Budget(get_setting('max_parse_seconds', 300.0), 
+                             get_setting('max_tokens', 5000000), 
+                             get_setting('max_nodes', 500000))
+        
+        # kind of content -> number of files or members, see sniffer
+        self.contents = defaultdict(int)
+        
+        # files left in EBCDIC, detected once per directory
+        self.detector = None
+        if get_setting('detect_ebcdic', True):
+            self.detector = ebcdic.Detector(get_setting('ebcdic_code_page', ebcdic.code_pages[0]))
+        
     def start_analysis(self):
         try:
             options = cast.analysers.get_ua_options() #@UndefinedVariable
@@ -26,6 +102,9 @@ class EaysytrieveExtension(ua.Extension):
         except Exception as e:
             pass # unit test
         
+        if self.manifest is not None:
+            self.manifest.load()
+        
     def start_file(self, _file):
         if not self.active:
             return
@@ -36,24 +115,335 @@ class EaysytrieveExtension(ua.Extension):
             return
 
         module = Module(_file.get_path(), _file=_file)
+        path = module.get_path()
+        
+        try:
+            with self.instrumentation.phase(path, 'sniff'):
+                if self.detector is not None:
+                    module.code_page = self.detector.get_code_page(path)
+                kind = sniffer.sniff(module.get_text_prefix(sniffer.prefix_size))
+        except:
+            log.info('Issue during reading of ' + str(path) + traceback.format_exc())
+            return
+        self.contents[kind] += 1
+        
+        if kind in sniffer.easytrieve:
+            self.first_pass(module)
+        elif kind == sniffer.IEBUPDTE:
+            self.split(module)
+        else:
+            log.info('Skipping ' + str(path) + ', content is ' + kind)
+    
+    def split(self, module):
+        """
+        First pass of the members of an IEBUPDTE input.
+        """
+        path = module.get_path()
+        try:
+            with self.instrumentation.phase(path, 'get_text'):
+                text = module.get_text()
+        except:
+            log.info('Issue during reading of ' + str(path) + traceback.format_exc())
+            return
+        
+        members = []
+        for member in sniffer.split_members(text):
+            kind = sniffer.sniff(member.text[:sniffer.prefix_size])
+            self.contents[kind] += 1
+            member_path = path + '(' + member.name + ')'
+            if kind in sniffer.easytrieve:
+                members.append(Module(member_path, module.get_file(), member.text, member.name, member.first_line))
+            else:
+                log.info('Skipping ' + member_path + ', content is ' + kind)
+        
+        if members:
+            # file properties are saved once, see save_member_file
+            member_file = MemberFile(module.get_file(), members[-1].get_path())
+            for member in members:
+                member.member_file = member_file
+                self.first_pass(member)
+    
+    def first_pass(self, module):
+        """
+        Add the module to the library and parse it, or scan its declarations.
+        """
         self.library.add_module(module)
-        # create global symbols
-        module.light_parse()
+        path = module.get_path()
+        timing = self.instrumentation
+        
+        if self.manifest is not None:
+            with timing.phase(path, 'digest'):
+                self.digests[path] = module.get_content_digest()
+            record = self.manifest.get_record(path, self.digests[path])
+            if record is not None:
+                # unchanged : no need to parse
+                self.records[path] = record
+                return
+        
+        try:
+            with timing.phase(path, 'get_text'):
+                text = module.get_lines()
+        except:
+            log.info('Issue during reading of ' + str(path) + traceback.format_exc())
+            return
+        
+        if self.ast_cache is not None:
+            # parsed once, the tree is reused by second pass
+            with timing.phase(path, 'parse'):
+                try:
+                    ast = module.parse(text, self.budget)
+                except BudgetExceeded as exception:
+                    # declarations only, in second pass
+                    module.degraded = str(exception)
+                    ast = None
+                if is_root(ast):
+                    self.ast_cache.put(path, ast)
+            timing.add(path, 'parse', **count_tree(ast))
+        else:
+            # only the declarations are needed for now 
+            with timing.phase(path, 'light_parse'):
+                module.light_parse(text)
+        
+        # measured while lines were parsed, see mapping.MappedLines
+        module.size = measure_size(text)
         module.clean()
 
     def end_analysis(self):
         if not self.active:
             return
         
-        # second pass
         for module in self.library.get_modules():
+            self.first_pass_times[module.get_path()] = self.instrumentation.get_total(module.get_path())
+        
+        # second pass
+        if self.workers > 1:
+            self.parallel_second_pass()
+        else:
+            self.serial_second_pass()
+        
+        degraded = [module for module in self.library.get_modules() if module.degraded]
+        if degraded:
+            log.warning('Files too costly to parse, only their declarations have been analysed : ' + 
+                        ', '.join(str(module.get_path()) + ' (' + module.degraded + ')' for module in degraded))
+        log.info('Degraded files : ' + str(len(degraded)))
+        log.info('Content of files : ' + str(dict(self.contents)))
+        if self.detector is not None:
+            log.info('Encodings of files : ' + str(dict(self.detector.stats)))
+        for encoding, decoded_bytes in mapping.decoded_bytes.items():
+            log.info('Decoding of %s : %.1f Mb, %.0f Mb/s' % (encoding, decoded_bytes / (1024 * 1024), 
+                                                             decoded_bytes / (1024 * 1024) / max(mapping.decoding_seconds[encoding], 1e-9)))
+        log.info('Pattern matching : ' + str(dict(light_parser.match_stats)))
+        
+        writer = self.library.kb_writer
+        writer.flush()
+        log.info('Knowledge base writes : ' + str(dict(writer.stats)) + ' %.0f writes/s' % writer.get_throughput())
+        
+        if self.ast_cache is not None:
+            log.info('Parsed trees reused : ' + str(dict(self.ast_cache.stats)))
+            self.ast_cache.close()
+        
+        if self.manifest is not None:
+            log.info('Incremental analysis : ' + str(dict(self.manifest.stats)))
+            self.manifest.save()
+        
+        peak_memory = get_peak_memory()
+        if peak_memory is not None:
+            log.info('Peak memory : ' + str(peak_memory // (1024 * 1024)) + ' Mb')
+        
+        self.instrumentation.log_slowest(self.slowest_files)
+        if self.timing_report:
+            log.info('Writing timings in ' + self.timing_report)
+            self.instrumentation.save_report(self.timing_report)
+
+    def serial_second_pass(self, modules=None):
+        """
+        :param modules: modules to analyse, all the modules of library by default
+        """
+        if modules is None:
+            modules = self.library.get_modules()
+        
+        # library order : a CALL is linked only to an already saved module
+        for module in modules:
+            
+            record = self.get_replayable_record(module)
+            if record is not None:
+                self.replay(module, record)
+                self.save_member_file(module)
+                continue
+            
             try:
                 log.info('Scanning ' + str(module.get_path()))
-                module.fully_parse()
-                module.resolve()
-                module.save()
-                module.save_links()
+                path = module.get_path()
+                timing = self.instrumentation
+                
+                ast = None
+                if self.ast_cache is not None:
+                    with timing.phase(path, 'parse'):
+                        ast = self.ast_cache.pop(path)
+                text = None
+                if ast is None:
+                    with timing.phase(path, 'get_text'):
+                        text = module.get_lines()
+                with timing.phase(path, 'parse'):
+                    module.fully_parse(ast, text, self.budget)
+                if ast is None:
+                    # tree has not been counted in first pass
+                    timing.add(path, 'parse', **count_tree(module.get_ast()))
+                
+                with timing.phase(path, 'resolve'):
+                    module.resolve()
+                self.save(module)
+                with timing.phase(path, 'save_links'):
+                    links = module.collect_links()
+                self.save_links(module, links)
                 module.clean()
             except:
                 log.warning('Issue during scan of ' + str(module.get_path()) + traceback.format_exc())
+            
+            self.save_member_file(module)
+            self.log_cost(module)
+            if self.streaming:
+                module.release()
+
+    def parallel_second_pass(self):
+        """
+        Parsing and resolution are done by a pool of processes, saving is done here.
+        """
+        log.info('Second pass with ' + str(self.workers) + ' workers')
+        
+        modules = self.library.get_modules()
+        records = [self.get_replayable_record(module) for module in modules]
+        
+        analysed = [module for module, record in zip(modules, records) if record is None]
+        results = analyse_modules(self.library, 
+                                  self.workers, 
+                                  self.ast_cache, 
+                                  analysed,
+                                  self.instrumentation,
+                                  self.scheduler.order(analysed),
+                                  self.budget)
+        
+        # saved in library order, as in serial 
+        for position, (module, record) in enumerate(zip(modules, records)):
+            
+            if record is not None:
+                self.replay(module, record)
+                self.save_member_file(module)
+                continue
+            
+            try:
+                _, links, error = next(results)
+            except StopIteration:
+                # a worker has died
+                log.warning('Pool of workers is broken, remaining files are analysed serially')
+                self.serial_second_pass(modules[position:])
+                return
+            except:
+                log.warning('Issue during second pass, remaining files are analysed serially' + traceback.format_exc())
+                self.serial_second_pass(modules[position:])
+                return
+            log.info('Scanning ' + str(module.get_path()))
+            if error:
+                log.warning('Issue during scan of ' + str(module.get_path()) + error)
+            else:
+                try:
+                    self.save(module)
+                    self.save_links(module, links)
+                    module.clean()
+                except:
+                    log.warning('Issue during scan of ' + str(module.get_path()) + traceback.format_exc())
+            
+            self.save_member_file(module)
+            self.log_cost(module)
+            if self.streaming:
+                module.release()
+
+    def save(self, module):
+        """
+        Save the objects of a module.
+        """
+        path = module.get_path()
+        with self.instrumentation.phase(path, 'save'):
+            module.save()
+            self.library.kb_writer.flush()
+        self.instrumentation.add(path, 'save', 
+                                 objects=sum(module.rpg_symbol_stats.values()), 
+                                 links=module.created_links)
+    
+    def save_links(self, module, links):
+        """
+        Save the links of a module and record it for incremental analysis.
+        """
+        path = module.get_path()
+        created_links = module.created_links
+        with self.instrumentation.phase(path, 'save_links'):
+            module.create_links(links)
+            self.library.kb_writer.flush()
+            self.record(module, links)
+        self.instrumentation.add(path, 'save_links', links=module.created_links - created_links)
+
+    def save_member_file(self, module):
+        """
+        Save the file properties of an IEBUPDTE input after its last member.
+        """
+        member_file = module.member_file
+        if member_file is None or member_file.last_member_path != module.get_path():
+            return
+        
+        try:
+            member_file.save(self.library.kb_writer)
+            self.library.kb_writer.flush()
+        except:
+            log.warning('Issue during save of ' + str(module.get_path()) + traceback.format_exc())
+
+    def log_cost(self, module):
+        """
+        Log predicted and actual cost of the second pass of a module, for 
+        tuning the scheduler.
+        """
+        path = module.get_path()
+        actual = self.instrumentation.get_total(path) - self.first_pass_times.get(path, 0)
+        log.info('Cost of ' + str(path) + ' : predicted %g, actual %.3fs' % (self.scheduler.predict_cost(module.size), actual))
+    
+    def get_replayable_record(self, module):
+        """
+        Record of previous analysis when module can be replayed, None otherwise.
+        """
+        record = self.records.get(module.get_path())
+        if record is None:
+            return None
+        
+        if not incremental.is_valid(record, module, self.library):
+            # a called program has been added, removed or renamed
+            self.manifest.stats['invalidated'] += 1
+            del self.records[module.get_path()]
+            return None
+        
+        return record
+
+    def replay(self, module, record):
+        
+        try:
+            log.info('Replaying ' + str(module.get_path()))
+            with self.instrumentation.phase(module.get_path(), 'replay'):
+                incremental.replay(module, record, self.library)
+                self.library.kb_writer.flush()
+            self.manifest.set_record(module.get_path(), record)
+            self.manifest.stats['replayed'] += 1
+        except:
+            log.warning('Issue during replay of ' + str(module.get_path()) + traceback.format_exc())
+
+    def record(self, module, links):
+        
+        if self.manifest is None:
+            return
+        
+        if module.degraded:
+            # limits depend on the run, analysed again next time
+            self.manifest.stats['degraded'] += 1
+            return
+        
+        self.manifest.set_record(module.get_path(), 
+                                 incremental.record_module(module, self.digests[module.get_path()], links))
+        self.manifest.stats['analysed'] += 1
 
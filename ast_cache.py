@@ -0,0 +1,125 @@
+import os, pickle, shutil, tempfile, traceback, zlib
+from collections import defaultdict
+from cast.analysers import log
+
+
+class AstCache:
+    """
+    Keeps the ASTs produced by the first pass so that the second pass does not
+    have to read and parse the files again.
+    
+    ASTs are stored pickled and compressed. Once the memory budget is reached, 
+    they are spilled into a temporary directory.
+    """
+    def __init__(self, memory_budget, spill_directory=None):
+        """
+        :param memory_budget: int, maximal size in bytes of the ASTs kept in memory
+        :param spill_directory: str, where to create the spill directory, system temp by default
+        """
+        self.memory_budget = memory_budget
+        self.spill_directory = spill_directory
+        
+        # key -> compressed pickle
+        self.__in_memory = {}
+        # key -> spilled file path
+        self.__on_disk = {}
+        self.__temporary_directory = None
+        
+        self.memory_size = 0
+        self.stats = defaultdict(int)
+    
+    def put(self, key, ast):
+        """
+        Store an AST.
+        
+        Returns False when the AST could not be stored, the caller will then
+        have to parse again.
+        """
+        try:
+            data = zlib.compress(pickle.dumps(ast, pickle.HIGHEST_PROTOCOL), 1)
+        except:
+            log.info("Cannot keep parsed tree of " + str(key) + ": " + str(traceback.format_exc()))
+            self.stats['rejected'] += 1
+            return False
+        
+        self.discard(key)
+        
+        if self.memory_size + len(data) <= self.memory_budget:
+            self.__in_memory[key] = data
+            self.memory_size += len(data)
+            self.stats['in memory'] += 1
+        else:
+            path = os.path.join(self.__get_temporary_directory(), '%d.ast' % len(self.__on_disk))
+            with open(path, 'wb') as f:
+                f.write(data)
+            self.__on_disk[key] = path
+            self.stats['spilled'] += 1
+            self.stats['spilled bytes'] += len(data)
+        
+        return True
+    
+    def pop(self, key):
+        """
+        Get and forget an AST.
+        
+        Returns None when there is no AST for key.
+        """
+        return load_ast(self.pop_data(key))
+    
+    def pop_data(self, key):
+        """
+        Get and forget an AST in its stored form, see load_ast.
+        
+        Returns None when there is no AST for key.
+        """
+        data = None
+        if key in self.__in_memory:
+            data = self.__in_memory.pop(key)
+            self.memory_size -= len(data)
+        elif key in self.__on_disk:
+            path = self.__on_disk.pop(key)
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.remove(path)
+        
+        return data
+    
+    def discard(self, key):
+        """
+        Forget an AST if any.
+        """
+        if key in self.__in_memory:
+            self.memory_size -= len(self.__in_memory.pop(key))
+        elif key in self.__on_disk:
+            os.remove(self.__on_disk.pop(key))
+    
+    def __contains__(self, key):
+        
+        return key in self.__in_memory or key in self.__on_disk
+    
+    def close(self):
+        """
+        Forget everything and remove spilled files.
+        """
+        self.__in_memory = {}
+        self.__on_disk = {}
+        self.memory_size = 0
+        if self.__temporary_directory:
+            shutil.rmtree(self.__temporary_directory, ignore_errors=True)
+            self.__temporary_directory = None
+    
+    def __get_temporary_directory(self):
+        
+        if not self.__temporary_directory:
+            self.__temporary_directory = tempfile.mkdtemp(prefix='easytrieve_ast_', dir=self.spill_directory)
+        return self.__temporary_directory
+
+
+def load_ast(data):
+    """
+    AST from its stored form.
+    """
+    if data is None:
+        return None
+    
+    return pickle.loads(zlib.decompress(data))
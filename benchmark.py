@@ -0,0 +1,561 @@
+"""
+Benchmarks of the analysis phases.
+
+Usage : 
+
+    python benchmark.py declarations|dispatch|ebcdic|fused|grammar|kb_writer|lexer|mapping|normalise|parser|splitter|spans|sql|tokens|whitespace [directory]
+
+directory defaults to tests/IBM.sample, a synthetic multi-megabyte program is 
+also measured.
+"""
+import os, sys, glob, functools, itertools, time, tempfile, tracemalloc
+from unittest import mock
+from easytrieve_parser import parse
+import light_parser
+from lexer import EasyTrieveLexer
+from light_parser.splitter import splitters
+from declarations import scan_declarations
+from normaliser import normalise
+from mapping import MappedLines
+import ebcdic
+from kb_writer import KbWriter, LocalBackend
+from symbols import Library, Module
+
+
+def load_corpus(directory):
+    """
+    Texts of the files of a directory, by path.
+    """
+    result = {}
+    for path in sorted(glob.glob(os.path.join(directory, '**', '*'), recursive=True)):
+        if os.path.isfile(path):
+            with open(path, encoding='latin-1') as f:
+                result[path] = f.read()
+    return result
+
+
+def synthetic_text(texts, size):
+    """
+    A program of at least size characters made of the given programs.
+    """
+    parts = []
+    length = 0
+    while length < size:
+        for text in texts:
+            if text.startswith('MACRO'):
+                continue
+            parts.append(text)
+            length += len(text)
+    return '\n'.join(parts)
+
+
+def measure(function, texts):
+    """
+    Seconds taken by function on all texts.
+    """
+    start = time.perf_counter()
+    for text in texts:
+        function(text)
+    return time.perf_counter() - start
+
+
+def clear_grammars():
+    """
+    Forget the grammar tables and possible texts cached by light_parser, so 
+    that a patched run does not share them with the next one.
+    """
+    light_parser._grammars.clear()
+    light_parser._possible_texts.clear()
+
+
+def benchmark_declarations(corpus):
+    """
+    Declaration scanning versus full parsing.
+    """
+    def full_parse(text):
+        for _ in parse(text):
+            pass
+    
+    print('declarations : scanning versus full parsing')
+    synthetic = synthetic_text(corpus.values(), 4 * 1024 * 1024)
+    for name, texts in [('corpus', list(corpus.values())), ('synthetic', [synthetic])]:
+        size = sum(len(text) for text in texts)
+        parsing = measure(full_parse, texts)
+        scanning = measure(scan_declarations, texts)
+        print('  %-10s %8d Kb  parse %7.3fs  scan %7.3fs  x%.0f' % (name, size // 1024, parsing, scanning, parsing / scanning))
+
+
+def benchmark_lexer(corpus):
+    """
+    Lexer back ends : Splitter versus compiled regular expression.
+    """
+    def tokenizer(backend, splitter=None):
+        lexer = EasyTrieveLexer()
+        lexer.backend = backend
+        lexer.splitter = splitter or lexer.splitter
+        def tokenize(text):
+            for _ in lexer.get_tokens(text):
+                pass
+        return tokenize
+    
+    print('lexer : splitter (python, regex) versus regex back end')
+    synthetic = synthetic_text(corpus.values(), 4 * 1024 * 1024)
+    for name, texts in [('corpus', list(corpus.values())), ('synthetic', [synthetic])]:
+        size = sum(len(text) for text in texts)
+        python = measure(tokenizer('splitter', 'python'), texts)
+        splitter = measure(tokenizer('splitter', 'regex'), texts)
+        regex = measure(tokenizer('regex'), texts)
+        print('  %-10s %8d Kb  splitter python %7.3fs  splitter regex %7.3fs  regex %7.3fs  x%.1f' % 
+              (name, size // 1024, python, splitter, regex, python / regex))
+
+
+def benchmark_parser(corpus):
+    """
+    Parsing with compiled patterns versus patterns interpreted by 
+    Node.do_match.
+    """
+    def full_parse(text):
+        for _ in parse(text):
+            pass
+    
+    def interpreted(pattern):
+        return functools.partial(light_parser.Node.do_match, pattern)
+    
+    print('parser : compiled versus interpreted patterns')
+    synthetic = synthetic_text(corpus.values(), 4 * 1024 * 1024)
+    for name, texts in [('corpus', list(corpus.values())), ('synthetic', [synthetic])]:
+        size = sum(len(text) for text in texts)
+        with mock.patch.object(light_parser, 'get_matcher', interpreted):
+            interpreting = measure(full_parse, texts)
+        compiled = measure(full_parse, texts)
+        print('  %-10s %8d Kb  interpreted %7.3fs  compiled %7.3fs  x%.2f' % 
+              (name, size // 1024, interpreting, compiled, interpreting / compiled))
+
+
+def benchmark_splitter(corpus):
+    """
+    Splitter implementations on the lines of the corpus.
+    """
+    def splitter(name):
+        instance = splitters[name](["'", '.'])
+        def split(text):
+            for line in text.split('\n'):
+                instance.split(line)
+        return split
+    
+    print('splitter : ' + ', '.join(splitters))
+    synthetic = synthetic_text(corpus.values(), 4 * 1024 * 1024)
+    for name, texts in [('corpus', list(corpus.values())), ('synthetic', [synthetic])]:
+        size = sum(len(text) for text in texts)
+        times = [(backend, measure(splitter(backend), texts)) for backend in splitters]
+        print('  %-10s %8d Kb  ' % (name, size // 1024) + '  '.join('%s %7.3fs' % time for time in times))
+
+
+def benchmark_spans(corpus):
+    """
+    Allocations of the tokens of the lexer : blanks created from spans 
+    versus blanks with their text.
+    """
+    def allocate(text):
+        tracemalloc.start()
+        blocks = sys.getallocatedblocks()
+        tokens = list(EasyTrieveLexer().get_tokens(text))
+        spans = sys.getallocatedblocks() - blocks, tracemalloc.get_traced_memory()[0]
+        for token in tokens:
+            token.lower_text
+        texts = sys.getallocatedblocks() - blocks, tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return len(tokens), spans, texts
+    
+    print('spans : allocated blocks and bytes of the tokens')
+    synthetic = synthetic_text(corpus.values(), 4 * 1024 * 1024)
+    for name, text in [('corpus', '\n'.join(corpus.values())), ('synthetic', synthetic)]:
+        count, (span_blocks, span_bytes), (text_blocks, text_bytes) = allocate(text)
+        print('  %-10s %8d tokens  spans %8d blocks %6d Kb  texts %8d blocks %6d Kb  -%.0f%% blocks' % 
+              (name, count, span_blocks, span_bytes // 1024, text_blocks, text_bytes // 1024, 100 - 100.0 * span_blocks / text_blocks))
+
+
+class _DictToken:
+    """
+    Token as it was before slots : attributes in a dictionary, texts copied 
+    per token.
+    """
+    def __init__(self, token):
+        
+        text = ''.join(list(token.text))
+        self.type = token.type
+        self.text = text
+        self.begin_line = token.begin_line
+        self.begin_column = token.begin_column
+        self.end_line = token.end_line
+        self.end_column = token.end_column
+        self._is_whitespace = token._is_whitespace
+        self._is_comment = token._is_comment
+        self.lower_text = text.lower() if text else None
+        self.case_sensitive = token.case_sensitive
+
+
+def benchmark_tokens(corpus):
+    """
+    Bytes per token with texts accessed : slotted tokens sharing the texts of 
+    words versus tokens with a dictionary.
+    
+    Also measures the ints of positions given as begin and end offsets in 
+    the file, computed with an index of the offsets of line starts.
+    """
+    def get_offsets(text, tokens):
+        line_starts = [0]
+        line_starts.extend(itertools.accumulate(len(line) + 1 for line in text.split('\n')))
+        return [(line_starts[token.begin_line - 1] + token.begin_column - 1, 
+                 line_starts[token.end_line - 1] + token.end_column) for token in tokens]
+    
+    def allocate(create):
+        tracemalloc.start()
+        tokens = create()
+        for token in tokens:
+            token.lower_text
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return len(tokens), size
+    
+    print('tokens : bytes per token')
+    synthetic = synthetic_text(corpus.values(), 4 * 1024 * 1024)
+    for name, text in [('corpus', '\n'.join(corpus.values())), ('synthetic', synthetic)]:
+        tokens = list(EasyTrieveLexer().get_tokens(text))
+        for token in tokens:
+            token.lower_text
+        count, dict_size = allocate(lambda: [_DictToken(token) for token in tokens])
+        del tokens
+        count, slots_size = allocate(lambda: list(EasyTrieveLexer().get_tokens(text)))
+        print('  %-10s %8d tokens  dict %6.1f bytes  slots %6.1f bytes  -%.0f%%' % 
+              (name, count, dict_size / count, slots_size / count, 100 - 100.0 * slots_size / dict_size))
+        
+        # 2 slots instead of 4, but offsets are not small ints
+        tokens = list(EasyTrieveLexer().get_tokens(text))
+        tracemalloc.start()
+        offsets = get_offsets(text, tokens)
+        pairs_size = len(offsets) * sys.getsizeof((0, 0)) + sys.getsizeof(offsets)
+        offsets_size = tracemalloc.get_traced_memory()[0] - pairs_size
+        tracemalloc.stop()
+        print('  %-10s offsets ints %6.1f bytes, slots saved %d bytes' % 
+              ('', offsets_size / count, 2 * 8))
+
+
+def benchmark_whitespace(corpus):
+    """
+    Tokens per file and parsing time with and without whitespace tokens.
+    """
+    def count_tokens(text):
+        return sum(1 for _ in EasyTrieveLexer().get_tokens(text))
+    
+    def full_parse(text):
+        for _ in parse(text):
+            pass
+    
+    print('whitespace : tokens per file and parsing with and without whitespace tokens')
+    synthetic = synthetic_text(corpus.values(), 4 * 1024 * 1024)
+    setting = os.environ.get('EASYTRIEVE_WHITESPACE_TOKENS')
+    try:
+        for name, texts in [('corpus', list(corpus.values())), ('synthetic', [synthetic])]:
+            results = []
+            for whitespace in ['1', '0']:
+                # read by the lexers created by parse
+                os.environ['EASYTRIEVE_WHITESPACE_TOKENS'] = whitespace
+                results.append((sum(count_tokens(text) for text in texts) // len(texts), measure(full_parse, texts)))
+            (tokens, seconds), (dropped_tokens, dropped_seconds) = results
+            print('  %-10s  tokens/file %8d -> %8d  parse %7.3fs -> %7.3fs  x%.2f' % 
+                  (name, tokens, dropped_tokens, seconds, dropped_seconds, seconds / dropped_seconds))
+    finally:
+        if setting is None:
+            del os.environ['EASYTRIEVE_WHITESPACE_TOKENS']
+        else:
+            os.environ['EASYTRIEVE_WHITESPACE_TOKENS'] = setting
+
+
+def benchmark_mapping(corpus):
+    """
+    Peak memory of the tokenisation of a large file : text read then split 
+    versus lines of the file mapped in memory.
+    """
+    def peak(read):
+        tracemalloc.start()
+        tokens = list(EasyTrieveLexer().get_tokens(read()))
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return len(tokens), current, peak
+    
+    def read_text():
+        with open(path, encoding='latin-1') as f:
+            return f.read()
+    
+    print('mapping : peak memory of tokenisation of a file, read versus mapped')
+    synthetic = synthetic_text(corpus.values(), 16 * 1024 * 1024)
+    with tempfile.TemporaryDirectory() as directory:
+        for encoding in ['latin-1', 'cp037']:
+            path = os.path.join(directory, 'synthetic.ezt')
+            with open(path, 'wb') as f:
+                f.write(synthetic.encode(encoding, errors='replace'))
+            
+            results = [('mapped', peak(lambda: MappedLines(path, encoding)))]
+            if encoding == 'latin-1':
+                results.insert(0, ('read', peak(read_text)))
+            for name, (count, tokens, maximum) in results:
+                print('  %-8s %-6s %6d Kb  %8d tokens %6d Mb  peak %6d Mb  x%.2f' % 
+                      (encoding, name, len(synthetic) // 1024, count, tokens // (1024 * 1024), maximum // (1024 * 1024), maximum / tokens))
+
+
+def benchmark_normalise(corpus):
+    """
+    Tokens per file and parsing time without and with normalisation, on the 
+    corpus and on the corpus with sequence numbers in columns 73 to 80.
+    """
+    def count_tokens(text):
+        return sum(1 for _ in EasyTrieveLexer().get_tokens(text))
+    
+    def full_parse(text):
+        for _ in parse(text):
+            pass
+    
+    def normalised_parse(text):
+        full_parse(normalise(text))
+    
+    def numbered(text):
+        return '\n'.join(line.ljust(72) + '%08d' % (10 * number) if len(line) <= 72 else line
+                         for number, line in enumerate(text.split('\n'), start=1))
+    
+    print('normalise : tokens per file and parsing without and with normalisation')
+    texts = [text for text in corpus.values() if not text.startswith('MACRO')]
+    for name, texts in [('corpus', texts), ('numbered', [numbered(text) for text in texts])]:
+        tokens = sum(count_tokens(text) for text in texts) // len(texts)
+        normalised_tokens = sum(count_tokens(normalise(text)) for text in texts) // len(texts)
+        seconds = measure(full_parse, texts)
+        normalised_seconds = measure(normalised_parse, texts)
+        print('  %-10s  tokens/file %8d -> %8d  parse %7.3fs -> %7.3fs  x%.2f' % 
+              (name, tokens, normalised_tokens, seconds, normalised_seconds, seconds / normalised_seconds))
+
+
+def benchmark_sql(corpus):
+    """
+    Lexer back ends on a program made of one SQL block of growing size : 
+    both join the fragments once per block, time grows linearly.
+    """
+    def tokenizer(backend):
+        lexer = EasyTrieveLexer()
+        lexer.backend = backend
+        lexer.splitter = 'regex'
+        def tokenize(text):
+            for _ in lexer.get_tokens(text):
+                pass
+        return tokenize
+    
+    print('sql : one SQL block, splitter versus regex back end')
+    for lines in [1000, 10000, 100000]:
+        text = 'JOB INPUT NULL\n SQL SELECT COL1, COL2, COL3 +\n' + '     FROM TABLE1 WHERE COL1 = :FIELD1 +\n' * lines + '     INTO :FIELD1\n'
+        split = measure(tokenizer('splitter'), [text])
+        scanned = measure(tokenizer('regex'), [text])
+        print('  %8d lines  %8d Kb  splitter %7.3fs  regex %7.3fs  x%.1f' % 
+              (lines, len(text) // 1024, split, scanned, split / scanned))
+
+
+class SourceFile:
+    """
+    Stands for the file given by the analyser.
+    """
+    def __init__(self, path):
+        self.path = path
+    
+    def get_path(self):
+        return self.path
+    
+    def save_property(self, name, value):
+        pass
+
+
+def benchmark_dispatch(corpus):
+    """
+    Pattern attempts per token and parsing time, with and without the index 
+    of statements beginning with Any() on their second token.
+    """
+    def count_attempts(texts):
+        attempts = 0
+        _match = light_parser.Node._match
+        def counting_match(*args, **kwargs):
+            nonlocal attempts
+            attempts += 1
+            return _match(*args, **kwargs)
+        
+        tokens = sum(1 for text in texts for _ in EasyTrieveLexer().get_tokens(text))
+        with mock.patch.object(light_parser.Node, '_match', staticmethod(counting_match)):
+            for text in texts:
+                for _ in parse(text):
+                    pass
+        return attempts / tokens
+    
+    def full_parse(text):
+        for _ in parse(text):
+            pass
+    
+    print('dispatch : pattern attempts per token and parsing time')
+    synthetic = synthetic_text(corpus.values(), 4 * 1024 * 1024)
+    for name, texts in [('corpus', list(corpus.values())), ('synthetic', [synthetic])]:
+        clear_grammars()
+        with mock.patch.object(light_parser, 'get_second_admissible_tokens', lambda pattern: None):
+            attempts_without = count_attempts(texts)
+            without = measure(full_parse, texts)
+        clear_grammars()
+        attempts_with = count_attempts(texts)
+        with_index = measure(full_parse, texts)
+        print('  %-10s first token %5.2f attempts %7.3fs  second token %5.2f attempts %7.3fs  x%.2f' % 
+              (name, attempts_without, without, attempts_with, with_index, without / with_index))
+
+
+def benchmark_ebcdic(corpus):
+    """
+    Throughput of the decoding of EBCDIC files : mapped and translated by 
+    chunks versus read and decoded by the codec, then split.
+    """
+    def codec(path, encoding):
+        with open(path, 'rb') as f:
+            return f.read().decode(encoding).split('\n')
+    
+    print('ebcdic : decoding throughput, mapped versus codec')
+    synthetic = synthetic_text(corpus.values(), 16 * 1024 * 1024)
+    megabytes = len(synthetic) / (1024 * 1024)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'synthetic.ezt')
+        for encoding in ['latin-1'] + ebcdic.code_pages:
+            if encoding == 'cp1047':
+                # no codec
+                data = synthetic.encode('latin-1').translate(bytes.maketrans(ebcdic.get_characters(encoding).encode('latin-1'), bytes(range(256))))
+            else:
+                data = synthetic.encode(encoding)
+            with open(path, 'wb') as f:
+                f.write(data)
+            
+            start = time.perf_counter()
+            detected = ebcdic.detect(data[:ebcdic.prefix_size])
+            detection = time.perf_counter() - start
+            mapped = measure(lambda text: list(MappedLines(path, encoding)), [None])
+            decoded = measure(lambda text: codec(path, encoding), [None]) if encoding != 'cp1047' else None
+            print('  %-8s detected %-8s %6.2fms  mapped %6.0f Mb/s  codec %s' % 
+                  (encoding, detected, detection * 1000, megabytes / mapped, '%6.0f Mb/s' % (megabytes / decoded) if decoded else '     none'))
+
+
+def benchmark_fused(corpus):
+    """
+    Parsing with the stacked filters versus the fused parser.
+    """
+    def full_parse(text):
+        for _ in parse(text):
+            pass
+    
+    print('fused : stacked filters versus fused parser')
+    synthetic = synthetic_text(corpus.values(), 4 * 1024 * 1024)
+    for name, texts in [('corpus', list(corpus.values())), ('synthetic', [synthetic])]:
+        size = sum(len(text) for text in texts)
+        with mock.patch.dict(os.environ, {'EASYTRIEVE_FUSED_PARSER':'0'}):
+            stacked = measure(full_parse, texts)
+        with mock.patch.dict(os.environ, {'EASYTRIEVE_FUSED_PARSER':'1'}):
+            fused = measure(full_parse, texts)
+        print('  %-10s %8d Kb  stacked %7.3fs  fused %7.3fs  x%.2f' % (name, size // 1024, stacked, fused, stacked / fused))
+
+
+def benchmark_grammar(corpus):
+    """
+    Grammar tables built and parsing time, with the tables shared between 
+    filters versus built for each filter.
+    """
+    def count_builds(texts):
+        builds = 0
+        _init = light_parser.Grammar.__init__
+        def counting_init(*args, **kwargs):
+            nonlocal builds
+            builds += 1
+            return _init(*args, **kwargs)
+        
+        filters = 0
+        _filter_init = light_parser.StatementFilter.__init__
+        def counting_filter_init(*args, **kwargs):
+            nonlocal filters
+            filters += 1
+            return _filter_init(*args, **kwargs)
+        
+        clear_grammars()
+        with mock.patch.object(light_parser.Grammar, '__init__', counting_init), \
+             mock.patch.object(light_parser.StatementFilter, '__init__', counting_filter_init):
+            for text in texts:
+                for _ in parse(text):
+                    pass
+        return filters, builds
+    
+    def full_parse(text):
+        for _ in parse(text):
+            pass
+    
+    print('grammar : tables built and parsing time, shared versus per filter')
+    synthetic = synthetic_text(corpus.values(), 4 * 1024 * 1024)
+    for name, texts in [('corpus', list(corpus.values())), ('synthetic', [synthetic])]:
+        with mock.patch.object(light_parser, 'get_grammar', light_parser.Grammar):
+            filters, builds_without = count_builds(texts)
+            without = measure(full_parse, texts)
+        _, builds_with = count_builds(texts)
+        with_cache = measure(full_parse, texts)
+        print('  %-10s %6d filters  per filter %6d builds %7.3fs  shared %3d builds %7.3fs  x%.2f' % 
+              (name, filters, builds_without, without, builds_with, with_cache, without / with_cache))
+
+
+def benchmark_kb_writer(corpus):
+    """
+    Volume and throughput of knowledge base writes, with a local back end.
+    """
+    print('kb_writer : saving with a local back end')
+    for batch_size in [1, 100, 1000]:
+        
+        library = Library()
+        library.kb_writer = KbWriter(LocalBackend(), batch_size)
+        for path, text in corpus.items():
+            if not text.startswith('MACRO'):
+                library.add_module(Module(path, _file=SourceFile(path), text=text))
+        
+        for module in library.get_modules():
+            module.fully_parse()
+            module.resolve()
+        
+        start = time.perf_counter()
+        for module in library.get_modules():
+            module.save()
+            module.create_links(module.collect_links())
+            library.kb_writer.flush()
+        elapsed = time.perf_counter() - start
+        
+        writer = library.kb_writer
+        print('  batch %5d  %s  save %.3fs  writes %.0f/s' % (batch_size, dict(writer.stats), elapsed, writer.get_throughput()))
+
+
+benchmarks = {
+    'declarations':benchmark_declarations,
+    'dispatch':benchmark_dispatch,
+    'ebcdic':benchmark_ebcdic,
+    'fused':benchmark_fused,
+    'grammar':benchmark_grammar,
+    'kb_writer':benchmark_kb_writer,
+    'lexer':benchmark_lexer,
+    'mapping':benchmark_mapping,
+    'normalise':benchmark_normalise,
+    'parser':benchmark_parser,
+    'splitter':benchmark_splitter,
+    'spans':benchmark_spans,
+    'sql':benchmark_sql,
+    'tokens':benchmark_tokens,
+    'whitespace':benchmark_whitespace,
+}
+
+
+if __name__ == '__main__':
+    
+    if len(sys.argv) < 2 or sys.argv[1] not in benchmarks:
+        print(__doc__)
+        sys.exit(1)
+    
+    directory = sys.argv[2] if len(sys.argv) > 2 else os.path.join(os.path.dirname(__file__), 'tests', 'IBM.sample')
+    benchmarks[sys.argv[1]](load_corpus(directory))
@@ -0,0 +1,66 @@
+"""
+Limits on the parsing of a single file.
+
+A pathological file, for example an unterminated string swallowing the rest of
+the code, can make parsing crawl. When the budget of a file is exceeded, the
+module falls back to its declarations only, see Module.fully_parse.
+"""
+import time
+from instrumentation import count_tree
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class Budget:
+    """
+    Maximal wall time, number of tokens and number of AST nodes for parsing a
+    file. 0 means no limit.
+    """
+    def __init__(self, seconds=0, tokens=0, nodes=0):
+
+        self.seconds = seconds
+        self.tokens = tokens
+        self.nodes = nodes
+
+    def get_timer(self):
+        """
+        Function raising BudgetExceeded when called after the wall time of a 
+        parsing starting now, None when time is not limited.
+        """
+        if not self.seconds:
+            return None
+        
+        deadline = time.perf_counter() + self.seconds
+        def check_time():
+            if time.perf_counter() > deadline:
+                raise BudgetExceeded('parsing longer than ' + str(self.seconds) + 's')
+        return check_time
+
+    def check_tokens(self, tokens, check_time=None):
+        """
+        Iterates on tokens, raises BudgetExceeded when too many tokens have
+        been consumed or parsing is too long.
+        
+        :param check_time: timer of the parsing, see get_timer ; one starting
+                           now by default
+        """
+        if check_time is None:
+            check_time = self.get_timer()
+        count = 0
+        for token in tokens:
+            count += 1
+            if self.tokens and count > self.tokens:
+                raise BudgetExceeded('more than ' + str(self.tokens) + ' tokens')
+            # checking time on each token would be too costly
+            if check_time is not None and count % 1024 == 0:
+                check_time()
+            yield token
+
+    def check_nodes(self, ast):
+        """
+        Raises BudgetExceeded when the AST is too large.
+        """
+        if self.nodes and count_tree(ast)['nodes'] > self.nodes:
+            raise BudgetExceeded('more than ' + str(self.nodes) + ' nodes')
@@ -0,0 +1,361 @@
+"""
+Fast scan of the declarations of an Easytrieve file.
+
+A line oriented scanner that only recognises the FILE, PROC and REPORT 
+declarations, without building tokens nor AST. It follows the rules of lexer 
+and easytrieve_parser so that it finds the same declarations as the full 
+parsing :
+
+- comment lines, strings and SQL text are skipped
+- the very first token belongs to the program
+- FILE <name>, REPORT <name>, <name> [.] PROC declare symbols
+- <name> W|F|C|S is a data definition
+
+The first pass only uses it when EASYTRIEVE_PARSE_ONCE is off ; otherwise it 
+gives the trees of the modules degraded by the budget, see budget.
+"""
+import re, weakref, itertools
+from collections import namedtuple, deque
+from light_parser import Token
+from lexer import Generic
+from easytrieve_parser import Program, File, Procedure, Report
+
+
+# kind is one of 'file', 'procedure', 'report'
+Declaration = namedtuple('Declaration', ['kind', 'name', 'line', 'column'])
+
+# significant elements of a line, same separators as lexer
+_element = re.compile(r"'|\.|[^\s'.]+")
+# same with strings closed on the same line as one element 
+_element_or_string = re.compile(r"'[^']*'|'|\.|[^\s'.]+")
+
+# lower text of strings and SQL text : never matches a keyword 
+_STRING = "'"
+
+_data_types = frozenset(['w', 'f', 'c', 's'])
+
+# tokens followed by the name they declare
+_declaring = frozenset(['file', 'report'])
+
+
+def scan_declarations(text, first_line=1):
+    """
+    Declarations of an Easytrieve program, in order.
+    
+    :param text: str or iterable of lines, see Module.get_lines
+    :param first_line: number of the first line of text, for a text that is part of a file
+    :rtype: list of Declaration
+    """
+    lines = iter(text.split('\n') if isinstance(text, str) else text)
+    line = next(lines, '')
+    if line.startswith('BEGIN_PROGRAM('):
+        # previously modified code by preprocessor
+        line = next(lines, line)
+    
+    if line.startswith('MACRO'):
+        # macros have no declarations
+        return []
+    
+    tokens = _Tokens(itertools.chain([line], lines))
+    result = []
+    for kind, index in _find_declarations(tokens.lowers):
+        name, line, column = tokens.get_position(index)
+        result.append(Declaration(kind, name, line + first_line - 1, column))
+    return result
+
+
+class _Tokens:
+    """
+    Significant tokens of the lexer, as lower texts.
+    
+    Strings and SQL text are given as a single token of lower text _STRING. 
+    
+    Text and position of tokens are only calculated on demand : only the 
+    plain lines of the tokens around FILE, REPORT and PROC are kept.
+    """
+    def __init__(self, lines):
+        
+        # line number -> plain line that may hold the name of a declaration
+        self.lines = {}
+        # (index of first token, line number, line) of the last plain lines with tokens
+        self.recent_lines = deque(maxlen=2)
+        self.lowers = []
+        # index of first token of plain lines -> line number
+        self.plain_lines = []
+        # index -> (text, line, column) for tokens of other lines
+        self.positions = {}
+        # lexer's first token is eaten by program begin
+        self.offset = 0
+        
+        self.__scan(lines)
+    
+    def get_position(self, index):
+        """
+        (text, line, column) of a token
+        """
+        index += self.offset
+        if index in self.positions:
+            return self.positions[index]
+        
+        # search the plain line of the token
+        low, high = 0, len(self.plain_lines)
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.plain_lines[middle][0] <= index:
+                low = middle
+            else:
+                high = middle
+        first_index, line_number = self.plain_lines[low]
+        
+        line = self.lines.get(line_number)
+        if line is None:
+            # not the name of a declaration
+            return None
+        if line.rstrip().endswith(('-', '+')):
+            line = line.rstrip()[:-1]
+        
+        for position, match in enumerate(_element.finditer(line), start=first_index):
+            if position == index:
+                return match.group(), line_number, match.start() + 1
+    
+    def __keep_names(self, begin):
+        """
+        Keep the plain lines of the tokens before PROC from begin on.
+        """
+        lowers = self.lowers
+        for index in range(begin, len(lowers)):
+            if lowers[index] == 'proc':
+                # <name> PROC or <name>. PROC, name is in one of the last 
+                # two lines with tokens
+                for first_index, line_number, line in self.recent_lines:
+                    if first_index < index:
+                        self.lines[line_number] = line
+    
+    def __scan(self, lines):
+        
+        lowers = self.lowers
+        append = lowers.append
+        positions = self.positions
+        kept_lines = self.lines
+        append_plain_line = self.plain_lines.append
+        append_recent_line = self.recent_lines.append
+        
+        inside_sql = False
+        inside_string = False
+        # text of current string, may span several lines
+        string_parts = None
+        string_begin = None
+        # the first token of the lexer is significant unless it is a comment or blanks
+        first_is_significant = None
+        
+        for line_number, line in enumerate(lines, start=1):
+            
+            stripped_line = line.strip()
+            if stripped_line.startswith('*'):
+                # comment
+                if first_is_significant is None:
+                    first_is_significant = False
+                continue
+            
+            if inside_string and "'" not in line:
+                # the whole line is in the string
+                string_parts.append(line.rstrip()[:-1] if stripped_line.endswith(('-', '+')) else line)
+                continue
+            
+            if inside_sql:
+                inside_sql = stripped_line.endswith(('-', '+'))
+                if not inside_sql:
+                    append(_STRING)
+                continue
+            
+            if not inside_string and stripped_line.startswith('SQL'):
+                if first_is_significant is None:
+                    first_is_significant = True
+                positions[len(lowers)] = ('SQL', line_number, line.find('SQL') + 1)
+                append('sql')
+                inside_sql = stripped_line.endswith(('-', '+'))
+                if not inside_sql:
+                    append(_STRING)
+                continue
+            
+            scanned_line = line
+            continuation = False
+            if stripped_line.endswith(('-', '+')):
+                scanned_line = line.rstrip()[:-1]
+                continuation = True
+            
+            if first_is_significant is None and scanned_line:
+                first_is_significant = not scanned_line[0].isspace()
+            
+            if not inside_string and "'" not in scanned_line and 'SQL' not in scanned_line:
+                # plain line
+                begin = len(lowers)
+                append_plain_line((begin, line_number))
+                lower_line = scanned_line.lower()
+                lowers.extend(_element.findall(lower_line))
+                if begin == len(lowers):
+                    continue
+                
+                if 'file' in lower_line or 'report' in lower_line or (begin and lowers[begin - 1] in _declaring):
+                    # FILE <name>, REPORT <name>
+                    kept_lines[line_number] = line
+                if 'proc' in lower_line:
+                    kept_lines[line_number] = line
+                    self.__keep_names(begin)
+                append_recent_line((begin, line_number, line))
+                continue
+            
+            begin = len(lowers)
+            position = 0
+            if inside_string:
+                # string opened on a previous line, closed by the first quote
+                position = scanned_line.find("'") + 1
+                inside_string = False
+                string_parts.append(scanned_line[:position])
+                positions[len(lowers)] = (''.join(string_parts),) + string_begin
+                append(_STRING)
+            
+            for match in _element_or_string.finditer(scanned_line, position):
+                
+                element = match.group()
+                if element == "'":
+                    # the rest of the line is in a string closed on a next line
+                    inside_string = True
+                    string_parts = [scanned_line[match.start():]]
+                    string_begin = (line_number, match.start() + 1)
+                    break
+                elif element[0] == "'":
+                    # one line string
+                    positions[len(lowers)] = (element, line_number, match.start() + 1)
+                    append(_STRING)
+                elif element == 'SQL':
+                    # the rest of the line is SQL text
+                    positions[len(lowers)] = (element, line_number, match.start() + 1)
+                    append('sql')
+                    inside_sql = True
+                    break
+                else:
+                    positions[len(lowers)] = (element, line_number, match.start() + 1)
+                    append(element.lower())
+            
+            if inside_sql and not continuation:
+                # one line SQL
+                append(_STRING)
+                inside_sql = False
+            
+            if 'proc' in lowers[begin:]:
+                self.__keep_names(begin)
+        
+        if first_is_significant and lowers:
+            del lowers[0]
+            self.offset = 1
+
+
+def _find_declarations(lowers):
+    """
+    Apply statement begins of easytrieve_parser on tokens.
+    
+    :return: list of (kind, index of name token)
+    """
+    result = []
+    
+    length = len(lowers)
+    index = 0
+    for candidate in _get_candidates(lowers):
+        
+        if candidate < index:
+            continue
+        index = candidate
+        
+        current = lowers[index]
+        following = lowers[index + 1] if index + 1 < length else None
+        
+        if current == 'file' or current == 'report':
+            # FILE <name> / REPORT <name>
+            if following is not None:
+                result.append((current if current == 'report' else 'file', index + 1))
+            index += 1
+        elif current == 'job' or current == 'sort' or current == 'end-proc':
+            index += 1
+        elif following in _data_types:
+            # data definition : <name> W
+            index += 2
+        elif following == 'proc':
+            # <name> PROC
+            result.append(('procedure', index))
+            index += 2
+        elif following == '.' and index + 2 < length and lowers[index + 2] == 'proc':
+            # <name>. PROC
+            result.append(('procedure', index))
+            index += 3
+        else:
+            index += 1
+    
+    return result
+
+
+# tokens that begin a statement or follow the token that begins one
+_beginning = frozenset(['file', 'report', 'job', 'sort', 'end-proc'])
+_following = _data_types | frozenset(['proc'])
+_marked = _beginning | _following
+
+
+def _get_candidates(lowers):
+    """
+    Sorted indexes of the tokens that may begin a statement of 
+    _find_declarations, the other ones are stepped over.
+    """
+    marked = _marked
+    candidates = []
+    for index in [index for index, lower in enumerate(lowers) if lower in marked]:
+        lower = lowers[index]
+        if lower in _beginning:
+            candidates.append(index)
+        if lower == 'proc':
+            # <name>. PROC
+            candidates.append(index - 2)
+        if lower in _following and index:
+            candidates.append(index - 1)
+    candidates.sort()
+    return candidates
+
+
+def create_tree(declarations, first_line, last_line):
+    """
+    Parsed tree of a program made of its declarations only.
+    
+    Used when the program cannot be fully parsed, see budget.
+    
+    :param declarations: list of Declaration
+    :param first_line: first line of the program
+    :param last_line: last line of the program
+    """
+    program = Program()
+    # the program spans all its lines
+    program.children.append(_create_token(' ', first_line, 1))
+    
+    for declaration in declarations:
+        
+        name = _create_token(declaration.name, declaration.line, declaration.column)
+        if declaration.kind == 'procedure':
+            node = Procedure()
+            node.children = [name]
+        else:
+            node = File() if declaration.kind == 'file' else Report()
+            node.children = [_create_token(declaration.kind.upper(), declaration.line, declaration.column), name]
+        
+        setattr(node, 'get_parent', weakref.ref(program))
+        program.children.append(node)
+    
+    program.children.append(_create_token(' ', last_line, 1))
+    return program
+
+
+def _create_token(text, line, column):
+    
+    token = Token(text, Generic)
+    token.begin_line = line
+    token.end_line = line
+    token.begin_column = column
+    token.end_column = column + len(text) - 1
+    return token
@@ -1,31 +1,56 @@
+import itertools
 from lexer import EasyTrieveLexer, Generic, SQLText
-from light_parser import Parser, Statement, Seq, Any, Or, Term, Optional, Node
+from light_parser import Parser, Statement, Seq, Any, Or, Term, Optional, Node, Lookahead
+from settings import get_setting
 
 
-def parse(text):
+def parse(text, budget=None, first_line=1):
     """
     Parsing of an easytrieve file.
     Text can be 
     - str (the text itself)
     - opened file 
+    - iterable of lines, see mapping.MappedLines
+    
+    :param budget: optional budget.Budget limiting the tokens consumed and the wall time
+    :param first_line: number of the first line of text, for a text that is part of a file
     """
-    if not type(text) is str:
+    if hasattr(text, 'read'):
         text = text.read()
 
-    if text.startswith('BEGIN_PROGRAM('):
-        # previously modified code by preprocessor
-        text = text[text.find('\n')+1:]
+    if type(text) is str:
+        if text.startswith('BEGIN_PROGRAM('):
+            # previously modified code by preprocessor
+            text = text[text.find('\n')+1:]
+        start = text
+    else:
+        lines = iter(text)
+        start = next(lines, '')
+        if start.startswith('BEGIN_PROGRAM('):
+            start = next(lines, '')
+        text = itertools.chain([start], lines)
+
+    # wall time is also checked while statements are grouped, after the last token
+    check_time = budget.get_timer() if budget is not None else None
 
-    if text.startswith('MACRO'):
+    if start.startswith('MACRO'):
         parser = Parser(EasyTrieveLexer,
-                    [Macro])
+                    [Macro], 
+                    checkpoint=check_time)
     else:
         parser = Parser(EasyTrieveLexer,
                         [Program],
                         [File, Data, Procedure, Job, Sort, Report],
-                        [Perform, Start, Finish, Get, Write, Print, Put, Point, Call, SQL])
+                        [Perform, Start, Finish, Get, Write, Print, Put, Point, Call, SQL], 
+                        fused=get_setting('fused_parser', True), 
+                        checkpoint=check_time)
 
-    return parser.parse(text)
+    parser.lexer.first_line = first_line
+    
+    tokens = parser.lexer.get_tokens(text)
+    if budget is not None:
+        tokens = budget.check_tokens(tokens, check_time)
+    return parser.parse_stream(Lookahead(tokens))
 
 
 # main structure
@@ -0,0 +1,90 @@
+"""
+Detection of the files left in EBCDIC.
+
+Members unloaded from the mainframe without conversion are in an EBCDIC code
+page : cp037 (US), cp500 (international) or cp1047 (Open Systems). The code
+page is guessed from the first bytes of a file and the decision is cached per
+directory, members of a library being unloaded together.
+
+EBCDIC files are decoded by mapping.MappedLines, in chunks, instead of
+open_source_file. The code pages only differ on a few punctuation characters,
+ties go to the default code page.
+"""
+import os
+from collections import defaultdict, Counter
+
+
+# EBCDIC code pages, in order of preference
+code_pages = ['cp037', 'cp500', 'cp1047']
+
+# number of bytes read for detection
+prefix_size = 4096
+
+# cp1047 is not a python codec : cp037 with 6 characters swapped
+_cp1047_swaps = {0x5F:'^', 0xAD:'[', 0xB0:'\xac', 0xBA:'\xdd', 0xBB:'\xa8', 0xBD:']'}
+
+_latin_1 = ''.join(map(chr, range(256)))
+
+# characters of code : letters, digits, blanks and punctuation of Easytrieve
+_code = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 \t\r\n'.,:;()+-*/=<>&%$#@_\"\xac")
+
+
+def get_characters(code_page):
+    """
+    The 256 characters of an EBCDIC code page, by byte.
+    """
+    if code_page == 'cp1047':
+        characters = list(bytes(range(256)).decode('cp037'))
+        for byte, character in _cp1047_swaps.items():
+            characters[byte] = character
+        return ''.join(characters)
+    return bytes(range(256)).decode(code_page)
+
+
+def detect(prefix, default=code_pages[0]):
+    """
+    EBCDIC code page of a file, None for an ASCII compatible file.
+
+    :param prefix: the first bytes of the file
+    :param default: code page chosen when the code pages tie
+    """
+    counts = Counter(prefix)
+    def score(characters):
+        # number of bytes that are characters of code
+        return sum(count for byte, count in counts.items() if characters[byte] in _code)
+    
+    ascii_score = score(_latin_1)
+    scores = {code_page:score(get_characters(code_page)) for code_page in code_pages}
+
+    best = max(scores.values())
+    if best <= ascii_score:
+        return None
+    if scores.get(default) == best:
+        return default
+    return next(code_page for code_page in code_pages if scores[code_page] == best)
+
+
+class Detector:
+    """
+    Code page of files, detected on the first file of each directory.
+    """
+    def __init__(self, default=code_pages[0]):
+
+        self.default = default
+        # directory -> code page or None
+        self.code_pages = {}
+        # code page or 'ascii' -> number of files
+        self.stats = defaultdict(int)
+
+    def get_code_page(self, path):
+        """
+        EBCDIC code page of a file, None for an ASCII compatible file.
+        """
+        directory = os.path.dirname(path)
+        if directory not in self.code_pages:
+            with open(path, 'rb') as f:
+                self.code_pages[directory] = detect(f.read(prefix_size), self.default)
+
+        code_page = self.code_pages[directory]
+        self.stats[code_page or 'ascii'] += 1
+        return code_page
@@ -0,0 +1,258 @@
+"""
+Incremental analysis.
+
+A manifest stored on disk keeps, for each analysed file, the digest of its 
+content and what has been saved for it : objects, properties, positions and 
+links. Unchanged files are replayed from the manifest without being parsed.
+
+Resolution of CALL depends on the other files : the result of Library.find_path 
+for each called program is kept and checked again before replaying, so that 
+adding, removing or renaming a file invalidates the files calling it.
+"""
+import json, os, re
+from collections import defaultdict
+from cast.analysers import log
+from light_parser import Walker, __version__ as light_parser_version
+from symbols import Module
+from settings import get_setting
+import normaliser
+import ebcdic
+
+
+# format of the manifest file
+FORMAT = 1
+
+# settings changing what is saved for a file, with their defaults
+output_settings = [('normalise', False),
+                   ('right_margin', normaliser.right_margin),
+                   ('encoding', 'latin-1'),
+                   ('detect_ebcdic', True),
+                   ('ebcdic_code_page', ebcdic.code_pages[0]),
+                   ('record_length', 80)]
+
+
+def get_plugin_version():
+    """
+    Version of the plugin, a manifest of another version is ignored.
+    """
+    version = ''
+    try:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plugin.nuspec'), encoding='utf-8-sig') as f:
+            match = re.search(r'<version>(.*)</version>', f.read())
+            if match:
+                version = match.group(1)
+    except OSError:
+        pass
+    
+    return version + '/' + light_parser_version
+
+
+def get_version():
+    """
+    Version of the plugin and of the settings changing the output, a manifest 
+    of another version is ignored.
+    """
+    return get_plugin_version() + '/' + ','.join(name + '=' + str(get_setting(name, default)) 
+                                                 for name, default in output_settings)
+
+
+class Manifest:
+    """
+    Results of the previous analysis per file path.
+    
+    A record is a dict with : 
+    - digest : digest of the file content
+    - calls : list of [called program, path of the module it resolved to or None]
+    - objects : list of [guid, parent guid or None, name, type, fullname, properties, position]
+    - file_properties : list of [name, value]
+    - links : list of [link type, caller guid, ['guid', guid] or ['module', path], position]
+    """
+    def __init__(self, path, version=None):
+        
+        self.path = path
+        self.version = version if version is not None else get_version()
+        
+        # records of previous analysis
+        self.__previous = {}
+        # records of current analysis
+        self.__current = {}
+        
+        self.stats = defaultdict(int)
+    
+    def load(self):
+        
+        try:
+            with open(self.path, encoding='UTF-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            log.warning('Cannot read manifest ' + str(self.path) + ', full analysis')
+            return
+        
+        if data.get('format') != FORMAT or data.get('version') != self.version:
+            log.info('Manifest of another version, full analysis')
+            return
+        
+        self.__previous = data['modules']
+    
+    def save(self):
+        """
+        Save current records, records of files not seen during the analysis are dropped.
+        """
+        data = {'format': FORMAT,
+                'version': self.version,
+                'modules': self.__current}
+        
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='UTF-8') as f:
+            json.dump(data, f)
+        os.replace(temporary, self.path)
+    
+    def get_record(self, path, digest):
+        """
+        Record of previous analysis for an unchanged file, None otherwise.
+        """
+        record = self.__previous.get(path)
+        if record and record['digest'] == digest:
+            return record
+    
+    def set_record(self, path, record):
+        
+        self.__current[path] = record
+
+
+def is_valid(record, module, library):
+    """
+    True when CALL of the module still resolve to the same modules.
+    """
+    for name, path in record['calls']:
+        
+        found = library.find_path(name, module.get_path())
+        if (found.get_path() if found else None) != path:
+            return False
+    
+    return True
+
+
+def record_module(module, digest, links):
+    """
+    Record what has been saved for a module.
+    
+    To be called after Module.save and Module.create_links(links)
+    """
+    objects = []
+    guids = {}
+    file_properties = []
+    
+    for symbol in iterate_symbols(module):
+        
+        if not symbol.kb_record:
+            continue
+        
+        guid, properties, symbol_file_properties, position = symbol.kb_record
+        parent = symbol.get_parent_symbol()
+        objects.append([guid,
+                        guids.get(id(parent)),
+                        symbol.get_name(),
+                        symbol.get_metamodel_type(),
+                        symbol.get_qualified_name(),
+                        properties,
+                        position])
+        guids[id(symbol)] = guid
+        file_properties += symbol_file_properties
+    
+    def get_reference(symbol):
+        
+        if type(symbol) is Module and symbol is not module:
+            return ['module', symbol.get_path()]
+        if id(symbol) in guids:
+            return ['guid', guids[id(symbol)]]
+    
+    recorded_links = []
+    saved_links = [link for symbol in iterate_symbols(module) if symbol.kb_record for link in symbol.get_kb_links()]
+    
+    for link_type, caller, callee, position in saved_links + list(links):
+        
+        reference = get_reference(callee)
+        if reference is None or id(caller) not in guids:
+            continue
+        recorded_links.append([link_type, guids[id(caller)], reference, position])
+    
+    collector = CallCollector()
+    walker = Walker()
+    walker.register_interpreter(collector)
+    if module.get_ast():
+        walker.walk([module.get_ast()])
+    
+    return {'digest': digest,
+            'calls': collector.calls,
+            'objects': objects,
+            'file_properties': file_properties,
+            'links': recorded_links}
+
+
+def replay(module, record, library):
+    """
+    Save again what has been recorded for a module.
+    """
+    file = module.get_file()
+    writer = module.get_kb_writer()
+    kb_objects = {}
+    
+    for guid, parent, name, _type, fullname, properties, position in record['objects']:
+        
+        kb_object = writer.create_object(name, _type, kb_objects[parent] if parent else file, guid, fullname)
+        for property_name, value in properties:
+            writer.save_property(kb_object, property_name, value)
+        writer.save_position(kb_object, file, position)
+        kb_objects[guid] = kb_object
+    
+    if record['objects']:
+        # so that CALL from other modules can link to it
+        module.set_kb_object(kb_objects[record['objects'][0][0]])
+    
+    if module.member_file is not None:
+        # saved once for all the members
+        module.member_file.add(record['file_properties'])
+    else:
+        for property_name, value in record['file_properties']:
+            writer.save_property(file, property_name, value)
+    
+    for link_type, caller, (kind, reference), position in record['links']:
+        
+        if kind == 'module':
+            callee = library.find_module_by_path(reference)
+            callee = callee.get_kb_object() if callee else None
+        else:
+            callee = kb_objects.get(reference)
+        
+        # as for analysis, no link to modules not yet saved 
+        if not callee:
+            continue
+        
+        writer.create_link(link_type, kb_objects[caller], callee, file, position)
+
+
+def iterate_symbols(symbol):
+    """
+    Symbol and all its sub symbols, parents first.
+    """
+    yield symbol
+    for sub_symbol in symbol.get_all_symbols():
+        yield from iterate_symbols(sub_symbol)
+
+
+class CallCollector:
+    """
+    Collects the resolution of CALL statements.
+    """
+    def __init__(self):
+        
+        self.calls = []
+    
+    def start_Call(self, statement):
+        
+        identifier = statement.get_called_program()
+        paths = [symbol.get_path() for symbol in identifier.resolved_as if type(symbol) is Module]
+        self.calls.append([identifier.get_name(), paths[0] if paths else None])
@@ -0,0 +1,176 @@
+"""
+Timing of the analysis, per file and per phase.
+
+For each file and each phase (get_text, parse, resolve, save, save_links...)
+are recorded :
+
+- wall : elapsed seconds
+- cpu : CPU seconds of the process
+- tokens, nodes : size of the parsed tree
+- objects : objects saved
+- links : links created
+"""
+import csv, json, sys, time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from cast.analysers import log
+from light_parser import Node
+
+
+counters = ['wall', 'cpu', 'tokens', 'nodes', 'objects', 'links']
+
+
+class Instrumentation:
+
+    def __init__(self):
+
+        # path -> phase -> counter -> value
+        self.files = OrderedDict()
+
+    @contextmanager
+    def phase(self, path, name):
+        """
+        Measures wall and CPU time of a phase of a file.
+
+            with instrumentation.phase(path, 'parse'):
+                ...
+        """
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self.add(path, name, wall=time.perf_counter() - wall, cpu=time.process_time() - cpu)
+
+    def add(self, path, name, **values):
+        """
+        Add values to the counters of a phase of a file.
+        """
+        phases = self.files.setdefault(path, OrderedDict())
+        phase = phases.setdefault(name, defaultdict(int))
+        for counter, value in values.items():
+            phase[counter] += value
+
+    def merge(self, path, phases):
+        """
+        Add the phases measured elsewhere, e.g., in a worker process.
+
+        :param phases: dict phase -> counter -> value
+        """
+        for name, values in phases.items():
+            self.add(path, name, **values)
+
+    def get_phases(self, path):
+        """
+        Phases of a file as plain dicts.
+        """
+        return OrderedDict((name, dict(values)) for name, values in self.files.get(path, {}).items())
+
+    def get_total(self, path, counter='wall'):
+
+        return sum(values[counter] for values in self.files.get(path, {}).values())
+
+    def get_slowest(self, count):
+        """
+        The count slowest files as list of (path, wall time).
+        """
+        totals = [(path, self.get_total(path)) for path in self.files]
+        totals.sort(key=lambda total: total[1], reverse=True)
+        return totals[:count]
+
+    def log_slowest(self, count):
+
+        for path, wall in self.get_slowest(count):
+            details = ', '.join('%s %.3fs' % (name, values['wall']) for name, values in self.files[path].items())
+            log.info('Slow file %.3fs %s (%s)' % (wall, path, details))
+
+    def save_report(self, path):
+        """
+        Write all measures in a .csv or .json file.
+        """
+        if path.lower().endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['file', 'phase'] + counters)
+                for file_path, phases in self.files.items():
+                    for name, values in phases.items():
+                        writer.writerow([file_path, name] + [values[counter] for counter in counters])
+        else:
+            totals = OrderedDict()
+            for phases in self.files.values():
+                for name, values in phases.items():
+                    total = totals.setdefault(name, OrderedDict((counter, 0) for counter in counters))
+                    for counter in counters:
+                        total[counter] += values[counter]
+
+            with open(path, 'w') as f:
+                json.dump({'files':OrderedDict((file_path, self.get_phases(file_path)) for file_path in self.files),
+                           'totals':totals},
+                          f, indent=2)
+
+
+def get_peak_memory():
+    """
+    Peak resident memory of the process in bytes, None when unknown.
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes, except on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+    
+    try:
+        # windows
+        import ctypes
+        from ctypes import wintypes
+        
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD),
+                        ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t),
+                        ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t),
+                        ('PeakPagefileUsage', ctypes.c_size_t)]
+        
+        memory = ProcessMemoryCounters()
+        memory.cb = ctypes.sizeof(memory)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(memory), memory.cb):
+            return memory.PeakWorkingSetSize
+    except:
+        pass
+    
+    return None
+
+
+def count_tree(ast):
+    """
+    Number of tokens and nodes of a parsed tree.
+
+    :return: dict with 'tokens' and 'nodes'
+    """
+    tokens = 0
+    nodes = 0
+
+    if ast is None:
+        stack = []
+    elif isinstance(ast, list):
+        stack = list(ast)
+    else:
+        stack = [ast]
+
+    while stack:
+        element = stack.pop()
+        if isinstance(element, Node):
+            nodes += 1
+            stack.extend(element.children)
+        else:
+            tokens += 1
+
+    return {'tokens':tokens, 'nodes':nodes}
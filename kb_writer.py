@@ -0,0 +1,176 @@
+"""
+Buffered writing in the knowledge base.
+
+Object creations, property and position saves and links are queued and
+written by batches, in the order they were queued, by a back end :
+
+- CastBackend writes with cast.analysers
+- LocalBackend keeps everything in memory, for measuring and testing without
+  a knowledge base
+"""
+import time
+from collections import defaultdict
+from cast.analysers import CustomObject, Bookmark, create_link
+
+
+class KbWriter:
+    """
+    Queue of writes in the knowledge base.
+
+    Objects are returned at once, so that they can be used as parent or in
+    links, but are really saved when the queue is flushed.
+    """
+    def __init__(self, backend=None, batch_size=1):
+        """
+        :param backend: CastBackend by default
+        :param batch_size: number of queued writes triggering a flush, 1 writes immediately
+        """
+        self.backend = backend if backend is not None else CastBackend()
+        self.batch_size = batch_size
+
+        # (write method, arguments)
+        self.__queue = []
+        self.stats = defaultdict(int)
+        # time spent writing
+        self.seconds = 0
+
+    def create_object(self, name, _type, parent, guid, fullname):
+        """
+        Create an object, returns the object.
+        """
+        kb_object = self.backend.new_object()
+        self.__append('objects', self.backend.save_object, (kb_object, name, _type, parent, guid, fullname))
+        return kb_object
+
+    def save_property(self, kb_object, name, value):
+
+        self.__append('properties', self.backend.save_property, (kb_object, name, value))
+
+    def save_position(self, kb_object, file, position):
+        """
+        :param position: (begin line, begin column, end line, end column) in file
+        """
+        self.__append('positions', self.backend.save_position, (kb_object, file, position))
+
+    def create_link(self, link_type, caller, callee, file, position):
+        """
+        :param position: (begin line, begin column, end line, end column) in file
+        """
+        self.__append('links', self.backend.create_link, (link_type, caller, callee, file, position))
+
+    def flush(self):
+        """
+        Write all that is queued.
+        """
+        if not self.__queue:
+            return
+
+        queue = self.__queue
+        self.__queue = []
+
+        start = time.perf_counter()
+        for write, arguments in queue:
+            write(*arguments)
+        self.seconds += time.perf_counter() - start
+        self.stats['batches'] += 1
+
+    def get_throughput(self):
+        """
+        Writes per second.
+        """
+        writes = sum(self.stats[kind] for kind in ['objects', 'properties', 'positions', 'links'])
+        return writes / self.seconds if self.seconds else 0
+
+    def __append(self, kind, write, arguments):
+
+        self.stats[kind] += 1
+        self.__queue.append((write, arguments))
+        if len(self.__queue) >= self.batch_size:
+            self.flush()
+
+
+class CastBackend:
+    """
+    Writes in the knowledge base.
+    """
+    def new_object(self):
+
+        return CustomObject()
+
+    def save_object(self, kb_object, name, _type, parent, guid, fullname):
+
+        kb_object.set_name(name)
+        kb_object.set_type(_type)
+        kb_object.set_parent(parent)
+        kb_object.set_guid(guid)
+        kb_object.set_fullname(fullname)
+        kb_object.save()
+
+    def save_property(self, kb_object, name, value):
+
+        kb_object.save_property(name, value)
+
+    def save_position(self, kb_object, file, position):
+
+        kb_object.save_position(Bookmark(file, *position))
+
+    def create_link(self, link_type, caller, callee, file, position):
+
+        create_link(link_type, caller, callee, Bookmark(file, *position))
+
+
+class LocalObject:
+    """
+    An object of LocalBackend.
+    """
+    def __init__(self):
+
+        self.name = None
+        self.type = None
+        self.parent = None
+        self.guid = None
+        self.fullname = None
+        self.position = None
+
+    def __repr__(self):
+
+        return 'LocalObject(' + str(self.guid) + ')'
+
+
+class LocalBackend:
+    """
+    Keeps the writes in memory.
+    """
+    def __init__(self):
+
+        # saved LocalObject in order
+        self.objects = []
+        # (object, name, value)
+        self.properties = []
+        # (link type, caller, callee, file, position)
+        self.links = []
+
+    def new_object(self):
+
+        return LocalObject()
+
+    def save_object(self, kb_object, name, _type, parent, guid, fullname):
+
+        kb_object.name = name
+        kb_object.type = _type
+        kb_object.parent = parent
+        kb_object.guid = guid
+        kb_object.fullname = fullname
+        self.objects.append(kb_object)
+
+    def save_property(self, kb_object, name, value):
+
+        self.properties.append((kb_object, name, value))
+
+    def save_position(self, kb_object, file, position):
+
+        kb_object.position = (file, position)
+
+    def create_link(self, link_type, caller, callee, file, position):
+
+        self.links.append((link_type, caller, callee, file, position))
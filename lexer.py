@@ -1,11 +1,38 @@
-from light_parser.splitter import Splitter # @UnresolvedImport
-from light_parser import Token # @UnresolvedImport
+import re
+from light_parser.splitter import splitters, default_backend # @UnresolvedImport
+from light_parser import Token, _lower # @UnresolvedImport
 from pygments.token import Generic, Comment, String, Keyword, Name, Token as PygmentToken
 
 from cast.analysers import log
+from settings import get_setting
 
 SQLText = Generic.SQLText  # @UndefinedVariable
 
+# elements of a line : blanks, strings closed on the line, then as split by 
+# Splitter(["'", '.']) separators and words
+_elements = re.compile(r"(\s+)|'[^']*'|['.]|[^\s'.]+")
+_blanks = 1
+
+# lexer back ends
+backends = ['regex', 'splitter']
+
+# (setting, value) already warned about, warned once per process
+_warned = set()
+
+
+def _get_available(name, default, available):
+    """
+    Value of a setting, the default when the value is not available.
+    """
+    value = get_setting(name, default)
+    if value in available:
+        return value
+    
+    if (name, value) not in _warned:
+        _warned.add((name, value))
+        log.warning('EASYTRIEVE_' + name.upper() + '=' + value + ' is not available, ' + default + ' is used instead')
+    return default
+
 
 class EasyTrieveLexer:
     """
@@ -14,7 +41,17 @@ class EasyTrieveLexer:
     
     def __init__(self, stripnl=False):
         
-        pass
+        # number of the first line of text, for a text that is part of a file
+        self.first_line = 1
+        # 'regex' scans each line with one compiled regular expression, 
+        # 'splitter' uses light_parser Splitter ; both give the same tokens
+        self.backend = _get_available('lexer', backends[0], backends)
+        # implementation of Splitter for 'splitter' back end : native, regex or 
+        # python, see light_parser.splitter.splitters
+        self.splitter = _get_available('splitter', default_backend, splitters)
+        # False : only the blanks starting a line are tokens, they give the 
+        # lines of nodes and the lines of code ; the other blanks are dropped
+        self.whitespace = get_setting('whitespace_tokens', True)
     
     def add_filter(self, _):
         pass
@@ -29,169 +66,266 @@ class EasyTrieveLexer:
         # text can be a file...
         if isinstance(text, str):
             text = text.split('\n')
-
+        
+        if self.backend == 'splitter':
+            return self.get_tokens_by_splitter(text)
+        return self.get_tokens_by_regex(text)
+    
+    def get_tokens_by_splitter(self, text):
+        """
+        Tokens of lines of text, split with Splitter.
+        
+        Lines are grouped in logical lines as for get_tokens_by_regex.
+        """
         separators = ["'", '.',]
-        splitter = Splitter(separators)
-
-        inside_sql = False
-        sql_begin_line = None
-        sql_begin_column = None
-        current_sql_text = None
+        splitter = splitters[self.splitter](separators)
         
         inside_string = False
-        string_text = None
+        string_parts = None
         string_begin_line = None
         string_begin_column = None
         
-        # line by line...
-        for line_number, line in enumerate(text, start=1):
-            
-            stripped_line = line.strip()
-            # comment
-            if stripped_line.startswith('*'):
-
-                result = Token(line, Comment)
-                result.begin_line = line_number
-                result.end_line = line_number
-                result.begin_column = 1
-                result.end_column = 1+len(line)
+        for logical_line in get_logical_lines(text, self.first_line):
+            for index, (line_number, line, scanned_line, continuation) in enumerate(logical_line):
                 
-                yield result
+                # comment
+                if scanned_line is None:
+                    # lower text of comments is rarely needed
+                    yield Token.from_line(line, Comment, line_number, 1, 1+len(line), is_comment=True)
+                    continue
                 
-            else:
+                if not inside_string and line.lstrip().startswith('SQL'):
+                    sql_position = line.find('SQL')
+                    yield _create_token('SQL', Keyword, line_number, sql_position + 1, line_number, sql_position + 3)
+                    yield from _get_sql_tokens(logical_line, index, scanned_line[sql_position+3:].rstrip(), sql_position + 4)
+                    break
                 
-                if inside_sql:
-                    sql_fragment = line.rstrip()
-                    if sql_fragment.endswith(('-', '+')):
-                        sql_fragment = sql_fragment[:-1].rstrip()
-                        current_sql_text += sql_fragment + '\n'
-                    else:
-                        current_sql_text += sql_fragment
-
-                        result = Token(current_sql_text, SQLText)
-                        result.begin_line = sql_begin_line
-                        result.end_line = line_number
-                        result.begin_column = sql_begin_column
-                        result.end_column = len(sql_fragment)
-
-                        yield result
-
-                        current_sql_text = None
-                        inside_sql = False
-                        sql_begin_line = None
-                        sql_begin_column = None
+                sql_begin_column = None
+                for begin, end in splitter.split_spans(scanned_line):
                     
-                else:
-                    if line.lstrip().startswith('SQL') and not inside_string:
-                        inside_sql = True
-                        sql_begin_line = line_number
-                        sql_position = line.find('SQL')
-                        sql_begin_column = sql_position + 4
-                        
+                    begin_column = begin + 1
+                    if scanned_line[begin].isspace() and not inside_string:
+                        # blanks : text extracted only when needed
+                        if self.whitespace or not begin:
+                            yield Token.from_line(scanned_line, Generic, line_number, begin_column, end, is_whitespace=True)
+                        continue
+                    
+                    element = scanned_line[begin:end]
+                    if inside_string:
+                        string_parts.append(element)
+                        if element == "'":
+                            
+                            result = Token(''.join(string_parts), String)
+                            result.begin_line = string_begin_line
+                            result.end_line = line_number
+                            result.begin_column = string_begin_column
+                            result.end_column = begin_column
+                            
+                            yield result
+                            
+                            inside_string = False
+                            string_parts = None
+                    
+                    elif element == "'":
+                        inside_string = True
+                        string_parts = [element]
+                        string_begin_line = line_number
+                        string_begin_column = begin_column
+                    
+                    elif element == 'SQL':
+                        yield _create_token('SQL', Keyword, line_number, begin_column, line_number, begin_column + 2)
+                        sql_begin_column = begin_column + 3
+                        break
+                    
+                    else:
                         
-                        result = Token('SQL', Keyword)
+                        result = Token(element, Generic)
                         result.begin_line = line_number
                         result.end_line = line_number
-                        result.begin_column = sql_position + 1
-                        result.end_column = sql_position + 3
+                        result.begin_column = begin_column
+                        result.end_column = begin_column+len(element)-1
                         
                         yield result
-                        
-                        sql_fragment = line[sql_position+3:].rstrip()
-                        
-                        if sql_fragment.endswith(('-', '+')):
-                            sql_fragment = sql_fragment[:-1].rstrip()
-                            current_sql_text = sql_fragment + '\n'
+                
+                if sql_begin_column is not None:
+                    # the rest of the logical line is SQL
+                    yield from _get_sql_tokens(logical_line, index, scanned_line[end:], sql_begin_column)
+                    break
+
+    def get_tokens_by_regex(self, text):
+        """
+        Tokens of lines of text, each line being scanned once by _elements.
+        
+        Same tokens as get_tokens_by_splitter, without going through Splitter 
+        whose pure python version goes character by character.
+        
+        Lines are first grouped in logical lines, see get_logical_lines : an 
+        SQL block is the rest of its logical line, its fragments are joined 
+        once.
+        """
+        inside_string = False
+        string_parts = None
+        string_begin_line = None
+        string_begin_column = None
+        
+        whitespace = self.whitespace
+        
+        # text of words -> (text, lower text) : tokens of the same word share 
+        # their strings
+        words = {}
+        
+        for logical_line in get_logical_lines(text, self.first_line):
+            for index, (line_number, line, scanned_line, continuation) in enumerate(logical_line):
+                
+                # comment
+                if scanned_line is None:
+                    # lower text of comments is rarely needed
+                    yield Token.from_line(line, Comment, line_number, 1, 1+len(line), is_comment=True)
+                    continue
+                
+                if not inside_string and line.lstrip().startswith('SQL'):
+                    sql_position = line.find('SQL')
+                    yield _create_token('SQL', Keyword, line_number, sql_position + 1, line_number, sql_position + 3)
+                    yield from _get_sql_tokens(logical_line, index, scanned_line[sql_position+3:].rstrip(), sql_position + 4)
+                    break
+                
+                position = 0
+                if inside_string:
+                    # string continued from previous line
+                    position = scanned_line.find("'") + 1
+                    if not position:
+                        string_parts.append(scanned_line)
+                        continue
+                    string_parts.append(scanned_line[:position])
+                    yield _create_token(''.join(string_parts), String, string_begin_line, string_begin_column, line_number, position)
+                    inside_string = False
+                    string_parts = None
+                
+                sql_begin_column = None
+                for match in _elements.finditer(scanned_line, position):
+                    begin_column = match.start() + 1
+                    if match.lastindex == _blanks:
+                        # text extracted only when needed
+                        if whitespace or not match.start():
+                            yield Token.from_line(scanned_line, Generic, line_number, begin_column, match.end(), is_whitespace=True)
+                        continue
+                    
+                    element = match.group()
+                    if element[0] == "'":
+                        if len(element) > 1:
+                            yield _create_token(element, String, line_number, begin_column, line_number, match.end())
                         else:
-                            current_sql_text = sql_fragment
+                            # string continued on next line
+                            inside_string = True
+                            string_parts = [scanned_line[match.start():]]
+                            string_begin_line = line_number
+                            string_begin_column = begin_column
+                            break
+                    
+                    elif element == 'SQL':
+                        yield _create_token('SQL', Keyword, line_number, begin_column, line_number, begin_column + 2)
+                        sql_begin_column = begin_column + 3
+                        break
+                    
+                    else:
+                        word = words.get(element)
+                        if word is None:
+                            word = words[element] = (element, _lower(element))
+                        yield _create_token(word[0], Generic, line_number, begin_column, line_number, begin_column+len(element)-1, lower_text=word[1])
+                
+                if sql_begin_column is not None:
+                    # the rest of the logical line is SQL
+                    yield from _get_sql_tokens(logical_line, index, scanned_line[match.end():], sql_begin_column)
+                    break
+
+
+def get_logical_lines(lines, first_line=1):
+    """
+    Lines grouped in logical lines : a line ending with a continuation 
+    character, + or -, continues on the next line that is not a comment. A 
+    comment outside of a continued line is a logical line of its own.
     
-                            result = Token(current_sql_text, SQLText)
-                            result.begin_line = sql_begin_line
-                            result.end_line = line_number
-                            result.begin_column = sql_begin_column
-                            result.end_column = sql_begin_column+len(sql_fragment)
+    A logical line is a list of (line number, line, scanned line, continuation)
+    where scanned line is the line without its continuation character, None 
+    for a comment line. The last logical line may be left continued at the end
+    of the text.
     
-                            yield result
+    Lines are consumed as logical lines are iterated.
     
-                            current_sql_text = None
-                            inside_sql = False
-                            sql_begin_line = None
-                            sql_begin_column = None
-                        
-                    else:
-                        begin_column = 1
-                        scanned_line = line
-                        continuation = False
-                        if line.rstrip().endswith(('-', '+')):
-                            scanned_line = line.rstrip()[:-1]
-                            continuation = True
-                        for element in splitter.split(scanned_line):
-                            
-                            if inside_string:
-                                string_text += element
-                                if element == "'":
-                                    
-                                    result = Token(string_text, String)
-                                    result.begin_line = string_begin_line
-                                    result.end_line = line_number
-                                    result.begin_column = string_begin_column
-                                    result.end_column = begin_column
-            
-                                    yield result
-                                    
-                                    inside_string = False
-                            
-                            elif inside_sql:
-                                current_sql_text += element
-                            
-                            elif element == "'":
-                                inside_string = True
-                                string_text = element
-                                string_begin_line = line_number
-                                string_begin_column = begin_column
-                            
-                            elif element == 'SQL':
-                                
-                                result = Token('SQL', Keyword)
-                                result.begin_line = line_number
-                                result.end_line = line_number
-                                result.begin_column = begin_column
-                                result.end_column = begin_column + 2
-                                
-                                yield result
-                                
-                                current_sql_text = ''
-                                inside_sql = True
-                                sql_begin_line = line_number
-                                sql_begin_column = begin_column + 3
-                            
-                            else:
-                                    
-                                result = Token(element, Generic)
-                                result.begin_line = line_number
-                                result.end_line = line_number
-                                result.begin_column = begin_column
-                                result.end_column = begin_column+len(element)-1
-        
-                                yield result
-                            
-                            begin_column += len(element)
-                        
-                        if inside_sql:
-                            if continuation:
-                                current_sql_text += '\n'
-                            else:
-                                # one line SQL
-                                result = Token(current_sql_text, SQLText)
-                                result.begin_line = sql_begin_line
-                                result.end_line = line_number
-                                result.begin_column = sql_begin_column
-                                result.end_column = sql_begin_column+len(current_sql_text)
-        
-                                yield result
+    :param lines: iterable of lines, without their end of line
+    :rtype: iterator of logical lines
+    """
+    logical_line = []
+    for line_number, line in enumerate(lines, start=first_line):
+        if line.lstrip().startswith('*'):
+            if logical_line:
+                logical_line.append((line_number, line, None, False))
+            else:
+                yield [(line_number, line, None, False)]
+            continue
         
-                                current_sql_text = None
-                                inside_sql = False
-                                sql_begin_line = None
-                                sql_begin_column = None
-                            
+        stripped_line = line.rstrip()
+        if stripped_line.endswith(('-', '+')):
+            logical_line.append((line_number, line, stripped_line[:-1], True))
+        else:
+            # trailing blanks are kept, they are tokens too
+            logical_line.append((line_number, line, line, False))
+            yield logical_line
+            logical_line = []
+    
+    if logical_line:
+        yield logical_line
+
+
+def _get_sql_tokens(logical_line, index, sql_fragment, sql_begin_column):
+    """
+    SQLText token for the SQL starting on the index-th line of a logical line 
+    and ending with it, preceded by the comments it contains.
+    
+    Nothing for an SQL continued at the end of the text.
+    
+    :param sql_fragment: SQL on the index-th line
+    """
+    sql_begin_line, _, _, continuation = logical_line[index]
+    if not continuation:
+        # one line SQL
+        yield _create_token(sql_fragment, SQLText, sql_begin_line, sql_begin_column, sql_begin_line, sql_begin_column+len(sql_fragment), 
+                            not sql_fragment or sql_fragment.isspace())
+        return
+    
+    sql_fragments = [sql_fragment]
+    for line_number, line, scanned_line, continuation in logical_line[index+1:]:
+        if scanned_line is None:
+            yield Token.from_line(line, Comment, line_number, 1, 1+len(line), is_comment=True)
+        elif continuation:
+            sql_fragments.append(scanned_line.rstrip())
+        else:
+            sql_fragment = line.rstrip()
+            sql_fragments.append(sql_fragment)
+            sql_text = '\n'.join(sql_fragments)
+            yield _create_token(sql_text, SQLText, sql_begin_line, sql_begin_column, line_number, len(sql_fragment), 
+                                not sql_text or sql_text.isspace())
+
+
+def _create_token(text, _type, begin_line, begin_column, end_line, end_column, is_whitespace=False, is_comment=False, lower_text=None):
+    """
+    Positioned Token(text, _type).
+    
+    Token.__init__ is bypassed : whitespace and comment are known here, 
+    guessing them from the type costs as much as the scan itself.
+    
+    :param lower_text: shared lower text, computed on first access when None
+    """
+    result = Token.__new__(Token)
+    result.type = _type
+    result.text = text
+    result.begin_line = begin_line
+    result.begin_column = begin_column
+    result.end_line = end_line
+    result.end_column = end_column
+    result._is_whitespace = is_whitespace
+    result._is_comment = is_comment
+    if lower_text is not None:
+        result.lower_text = lower_text
+    result.case_sensitive = False
+    return result
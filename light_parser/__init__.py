@@ -6,9 +6,9 @@ Created on 30 oct. 2014
 '''
 from pygments.filter import Filter
 from pygments.lexer import Lexer
-from pygments.token import Keyword, Whitespace, Comment, is_token_subtype, _TokenType, Literal
+from pygments.token import Keyword, Whitespace, Comment, is_token_subtype, _TokenType, Literal, string_to_tokentype
 from pygments.token import Token as PygmentToken
-import traceback, weakref
+import traceback, weakref, inspect
 import binascii
 import itertools
 import math
@@ -30,6 +30,11 @@ class Parser:
         @param case_sensitive: bool default False 
            is the matching of token case sensitive
         
+        @param fused: bool default False
+           parse in one pass when the grammar allows it, see parse_fused
+        
+        @param checkpoint: optional function called regularly while parsing, 
+           even after the last token has been read ; raises to stop parsing
         
         """
         
@@ -47,6 +52,11 @@ class Parser:
         for x in args:
             
             self.filters.append(StatementFilter(x))
+        
+        self.fused = kwargs.get('fused', False)
+        
+        for f in self.filters:
+            f.checkpoint = kwargs.get('checkpoint')
     
     def use_indentation(self):
         """
@@ -73,10 +83,92 @@ class Parser:
         """
         Parse a stream and return a stream of AST nodes / tokens.
         """
+        if self.fused and self.can_fuse():
+            return Lookahead(self.parse_fused(stream))
+        
         for f in self.filters:
             stream = Lookahead(f.process(stream))
         
         return stream
+    
+    def can_fuse(self):
+        """
+        True when parse_fused gives the same nodes as the stacked filters :
+        
+        - the first filter only has a statement spanning the whole stream : 
+          begins with Any(), has no end and keeps its default behaviours
+        - the next filters cannot match on this statement nor on the comments
+          after it, their patterns need a token text or a following token
+        """
+        if len(self.filters) < 2:
+            return False
+        
+        first = self.filters[0]
+        if type(first.raw_statements) is not list or len(first.raw_statements) != 1 or first.groups or first.terms:
+            return False
+        statement = first.raw_statements[0]
+        if not issubclass(statement, Statement) or type(statement.begin) is not Any or statement.end is not None or \
+           getattr(statement, 'stopped_by_other_statement', False) or statement.on_end is not Node.on_end:
+            return False
+        
+        for f in self.filters[1:]:
+            patterns = [s.begin for s in f.statements] + [t.match for t in f.terms] + \
+                       [g.header if hasattr(g, 'header') else g.begin for g in f.groups]
+            for pattern in patterns:
+                if get_possible_texts(pattern) is None and get_second_admissible_tokens(pattern) is None:
+                    return False
+        return True
+    
+    def parse_fused(self, stream):
+        """
+        Same nodes as the stacked filters, with tokens going once through the 
+        next filters.
+        
+        The statement of the first filter is built here and its body flows 
+        through the next filters chained together. Stacked filters would 
+        each process the whole stream, then the body again in 
+        _recurse_on_block.
+        """
+        token = next(stream, None)
+        if token is None:
+            return
+        
+        # as StatementFilter.try_match_statement
+        statement = self.filters[0].statements[0]()
+        statement.header_comments_length = 0
+        statement.header_comments = []
+        statement.begin_length = 1
+        statement.children = [token]
+        statement.header = Node._last_matched_header
+        Node._last_matched_header = []
+        
+        # as StatementFilter.process_current_statement : comments ending the 
+        # stream are not in the statement
+        comments = []
+        def get_body():
+            for token in stream:
+                if token.is_comment() or (token.is_whitespace() and comments):
+                    comments.append(token)
+                else:
+                    yield from comments
+                    comments.clear()
+                    yield token
+        
+        body = get_body()
+        for f in self.filters[1:]:
+            clone = f._get_clone(statement)
+            clone.fused = True
+            body = clone.process(Lookahead(body))
+        inner_body = list(body)
+        
+        statement.on_end()
+        begin = statement.children
+        for f in self.filters[1:]:
+            f._recurse_on_begin_end(statement, begin, [])
+        statement.children = begin + inner_body
+        
+        yield statement
+        yield from comments
 
 
 class Walker:
@@ -232,10 +324,31 @@ def create_lexer(lexer_type, case_sensitive=False):
     return lexer
 
 
+def _lower(text):
+    """
+    Lower text, the text itself when already in lower case.
+    """
+    lower_text = text.lower()
+    return text if lower_text == text else lower_text
+
+
 class Token:
     """
     A token with code position.
+    
+    Attributes are slots. Two of them can be left unset, they are computed on
+    first access, see __getattr__ : 
+    - text of a token created by from_line 
+    - lower_text
+    
+    Positions are kept as lines and columns rather than offsets in the file :
+    tokens of a line share their line number and columns are mostly small 
+    cached ints, whereas each offset would be an int allocated per token, 
+    see benchmark.py tokens.
     """
+    __slots__ = ('type', 'text', 'begin_line', 'begin_column', 'end_line', 'end_column', 
+                 '_is_whitespace', '_is_comment', 'lower_text', 'case_sensitive', '_line')
+    
     def __init__(self, text=None, type=None, case_sensitive=False):
         
         self.type = type
@@ -250,6 +363,38 @@ class Token:
         self._calculate()
         self.case_sensitive = case_sensitive
 
+    @staticmethod
+    def from_line(line, type, line_number, begin_column, end_column, is_whitespace=False, is_comment=False):
+        """
+        A token whose text is line[begin_column-1:end_column], only extracted 
+        when needed.
+        """
+        result = Token.__new__(Token)
+        result.type = type
+        result.begin_line = line_number
+        result.begin_column = begin_column
+        result.end_line = line_number
+        result.end_column = end_column
+        result._is_whitespace = is_whitespace
+        result._is_comment = is_comment
+        result.case_sensitive = False
+        result._line = line
+        return result
+    
+    def __getattr__(self, name):
+        # only called for unset slots
+        if name == 'text':
+            text = self._line[self.begin_column - 1:self.end_column]
+            self.text = text
+            del self._line
+            return text
+        if name == 'lower_text':
+            text = self.text
+            lower_text = _lower(text) if text else None
+            self.lower_text = lower_text
+            return lower_text
+        raise AttributeError(name)
+    
     def get_type(self):
         return self.type
 
@@ -346,6 +491,18 @@ class Token:
             else:
                 return self.text.lower() == other
     
+    def __getstate__(self):
+        # text is pickled, not the line, lower text is computed again 
+        # pygments token types are singletons : pickle them by name 
+        return (str(self.type) if self.type is not None else None, self.text, 
+                self.begin_line, self.begin_column, self.end_line, self.end_column, 
+                self._is_whitespace, self._is_comment, self.case_sensitive)
+    
+    def __setstate__(self, state):
+        _type, self.text, self.begin_line, self.begin_column, self.end_line, self.end_column, \
+            self._is_whitespace, self._is_comment, self.case_sensitive = state
+        self.type = string_to_tokentype(_type) if _type is not None else None
+    
     def __repr__(self):
         result = 'Token(' + repr(self.type) + "," + repr(self.text)
         result += "," + repr(self.begin_line)
@@ -803,6 +960,19 @@ class Node:
 
     def __repr__(self):
         return self.__class__.__name__ + str(self.children)
+    
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        # weak reference to parent cannot be pickled : pickle the parent itself
+        if 'get_parent' in state:
+            state['get_parent'] = state['get_parent']()
+        return state
+    
+    def __setstate__(self, state):
+        parent = state.pop('get_parent', None)
+        self.__dict__.update(state)
+        if parent is not None:
+            self.get_parent = weakref.ref(parent)
         
     _last_matched_header = []
     
@@ -858,11 +1028,12 @@ class Node:
         if token , stream matches pattern then return the tokens that matched
         else return []
         """
+        match_stats['attempted'] += 1
         stream.start_lookahead()
         result = None
         index_of_stream = stream.index
         try:
-            result = Node.do_match(pattern, token, TokenIterator(stream))
+            result = get_matcher(pattern)(token, TokenIterator(stream))
         except StopIteration:
 #             print('stopped', stream.index, index_of_stream)
             stream.index = index_of_stream
@@ -885,10 +1056,18 @@ class Node:
     
     @staticmethod
     def do_match(pattern, token, stream):
+        """
+        Interprets pattern on token, stream.
         
+        Kept as the reference of the matchers of compile_pattern, used by 
+        _match.
+        """
         t = type(pattern)
             
         if  t is str:
+            if token.is_whitespace() and not pattern.isspace():
+                # spares extracting the text of blanks, see Token.from_line
+                return False
             if token.text and not is_token_subtype(token.type, Literal.String):
                 return token.lower_text == pattern.lower()
             return False
@@ -1019,7 +1198,7 @@ class Node:
             
             args_len = None
             if not hasattr(pattern, "__number_of_args"):
-                args = inspect.getargspec(pattern).args
+                args = inspect.getfullargspec(pattern).args
                 args_len = len(args)
                 setattr(pattern, "__number_of_args", args_len) 
             else:
@@ -1030,6 +1209,173 @@ class Node:
             elif args_len == 2:
                 return pattern(token, stream)
 
+
+# pattern -> matcher, patterns being class members they are compiled once
+_matchers = {}
+
+# 'attempted' : patterns matched on a token, 'skipped' : attempts avoided 
+# because the token cannot begin the pattern ; the counts of the workers of 
+# the parallel second pass are added to the ones of the main process
+match_stats = defaultdict(int)
+
+
+def get_matcher(pattern):
+    """
+    Compiled pattern, see compile_pattern.
+    """
+    try:
+        return _matchers[pattern]
+    except KeyError:
+        matcher = _matchers[pattern] = compile_pattern(pattern)
+        return matcher
+    except TypeError:
+        # unhashable, e.g. a Token
+        return compile_pattern(pattern)
+
+
+def compile_pattern(pattern):
+    """
+    Function f(token, stream) matching as Node.do_match(pattern, token, stream).
+    
+    The pattern tree is dispatched on once, each sub pattern becoming a 
+    closure.
+    """
+    t = type(pattern)
+    
+    if t is str:
+        lower_text = pattern.lower()
+        if pattern.isspace():
+            def match_text(token, stream):
+                return bool(token.text) and not is_token_subtype(token.type, Literal.String) and token.lower_text == lower_text
+        else:
+            def match_text(token, stream):
+                # spares extracting the text of blanks, see Token.from_line
+                return not token.is_whitespace() and token.lower_text == lower_text and not is_token_subtype(token.type, Literal.String)
+        return match_text
+    
+    if t is _TokenType:
+        def match_type(token, stream):
+            return is_token_subtype(token.type, pattern)
+        return match_type
+    
+    if t is Token:
+        def match_token(token, stream):
+            return token.text == pattern.text and is_token_subtype(token.type, pattern.type)
+        return match_token
+    
+    if t is Not:
+        sub_matcher = compile_pattern(pattern.pattern)
+        def match_not(token, stream):
+            index_of_stream = stream.tokens.index
+            if sub_matcher(token, stream):
+                stream.tokens.index = index_of_stream
+                return False
+            return True
+        return match_not
+    
+    if t is NotFollowedBy:
+        sub_matcher = compile_pattern(pattern.pattern)
+        def match_not_followed_by(token, stream):
+            return not sub_matcher(token, stream)
+        return match_not_followed_by
+    
+    if t is Any:
+        def match_any(token, stream):
+            return True
+        return match_any
+    
+    if t is Optional:
+        sub_matcher = compile_pattern(pattern.pattern)
+        def match_optional(token, stream):
+            index_of_stream = stream.tokens.index
+            if not sub_matcher(token, stream):
+                # did not match : reput stream as before the call (work only in sequence)
+                stream.tokens.index = index_of_stream
+                return False
+            return True
+        return match_optional
+    
+    if t is Seq:
+        # (matcher, is optional) of all but last
+        firsts = [(compile_pattern(p), type(p) is Optional) for p in pattern.list[:-1]]
+        last_pattern = pattern.list[-1]
+        last_matcher = compile_pattern(last_pattern)
+        last_is_optional = type(last_pattern) is Optional
+        last_is_not_followed_by = type(last_pattern) is NotFollowedBy
+        
+        def match_seq(token, stream):
+            index_of_stream = stream.tokens.index
+            for sub_matcher, optional in firsts:
+                matched = sub_matcher(token, stream)
+                index_of_stream = stream.tokens.index
+                if matched:
+                    token = next(stream)
+                elif not optional:
+                    return False
+            
+            matched = last_matcher(token, stream)
+            if last_is_optional:
+                # last optional
+                if not matched:
+                    stream.tokens.index = index_of_stream
+                return True
+            if last_is_not_followed_by:
+                # whatever do not consume
+                stream.tokens.index = index_of_stream
+                return matched
+            return bool(matched)
+        return match_seq
+    
+    if t is Or:
+        sub_matchers = [compile_pattern(p) for p in pattern.list]
+        def match_or(token, stream):
+            for sub_matcher in sub_matchers:
+                # memorise the index of the lookahead stream
+                index_of_stream = stream.tokens.index
+                try:
+                    if sub_matcher(token, stream):
+                        return True
+                except StopIteration:
+                    pass
+                # did not match : reput stream as before
+                stream.tokens.index = index_of_stream
+            return False
+        return match_or
+    
+    if t is Repeat:
+        sub_matcher = compile_pattern(pattern.pattern)
+        def match_repeat(token, stream):
+            index_of_stream = stream.tokens.index
+            matched = False
+            while sub_matcher(token, stream):
+                matched = True
+                index_of_stream = stream.tokens.index
+                token = next(stream)
+            stream.tokens.index = index_of_stream
+            return matched
+        return match_repeat
+    
+    if t is type:
+        # a node type
+        def match_node(token, stream):
+            return isinstance(token, pattern)
+        return match_node
+    
+    if hasattr(pattern, "__call__"):
+        # callable on token, either f(token) or f(token, stream)
+        args_len = len(inspect.getfullargspec(pattern).args)
+        if args_len == 1:
+            def match_call(token, stream):
+                return pattern(token)
+            return match_call
+        if args_len == 2:
+            return pattern
+    
+    # e.g. no end
+    def match_nothing(token, stream):
+        return None
+    return match_nothing
+
     
 def get_admissible_tokens(pattern):
     """
@@ -1060,8 +1406,89 @@ def get_admissible_tokens(pattern):
         return result
     
         
-        
-            
+    
+
+def get_second_admissible_tokens(pattern):
+    """
+    Get the strings admissible for the token following the first one, for a 
+    pattern beginning with Any().
+    None if all are
+    """
+    if type(pattern) is not Seq or type(pattern.list[0]) is not Any:
+        return
+    texts = _get_sequence_texts(pattern.list[1:])
+    if texts is not None:
+        return list(texts)
+
+
+# pattern -> texts, see get_possible_texts
+_possible_texts = {}
+
+
+def get_possible_texts(pattern):
+    """
+    Lower texts the first token must have for pattern to match, as a frozenset.
+    None if any token may match.
+    
+    Unlike get_admissible_tokens, it looks inside every pattern : it is only
+    used to skip attempts that cannot succeed.
+    """
+    try:
+        return _possible_texts[pattern]
+    except KeyError:
+        texts = _possible_texts[pattern] = _get_texts(pattern)
+        return texts
+    except TypeError:
+        # unhashable, e.g. a Token
+        return _get_texts(pattern)
+
+
+def _get_texts(pattern):
+    
+    t = type(pattern)
+    
+    if pattern is None:
+        # never matches
+        return frozenset()
+    
+    if t is str:
+        if pattern.isspace():
+            # matches whitespace
+            return
+        return frozenset([pattern.lower()])
+    
+    if t is Or:
+        result = frozenset()
+        for sub_pattern in pattern.list:
+            texts = _get_texts(sub_pattern)
+            if texts is None:
+                return
+            result |= texts
+        return result
+    
+    if t is Seq:
+        return _get_sequence_texts(pattern.list)
+    
+    if t is Repeat:
+        return _get_texts(pattern.pattern)
+
+
+def _get_sequence_texts(patterns):
+    
+    if not patterns:
+        return
+    
+    first = patterns[0]
+    if type(first) is Optional:
+        texts = _get_texts(first.pattern)
+        following = _get_sequence_texts(patterns[1:])
+        if texts is None or following is None:
+            return
+        return texts | following
+    
+    return _get_texts(first)
+
+
 class BlockStatement(Node):
     """
     A possibly recursive node tree in an AST.
@@ -1190,6 +1617,28 @@ class Lookahead:
             self.stop_lookahead()
         
 
+    def look_next_significant(self):
+        """
+        Preview the next token that is neither whitespace nor comment, as 
+        TokenIterator would give it, without consuming it.
+        
+        Only outside of a lookahead. None at the end of the stream.
+        """
+        tokens = self.tokens
+        index = 0
+        while True:
+            if index < len(tokens):
+                token = tokens[index]
+            else:
+                token = next(self.stream, None)
+                if token is None:
+                    return None
+                tokens.append(token)
+            index += 1
+            
+            if not type(token) is Token or not (token.is_whitespace() or token.is_comment()):
+                return token
+
     def move_to(self, tokens):
         """
         Move the cursor just after a token having text
@@ -1238,47 +1687,49 @@ class Lookahead:
         return 'Lookahead(lookahead=' + str(self.lookahead) + ', index=' + str(self.index) + ', tokens=' + str(self.tokens) + ')'
 
 
-class StatementFilter:
+class Grammar:
     """
-    Split a token stream into statements and blocks.
+    Lookup tables of statement lists, see get_grammar.
+    
+    Shared by the filters of the same statements : not modified once built.
     """
-    def __init__(self, statements=[]):
-        
-        # recognized statements blocks
-        self.raw_statements = statements
+    def __init__(self, statement_lists):
+        """
+        @param statement_lists: lists of statement types, later ones add their
+        tables to the ones of the previous ones, see 
+        StatementFilter._get_clone
+        """
         self.groups = []
         self.statements = []
         self.terms = []
         
-        if type(statements) is list:
-            
+        # try to speed things by caching some data...
+        self.text_to_statements = defaultdict(list)
+        self.other_statements = []
+        
+        self.text_to_blocks = defaultdict(list)
+        self.other_blocks = []
+
+        self.text_to_terms = defaultdict(list)
+        self.other_terms = []
+        
+        for statements in statement_lists:
             self.groups = [b for b in statements if issubclass(b, BlockStatement)]
             self.statements = [s for s in statements if issubclass(s, Statement)]
             self.terms = [s for s in statements if issubclass(s, Term)]
+            self._precalculate()
         
-        # current node context (for contextual parsing on an existing tree)
-        # do not confuse with stack
-        self.node_context = []
-        
-        # current block stack
-        self.stack = []
-        self.statement = None
-        self.in_header = False
-        self.in_body = False
-        
-        self.comments = []
+        self.text_to_statements = dict(self.text_to_statements)
+        self.text_to_blocks = dict(self.text_to_blocks)
+        self.text_to_terms = dict(self.text_to_terms)
         
-        # try to speed things by caching some data...
-        self.__text_to_statements = defaultdict(list)
-        self.__other_statements = []
-        
-        self.__text_to_blocks = defaultdict(list)
-        self.__other_blocks = []
-
-        self.__text_to_terms = defaultdict(list)
-        self.__other_terms = []
-        
-        self._precalculate()
+        # for other statements, blocks and terms : (possible texts of first 
+        # token, of following token), None when they cannot be filtered
+        # other ones are filtered, in their order, on what can begin them
+        self.other_statement_texts = _get_filter_texts(statement.begin for statement in self.other_statements)
+        self.other_block_texts = _get_filter_texts((group.header if hasattr(group, 'header') else group.begin 
+                                                    for group in self.other_blocks), following=False)
+        self.other_term_texts = _get_filter_texts((term.match for term in self.other_terms), following=False)
         
     def _precalculate(self):
         """
@@ -1288,11 +1739,11 @@ class StatementFilter:
         for statement in self.statements:
             admissibles = get_admissible_tokens(statement.begin)
             if not admissibles:
-                self.__other_statements.append(statement)
+                self.other_statements.append(statement)
             else:
                 for admissible in admissibles:
-                    self.__text_to_statements[admissible].append(statement)
-#             print('get_current_statements', len(self.__text_to_statements), len(self.__other_statements))
+                    self.text_to_statements[admissible].append(statement)
+#             print('get_current_statements', len(self.text_to_statements), len(self.other_statements))
             
         # calculate map first time
         for group in self.groups:
@@ -1303,30 +1754,89 @@ class StatementFilter:
             else:
                 admissibles = get_admissible_tokens(group.begin)
             if not admissibles:
-                self.__other_blocks.append(group)
+                self.other_blocks.append(group)
             else:
                 for admissible in admissibles:
-                    self.__text_to_blocks[admissible].append(group)
-#             print('get_current_groups', len(self.__text_to_blocks), len(self.__other_blocks))
+                    self.text_to_blocks[admissible].append(group)
+#             print('get_current_groups', len(self.text_to_blocks), len(self.other_blocks))
 
         # calculate map first time
         for term in self.terms:
             
             admissibles = get_admissible_tokens(term.match)
             if not admissibles:
-                self.__other_terms.append(term)
+                self.other_terms.append(term)
             else:
                 for admissible in admissibles:
-                    self.__text_to_terms[admissible].append(term)
-#             print('get_current_terms', len(self.__text_to_terms), len(self.__other_terms))
+                    self.text_to_terms[admissible].append(term)
+#             print('get_current_terms', len(self.text_to_terms), len(self.other_terms))
+
+
+# statement lists -> Grammar
+_grammars = {}
+
+
+def get_grammar(statement_lists):
+    """
+    Grammar of statement lists, built once per process.
+    """
+    key = tuple(tuple(statements) for statements in statement_lists)
+    grammar = _grammars.get(key)
+    if grammar is None:
+        grammar = _grammars[key] = Grammar(statement_lists)
+    return grammar
+
+
+class StatementFilter:
+    """
+    Split a token stream into statements and blocks.
+    """
+    def __init__(self, statements=[]):
+        
+        # recognized statements blocks
+        self.raw_statements = statements
+        self._set_grammar([statements] if type(statements) is list else [])
         
+        # current node context (for contextual parsing on an existing tree)
+        # do not confuse with stack
+        self.node_context = []
+        
+        # current block stack
+        self.stack = []
+        self.statement = None
+        self.in_header = False
+        self.in_body = False
+        
+        self.comments = []
+        
+        # see Parser.parse_fused
+        self.fused = False
+        
+        # see Parser
+        self.checkpoint = None
     
+    def _set_grammar(self, statement_lists):
+        
+        self.grammar = get_grammar(statement_lists)
+        self.groups = self.grammar.groups
+        self.statements = self.grammar.statements
+        self.terms = self.grammar.terms
+        
     def process(self, stream):
         """
         Group a token stream.
         stream must be a Lookahead stream.
         """
+        if self.fused and not self.statements and not self.groups:
+            yield from self.process_terms(stream)
+            return
+        
+        checkpoint = self.checkpoint
+        count = 0
         for token in stream:
+            count += 1
+            if checkpoint is not None and not count % 1024:
+                checkpoint()
             group = self.process_token(token, stream)
             if group:
 #                 print('    proces',  group)
@@ -1353,13 +1863,76 @@ class StatementFilter:
             yield self.stack[0]
         
         
+    def process_terms(self, stream):
+        """
+        process for a filter with terms only : same nodes, without the 
+        branches of statements and blocks.
+        """
+        comments = self.comments
+        checkpoint = self.checkpoint
+        count = 0
+        for token in stream:
+            count += 1
+            if checkpoint is not None and not count % 1024:
+                checkpoint()
+            
+            if isinstance(token, Node):
+                # recurse
+                self._recurse_on_block(token)
+            
+            term = self.try_match_term(token, stream)
+            if term:
+                # recurse also inside the matched term if needed
+                for node in term.get_sub_nodes():
+                    self._recurse_on_block(node)
+                term.on_end()
+                yield term
+                # try_match_term took the comments
+                comments = self.comments
+            
+            elif token.is_comment() or (token.is_whitespace() and comments):
+                comments.append(token)
+            elif comments and not token.is_whitespace() and token.text:
+                # clean comments if something is between
+                yield from comments
+                yield token
+                comments = self.comments = []
+            else:
+                yield token
+        
+        # return trailing comments
+        yield from comments
+    
     def _recurse_on_block(self, block):
         """
         Magic part...
         """
 #         print('_recurse_on_block', block)     
+        if self.checkpoint is not None:
+            self.checkpoint()
+        self_clone = self._get_clone(block)
+        
+        # recurse on inner body
+        # we assume here that the current block is ok so we do not need 
+        # to reparse the begin part and the end part, only the inner body
+        begin, inner_body, end = block._split_block()
+        
+        # rebuild the body 
+        new_inner_nody = list(self_clone.process(Lookahead(inner_body)))
+        
+        self._recurse_on_begin_end(block, begin, end)
+        
+        # et hop!
+        block.children = begin + new_inner_nody + end
+    
+    def _get_clone(self, block):
+        """
+        Filter for the inner body of a block.
+        """
         # we 'clone' self so that current state is unaffected
         self_clone = StatementFilter(self.raw_statements)
+        self_clone.fused = self.fused
+        self_clone.checkpoint = self.checkpoint
         
         self_clone.node_context = list(self.node_context)
         self_clone.node_context.append(block)
@@ -1370,35 +1943,29 @@ class StatementFilter:
             
             _t = type(block)
             
+            # statements of matching contexts, tables of all of them
+            statement_lists = []
             for matching_context in self.raw_statements:
                 
                 if matching_context == _t:
                     # {<node type> : [...], ...}
-                    statements = self.raw_statements[matching_context]
-                    self_clone.groups = [b for b in statements if issubclass(b, BlockStatement)]
-                    self_clone.statements = [s for s in statements if issubclass(s, Statement)]
-                    self_clone.terms = [s for s in statements if issubclass(s, Term)]
-                    self_clone._precalculate()
+                    statement_lists.append(self.raw_statements[matching_context])
 
                 elif isinstance(matching_context, NodePath) and matching_context.match(self_clone.node_context):
                     
                     # XPath on nodes
-                    statements = self.raw_statements[matching_context]
-                    self_clone.groups = [b for b in statements if issubclass(b, BlockStatement)]
-                    self_clone.statements = [s for s in statements if issubclass(s, Statement)]
-                    self_clone.terms = [s for s in statements if issubclass(s, Term)]
-                    self_clone._precalculate()
-                
-        # recurse on inner body
-        # we assume here that the current block is ok so we do not need 
-        # to reparse the begin part and the end part, only the inner body
-        begin, inner_body, end = block._split_block()
+                    statement_lists.append(self.raw_statements[matching_context])
+            
+            if statement_lists:
+                self_clone._set_grammar(statement_lists)
+        
+        return self_clone
+    
+    def _recurse_on_begin_end(self, block, begin, end):
         
-        # rebuild the body 
-        new_inner_nody = list(self_clone.process(Lookahead(inner_body)))
-
         # ugly but works better        
         self_clone = StatementFilter(self.raw_statements)
+        self_clone.checkpoint = self.checkpoint
         self_clone.node_context = list(self.node_context)
         self_clone.node_context.append(block)
         
@@ -1411,9 +1978,6 @@ class StatementFilter:
             if isinstance(token, Node):
                 self_clone._recurse_on_block(token)
         
-        # et hop!
-        block.children = begin + new_inner_nody + end
-        
         
     def process_token(self, token, stream):
 
@@ -1450,7 +2014,9 @@ class StatementFilter:
                 
         # hanlde ending of current element
         if self.stack:
-            match = Node.match_end(self.stack[-1], token, stream) 
+            match = None
+            if _may_begin(self.stack[-1].end, token):
+                match = Node.match_end(self.stack[-1], token, stream) 
             if match:
 
                 current_group = self.pop_group()
@@ -1599,7 +2165,9 @@ class StatementFilter:
         # we have a statement ongoing
         
         # match end
-        match = Node.match_end(self.statement, token, stream)
+        match = None
+        if _may_begin(self.statement.end, token):
+            match = Node.match_end(self.statement, token, stream)
         if match:
             
             #print('match end', self.statement)
@@ -1665,7 +2233,7 @@ class StatementFilter:
     def try_match_statement(self, token, stream):
         # search for statement beginning
         
-        for statement in self.get_current_statements(token):
+        for statement in self.get_current_statements(token, stream):
             
             match = Node.match_begin(statement, token, stream)
             if match:
@@ -1714,32 +2282,109 @@ class StatementFilter:
 
 #     def stack_has_group(self, auto_recursive, ):
 
-    def get_current_statements(self, token):
+    def get_current_statements(self, token, stream=None):
         
+        grammar = self.grammar
+        other_statements = _filter(grammar.other_statements, grammar.other_statement_texts, token, stream)
         
         # yield in map
-        if token.text:
-            return self.__text_to_statements[token.lower_text] + self.__other_statements
+        # blanks begin nothing, their text is not needed
+        if not token.is_whitespace() and token.text:
+            return grammar.text_to_statements.get(token.lower_text, _no_nodes) + other_statements
         else:
-            return self.__other_statements
+            return other_statements
 
     def get_current_groups(self, token):
-
+        
+        grammar = self.grammar
+        other_blocks = _filter(grammar.other_blocks, grammar.other_block_texts, token)
+        
         # yield in map
-        if token.text:
-            return self.__text_to_blocks[token.lower_text] + self.__other_blocks
+        # blanks begin nothing, their text is not needed
+        if not token.is_whitespace() and token.text:
+            return grammar.text_to_blocks.get(token.lower_text, _no_nodes) + other_blocks
         else:
-            return self.__other_blocks
+            return other_blocks
         
     def get_current_terms(self, token):
+        
+        grammar = self.grammar
+        other_terms = _filter(grammar.other_terms, grammar.other_term_texts, token)
+        
         # yield in map
-        if token.text:
-            return self.__text_to_terms[token.lower_text] + self.__other_terms
+        # blanks begin nothing, their text is not needed
+        if not token.is_whitespace() and token.text:
+            return grammar.text_to_terms.get(token.lower_text, _no_nodes) + other_terms
         else:
-            return self.__other_terms
+            return other_terms
+
+
+# never modified, see get_current_statements
+_no_nodes = []
+
+
+def _get_lower_text(token):
+    """
+    Lower text of a token for get_possible_texts, None for blanks and nodes.
+    """
+    if token is None or token.is_whitespace():
+        return None
+    return token.lower_text
+
+
+def _may_begin(pattern, token):
+    """
+    False when token cannot begin pattern, see get_possible_texts.
+    """
+    texts = get_possible_texts(pattern)
+    if texts is None or _get_lower_text(token) in texts:
+        return True
+    match_stats['skipped'] += 1
+    return False
+
+
+def _get_filter_texts(patterns, following=True):
+    """
+    (possible texts of first token, possible texts of following token) of 
+    patterns, None when no pattern can be filtered.
+    
+    :param following: also for patterns beginning with Any(), see 
+                      get_second_admissible_tokens
+    """
+    result = []
+    for pattern in patterns:
+        second_texts = get_second_admissible_tokens(pattern) if following else None
+        result.append((get_possible_texts(pattern), frozenset(second_texts) if second_texts else None))
+    
+    if all(texts == (None, None) for texts in result):
+        return
+    return result
+
+
+def _filter(nodes, texts, token, stream=None):
+    """
+    Nodes that the token, followed by the next token of stream, may begin. 
+    """
+    if texts is None:
+        return nodes
+    
+    result = []
+    lower_text = _get_lower_text(token)
+    following = False
+    for node, (first_texts, second_texts) in zip(nodes, texts):
+        if first_texts is not None and lower_text not in first_texts:
+            match_stats['skipped'] += 1
+            continue
+        if second_texts is not None and stream is not None:
+            if following is False:
+                following = _get_lower_text(stream.look_next_significant())
+            if following not in second_texts:
+                match_stats['skipped'] += 1
+                continue
+        result.append(node)
+    return result
         
 
-import inspect
 def get_subclass(_class): 
     if hasattr(_class, '__cached_sub_classes'):
         return getattr(_class, '__cached_sub_classes')
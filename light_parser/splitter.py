@@ -22,114 +22,203 @@ class Splitter:
          
         returns an iterable of string
         '''    
+    
+    def split_spans(self, text):
+        '''
+        Same split as (start, end) offsets in text, without creating the 
+        substrings
+        '''
 
 
 """
+import re
+from collections import OrderedDict
 
-try:
-    # try using 64 bit C++ implemented version if possible
-    from .utility_functions import Splitter # @UnresolvedImport
-except:
-    # python fall back
-    class Splitter:
-        
-        def __init__(self, separators):
-            
-            self.mono_char_separators = set([s for s in separators if len(s)==1])
-            self.multi_char_separators = [s for s in separators if len(s)>1]
-            
-        
-        def split(self, text):
-        
-            
-            # for mono/multi-char separators
-            
-            result = []
-        
-            have_current_token = False
-            current_token = None
-            current_token_is_blanks = False
-        
-            i = 0;
-            while i < len(text):
-                c = text[i];
-        #         print('scanning', c)
-                # number of remaining chars from this one
-                rest = len(text) - i;
-        
-                character_is_blanks = c.isspace()
-        
-                if not character_is_blanks:
-                    # search for maximum multi char
-                    current_max_multi = ''
-        
-                    for multi in self.multi_char_separators:
-                        if (c == multi[0] and len(multi) <= rest and len(multi) > len(current_max_multi) and text[i:i+len(multi)] == multi):
-                            current_max_multi = multi;
-        
-                    if current_max_multi:
-                        if (have_current_token):
-                            result.append(current_token);
-                            have_current_token = False
-        
-                        result.append(current_max_multi);
-        
-                        # increase i
-                        i += len(current_max_multi);
-                        continue;
-        
-                    # search for mono char separators
-                    is_mono_char_separator = c in self.mono_char_separators
-        
-                    if (is_mono_char_separator):
-        #                 print(c, "is_mono_char_separator")
-                        #std::cout << c << " is_mono_char_separator" << std::endl;
+
+class PythonSplitter:
+    """
+    Reference implementation, character by character.
+    """
+    
+    def __init__(self, separators):
         
-                        if (have_current_token):
-        #                     print("appending", current_token)
-                            #std::cout << "appending " << current_token << std::endl;
+        self.mono_char_separators = set([s for s in separators if len(s)==1])
+        self.multi_char_separators = [s for s in separators if len(s)>1]
         
-                            result.append(current_token);
-                            current_token = "";
-        
-                        result.append(c);
-                        current_token_is_blanks = False;
-                        have_current_token = False;
-                    
-                    else:
-        #                 print(c, 'is not separator')
-                        #std::cout << c << " is not separator" << std::endl;
-                        if (have_current_token):
-                            if (current_token_is_blanks):
-                                result.append(current_token);
-                                current_token = c;
-                                current_token_is_blanks = False;
-                            else:
-                                current_token += c;
-                        else:
-                            current_token = c;
-                            have_current_token = True;
-                            current_token_is_blanks = False;
+    
+    def split(self, text):
+    
+        
+        # for mono/multi-char separators
+        
+        result = []
+    
+        have_current_token = False
+        current_token = None
+        current_token_is_blanks = False
+    
+        i = 0;
+        while i < len(text):
+            c = text[i];
+    #         print('scanning', c)
+            # number of remaining chars from this one
+            rest = len(text) - i;
+    
+            character_is_blanks = c.isspace()
+    
+            if not character_is_blanks:
+                # search for maximum multi char
+                current_max_multi = ''
+    
+                for multi in self.multi_char_separators:
+                    if (c == multi[0] and len(multi) <= rest and len(multi) > len(current_max_multi) and text[i:i+len(multi)] == multi):
+                        current_max_multi = multi;
+    
+                if current_max_multi:
+                    if (have_current_token):
+                        result.append(current_token);
+                        have_current_token = False
+    
+                    result.append(current_max_multi);
+    
+                    # increase i
+                    i += len(current_max_multi);
+                    continue;
+    
+                # search for mono char separators
+                is_mono_char_separator = c in self.mono_char_separators
+    
+                if (is_mono_char_separator):
+    #                 print(c, "is_mono_char_separator")
+                    #std::cout << c << " is_mono_char_separator" << std::endl;
+    
+                    if (have_current_token):
+    #                     print("appending", current_token)
+                        #std::cout << "appending " << current_token << std::endl;
+    
+                        result.append(current_token);
+                        current_token = "";
+    
+                    result.append(c);
+                    current_token_is_blanks = False;
+                    have_current_token = False;
+                
                 else:
-                    # seen a blank
+    #                 print(c, 'is not separator')
+                    #std::cout << c << " is not separator" << std::endl;
                     if (have_current_token):
                         if (current_token_is_blanks):
-                            current_token += c;
-                        else:
                             result.append(current_token);
-                            current_token_is_blanks = True;
                             current_token = c;
+                            current_token_is_blanks = False;
+                        else:
+                            current_token += c;
                     else:
+                        current_token = c;
                         have_current_token = True;
+                        current_token_is_blanks = False;
+            else:
+                # seen a blank
+                if (have_current_token):
+                    if (current_token_is_blanks):
+                        current_token += c;
+                    else:
+                        result.append(current_token);
                         current_token_is_blanks = True;
                         current_token = c;
-                i += 1;
+                else:
+                    have_current_token = True;
+                    current_token_is_blanks = True;
+                    current_token = c;
+            i += 1;
+    
+        # last one as is...
+        if (have_current_token):
+            result.append(current_token);
+    
+        return result;
+    
+    def split_spans(self, text):
+        
+        return _spans(self.split(text))
+
+
+class RegexSplitter:
+    """
+    Same split as PythonSplitter with one compiled regular expression.
+    """
+    def __init__(self, separators):
+        
+        # separators are only searched on a non blank character
+        separators = [s for s in separators if s and not s[0].isspace()]
+        mono_char_separators = ''.join(sorted(set(s for s in separators if len(s)==1)))
+        # longest first : the maximal separator wins
+        multi_char_separators = sorted(set(s for s in separators if len(s)>1), key=len, reverse=True)
+        
+        alternatives = [r'\s+']
+        alternatives.extend(re.escape(s) for s in multi_char_separators)
+        word = r'[^\s' + re.escape(mono_char_separators) + ']'
+        if mono_char_separators:
+            alternatives.append('[' + re.escape(mono_char_separators) + ']')
+        if multi_char_separators:
+            word = '(?:(?!' + '|'.join(re.escape(s) for s in multi_char_separators) + ')' + word + ')'
+        alternatives.append(word + '+')
+        
+        self.pattern = re.compile('|'.join(alternatives))
+    
+    def split(self, text):
         
-            # last one as is...
-            if (have_current_token):
-                result.append(current_token);
+        return self.pattern.findall(text)
+    
+    def split_spans(self, text):
         
-            return result;
+        return [match.span() for match in self.pattern.finditer(text)]
+
+
+def _spans(elements):
+    """
+    (start, end) offsets of consecutive elements.
+    """
+    result = []
+    end = 0
+    for element in elements:
+        start = end
+        end += len(element)
+        result.append((start, end))
+    return result
+
+
+# available implementations by name, fastest first
+splitters = OrderedDict()
+
+try:
+    # try using 64 bit C++ implemented version if possible
+    from .utility_functions import Splitter as _NativeSplitter # @UnresolvedImport
+    
+    class NativeSplitter:
+        """
+        Adds split_spans to the native implementation.
+        """
+        def __init__(self, separators):
+            self.splitter = _NativeSplitter(separators)
+        
+        def split(self, text):
+            return self.splitter.split(text)
+        
+        def split_spans(self, text):
+            return _spans(self.splitter.split(text))
+    
+    splitters['native'] = NativeSplitter
+except:
+    pass
+
+splitters['regex'] = RegexSplitter
+splitters['python'] = PythonSplitter
+
+# name of the implementation used by default
+default_backend = next(iter(splitters))
+
+Splitter = splitters[default_backend]
 
 # 
 # def split(text, separators):
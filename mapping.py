@@ -0,0 +1,196 @@
+"""
+Large files read through a memory map.
+
+Reading a file gives its whole text, that the lexer splits in lines : the code
+is in memory twice before the first token. A large file is rather mapped in
+memory and decoded chunk by chunk, the lexer receiving its lines one at a time.
+
+Only single byte encodings are supported, that is the encodings of Easytrieve
+code : ASCII, Latin-1 and EBCDIC code pages, see ebcdic. Bytes are translated
+into Latin-1 by bytes.translate, then decoded as Latin-1, which is a copy.
+
+EBCDIC files end their lines with NL or LF, or have no end of line at all when
+unloaded from fixed length records.
+"""
+import os, codecs, mmap, re, time
+from collections import defaultdict
+from scheduling import Size
+import ebcdic
+
+
+# bytes decoded at once
+chunk_size = 1024 * 1024
+
+# encodings decoded as Latin-1 without translation
+_latin_1 = frozenset(['ascii', 'iso8859-1'])
+
+_sql = re.compile(br'\bSQL\b')
+
+# encoding -> bytes decoded and seconds spent, in this process
+decoded_bytes = defaultdict(int)
+decoding_seconds = defaultdict(float)
+
+
+def get_translation(encoding):
+    """
+    Table translating the bytes of a single byte encoding into Latin-1, None
+    when no translation is needed.
+    
+    NL, the end of line of EBCDIC, is translated into an end of line.
+
+    :raise ValueError: for an encoding that is not single byte
+    """
+    if encoding in ebcdic.code_pages:
+        return ebcdic.get_characters(encoding).replace('\x85', '\n').encode('latin-1')
+    if codecs.lookup(encoding).name in _latin_1:
+        return None
+    try:
+        return bytes(range(256)).decode(encoding).encode('latin-1')
+    except UnicodeError:
+        raise ValueError(encoding + ' is not a single byte encoding')
+
+
+def is_supported(encoding):
+    """
+    True when files of an encoding can be mapped.
+    """
+    try:
+        get_translation(encoding)
+        return True
+    except (ValueError, LookupError):
+        return False
+
+
+class MappedLines:
+    """
+    Lines of a file, as str.split('\\n') would give them on the text read in
+    universal newlines mode.
+
+    Only the path is kept, the file is mapped while lines are iterated : an
+    instance can be sent to another process.
+    """
+    def __init__(self, path, encoding='latin-1', normalise=None, record_length=0):
+        """
+        :param normalise: optional function applied to each line, see normaliser
+        :param record_length: length of the lines of a file without ends of 
+                              line, as unloaded from fixed length records ; 
+                              0 for one line
+        """
+        self.path = path
+        self.encoding = encoding
+        self.normalise = normalise
+        self.record_length = record_length
+        # Size measured by the last complete iteration, see measure_size
+        self.size = None
+
+    def __iter__(self):
+
+        records = False
+        # end of the last line of previous chunk
+        rest = ''
+        size = Size(0, 1, 0)
+        for chunk, records in self.get_chunks():
+            start = time.perf_counter()
+            
+            size = _add_chunk(size, chunk, records, self.record_length)
+            text = chunk.decode('latin-1')
+            if records:
+                length = self.record_length
+                lines = [text[begin:begin+length] for begin in range(0, len(text), length)]
+            else:
+                carriage_return = '\r' in text or '\r' in rest
+                lines = text.split('\n')
+                lines[0] = rest + lines[0]
+                # continued in next chunk
+                rest = lines.pop()
+                if carriage_return:
+                    lines = _split_carriage_returns(lines)
+            if self.normalise is not None:
+                lines = [self.normalise(line) for line in lines]
+            
+            decoding_seconds[self.encoding] += time.perf_counter() - start
+            decoded_bytes[self.encoding] += len(chunk)
+            yield from lines
+        
+        if not records:
+            # a final carriage return is an end of line
+            lines = rest.split('\r')
+            if self.normalise is not None:
+                lines = [self.normalise(line) for line in lines]
+            yield from lines
+        
+        self.size = size
+
+    def get_chunks(self):
+        """
+        Chunks of the file translated into Latin-1, with True for a file made 
+        of records of record_length.
+        """
+        translation = get_translation(self.encoding)
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                # empty files cannot be mapped
+                return
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        with data:
+            records = False
+            length = chunk_size
+            if self.record_length and _get_end_of_line(translation).search(data) is None:
+                # no end of line : records
+                records = True
+                length -= chunk_size % self.record_length
+            
+            for begin in range(0, size, length):
+                chunk = data[begin:begin+length]
+                if translation is not None:
+                    chunk = chunk.translate(translation)
+                yield chunk, records
+
+    def measure_size(self):
+        """
+        Size of the code, see scheduling.measure_size, counted on the bytes of
+        the file. 
+        
+        The file is read only when the lines have not been iterated.
+        """
+        if self.size is not None:
+            return self.size
+        
+        size = Size(0, 1, 0)
+        for chunk, records in self.get_chunks():
+            size = _add_chunk(size, chunk, records, self.record_length)
+        return size
+
+
+def _add_chunk(size, chunk, records, record_length):
+    """
+    Size plus the size of a chunk of the file.
+    """
+    lines = len(chunk) // record_length if records else chunk.count(b'\n')
+    return Size(size.bytes + len(chunk), size.lines + lines, size.sql_blocks + len(_sql.findall(chunk)))
+
+
+def _get_end_of_line(translation):
+    """
+    Regular expression of the bytes translated into an end of line.
+    """
+    if translation is None:
+        return re.compile(b'\n')
+    return re.compile(b'[' + re.escape(bytes(byte for byte in range(256) if translation[byte] == ord('\n'))) + b']')
+
+
+def _split_carriage_returns(lines):
+    """
+    Lines ended by CRLF or CR, as in universal newlines mode.
+    """
+    result = []
+    for line in lines:
+        if line.endswith('\r'):
+            line = line[:-1]
+        if '\r' in line:
+            result.extend(line.split('\r'))
+        else:
+            result.append(line)
+    return result
@@ -0,0 +1,31 @@
+"""
+Normalisation of the code read from a file, before lexing.
+
+Mainframe exports often carry sequence numbers or tags in columns 73 to 80,
+outside of the statement area, and files edited off the mainframe get CRLF
+line ends and tabs. Without normalisation each tag is a token of its line.
+
+Normalisation keeps the columns of the statement area, turns tabs and
+carriage returns into one blank each and drops the trailing blanks. Lines are
+neither added nor removed and a character keeps its column, so positions of
+tokens, and bookmarks, are those of the original file.
+"""
+
+
+# statement area of Easytrieve : columns 1 to 72
+right_margin = 72
+
+# characters of one column replaced by a blank
+_blanks = str.maketrans('\t\r\f\v', '    ')
+
+
+def normalise(text, right_margin=right_margin):
+    """
+    Normalised text.
+
+    :param right_margin: last column kept, 0 for keeping whole lines
+    """
+    lines = text.translate(_blanks).split('\n')
+    if right_margin:
+        return '\n'.join([line[:right_margin].rstrip() for line in lines])
+    return '\n'.join([line.rstrip() for line in lines])
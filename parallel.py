@@ -0,0 +1,250 @@
+"""
+Parallel second pass.
+
+Parsing, resolution and link collection of the modules are spread over a pool 
+of processes. Workers return the symbols, the resolved AST and the links of a 
+module. The main process keeps sole ownership of the knowledge base : it saves 
+the results in library order, so that the output is the same as the serial run.
+"""
+import contextlib, io, pickle, traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import light_parser
+from ast_cache import load_ast
+from symbols import Library, Module
+from instrumentation import Instrumentation, count_tree
+
+
+# worker side : a library of module stubs, used for resolution of CALL
+_library = None
+# id of module stub -> index in library
+_indexes = {}
+
+
+def _initialise_worker(descriptions):
+    """
+    :param descriptions: list of (path, name, first line) of the modules of the library
+    """
+    global _library, _indexes
+    
+    _library = Library()
+    for path, name, first_line in descriptions:
+        _library.add_module(Module(path, name=name, first_line=first_line))
+    
+    _indexes = {id(module): index for index, module in enumerate(_library.get_modules())}
+
+
+class ResultPickler(pickle.Pickler):
+    """
+    Pickles modules by their index in the library.
+    """
+    def __init__(self, file, indexes):
+        
+        pickle.Pickler.__init__(self, file, pickle.HIGHEST_PROTOCOL)
+        self.indexes = indexes
+    
+    def persistent_id(self, obj):
+        
+        if type(obj) is Module:
+            return self.indexes.get(id(obj))
+        return None
+
+
+class ResultUnpickler(pickle.Unpickler):
+    """
+    Unpickles modules as the modules of the library.
+    """
+    def __init__(self, file, modules):
+        
+        pickle.Unpickler.__init__(self, file)
+        self.modules = modules
+    
+    def persistent_load(self, index):
+        
+        return self.modules[index]
+
+
+def analyse_module(index, text, ast_data, budget=None, degraded=None):
+    """
+    Worker : parse, resolve and collect the links of a module.
+    
+    :param index: index of the module in library
+    :param text: code of the module, when ast_data is None, see Module.get_lines
+    :param ast_data: optional stored AST of the module, see ast_cache
+    :param budget: optional budget.Budget of parsing
+    :param degraded: Module.degraded of the module 
+    
+    Returns (pickled (symbols, ast, links, degraded), None, phases, match stats) 
+    or (None, traceback, phases, match stats), phases being the measures of 
+    the worker, see instrumentation, and match stats the counts of the module 
+    added to light_parser.match_stats.
+    """
+    stub = _library.get_modules()[index]
+    path = stub.get_path()
+    instrumentation = Instrumentation()
+    match_stats = dict(light_parser.match_stats)
+    try:
+        module = Module(path, text=text, name=stub.get_name(), first_line=stub.first_line)
+        module.library = _library
+        module.degraded = degraded
+        
+        with instrumentation.phase(path, 'parse'):
+            module.fully_parse(load_ast(ast_data), budget=budget)
+        instrumentation.add(path, 'parse', **count_tree(module.get_ast()))
+        with instrumentation.phase(path, 'resolve'):
+            module.resolve()
+        with instrumentation.phase(path, 'save_links'):
+            links = module.collect_links()
+        
+        indexes = dict(_indexes)
+        indexes[id(module)] = index
+        
+        data = io.BytesIO()
+        ResultPickler(data, indexes).dump((module.get_local_symbols(), module.get_ast(), links, module.degraded))
+        return data.getvalue(), None, instrumentation.get_phases(path), _get_match_stats(match_stats)
+    
+    except:
+        return None, traceback.format_exc(), instrumentation.get_phases(path), _get_match_stats(match_stats)
+
+
+def _get_match_stats(before):
+    """
+    Counts of light_parser.match_stats since before.
+    """
+    return {key: value - before.get(key, 0) for key, value in light_parser.match_stats.items()}
+
+
+def analyse_modules(library, workers, ast_cache=None, modules=None, instrumentation=None, order=None, budget=None):
+    """
+    Parse, resolve and collect the links of the modules of a library with 
+    a pool of workers.
+    
+    Yields (module, links, error) in the order of modules. The module has its 
+    symbols and AST reattached ; error is a traceback when analysis failed. 
+    
+    When a worker dies, for example killed for lack of memory, the pool is 
+    broken : the module waited for gets the error and iteration stops, the 
+    remaining modules are left to the caller.
+    
+    :param library: symbols.Library
+    :param workers: int number of processes
+    :param ast_cache: optional ast_cache.AstCache of the first pass
+    :param modules: modules to analyse, all the modules of library by default
+    :param instrumentation: optional instrumentation.Instrumentation receiving 
+                            the measures of the workers
+    :param order: the same modules in the order they are given to the workers, 
+                  see scheduling ; finished results wait for their turn, so 
+                  modules are taken in this order while the ones in flight 
+                  leave one module per worker for the next modules in library
+                  order
+    :param budget: optional budget.Budget of parsing of each module
+    """
+    library_modules = library.get_modules()
+    descriptions = [(module.get_path(), module.get_name(), module.first_line) for module in library_modules]
+    indexes = {id(module): index for index, module in enumerate(library_modules)}
+    if modules is None:
+        modules = library_modules
+    modules = list(modules)
+    if order is None:
+        order = modules
+    
+    # bound the number of modules in flight and of results waiting in memory
+    window = workers * 4
+    # in flight beyond that, modules are taken in library order, so that the 
+    # module waited for is always in flight and every worker busy
+    scheduled_window = window - workers
+    
+    # modules not yet submitted, in scheduled and in library order
+    scheduled = deque(order)
+    in_library_order = deque(modules)
+    
+    with ProcessPoolExecutor(workers, initializer=_initialise_worker, initargs=(descriptions,)) as executor:
+        
+        def submit(module):
+            
+            index = indexes[id(module)]
+            try:
+                ast_data = None
+                if ast_cache is not None:
+                    ast_data = ast_cache.pop_data(module.get_path())
+                text = None
+                if ast_data is None:
+                    with _phase(instrumentation, module.get_path(), 'get_text'):
+                        text = module.get_lines()
+                return module, executor.submit(analyse_module, index, text, ast_data, budget, module.degraded), None
+            except BrokenProcessPool:
+                raise
+            except:
+                return module, None, traceback.format_exc()
+        
+        # id of module -> submitted, until yielded
+        submitted = {}
+        # id of modules given to workers
+        given = set()
+        broken = False
+        for module in modules:
+            
+            while not broken and len(submitted) < window:
+                
+                next_module = None
+                if len(submitted) < scheduled_window:
+                    next_module = _pop_next(scheduled, given)
+                if next_module is None:
+                    next_module = _pop_next(in_library_order, given)
+                if next_module is None:
+                    break
+                try:
+                    submitted[id(next_module)] = submit(next_module)
+                except BrokenProcessPool:
+                    broken = True
+            
+            if id(module) not in submitted:
+                return
+            
+            _, future, _ = submitted[id(module)]
+            yield _receive(submitted.pop(id(module)), library_modules, instrumentation)
+            if future is not None and isinstance(future.exception(), BrokenProcessPool):
+                return
+
+
+def _pop_next(modules, given):
+    """
+    First module of a deque not yet given to workers, marked as given, or None.
+    """
+    while modules:
+        module = modules.popleft()
+        if id(module) not in given:
+            given.add(id(module))
+            return module
+    return None
+
+
+def _phase(instrumentation, path, name):
+    
+    if instrumentation is None:
+        return contextlib.nullcontext()
+    return instrumentation.phase(path, name)
+
+
+def _receive(submitted, modules, instrumentation):
+    
+    module, future, error = submitted
+    if error:
+        return module, [], error
+
+    try:
+        data, error, phases, match_stats = future.result()
+    except:
+        # the worker has died
+        return module, [], traceback.format_exc()
+    if instrumentation is not None:
+        instrumentation.merge(module.get_path(), phases)
+    for key, value in match_stats.items():
+        light_parser.match_stats[key] += value
+    if error:
+        return module, [], error
+    
+    symbols, ast, links, module.degraded = ResultUnpickler(io.BytesIO(data), modules).load()
+    module.reattach(symbols, ast)
+    return module, links, None
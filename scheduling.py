@@ -0,0 +1,99 @@
+"""
+Order in which the modules are analysed in the second pass.
+
+A scheduler predicts the cost of a module from its size, measured in the first
+pass, and orders the modules. Putting the largest modules first avoids a huge
+module processed last dominating the end of a parallel run.
+"""
+import re
+from collections import namedtuple
+from cast.analysers import log
+
+
+# size of a module : bytes, number of lines, number of SQL blocks
+Size = namedtuple('Size', ['bytes', 'lines', 'sql_blocks'])
+
+_sql = re.compile(r'\bSQL\b')
+
+
+def measure_size(text):
+    """
+    Size of the code of a module.
+    
+    :param text: str or mapping.MappedLines
+    """
+    if not isinstance(text, str):
+        return text.measure_size()
+    return Size(len(text), text.count('\n') + 1, len(_sql.findall(text)))
+
+
+class Scheduler:
+    """
+    Keeps the library order.
+
+    Subclasses redefine predict_cost.
+    """
+    def predict_cost(self, size):
+        """
+        Predicted cost of a module of a given size, in seconds.
+
+        :param size: Size or None when unknown
+        """
+        return 0
+
+    def order(self, modules):
+        """
+        Modules in the order of analysis, most costly first.
+
+        Module size is read from module.size.
+        """
+        return sorted(modules, key=lambda module: self.predict_cost(module.size), reverse=True)
+
+
+class LargestFirst(Scheduler):
+    """
+    Cost is the size in bytes.
+    """
+    def predict_cost(self, size):
+
+        if size is None:
+            return 0
+        return size.bytes
+
+
+class CostWeighted(Scheduler):
+    """
+    Cost is a weighted sum of bytes, lines and SQL blocks.
+
+    Default weights, in seconds, have been measured on tests/IBM.sample.
+    """
+    def __init__(self, byte_weight=5e-7, line_weight=1e-4, sql_block_weight=2e-3):
+
+        self.byte_weight = byte_weight
+        self.line_weight = line_weight
+        self.sql_block_weight = sql_block_weight
+
+    def predict_cost(self, size):
+
+        if size is None:
+            return 0
+        return size.bytes * self.byte_weight + size.lines * self.line_weight + size.sql_blocks * self.sql_block_weight
+
+
+schedulers = {
+    'library':Scheduler,
+    'largest':LargestFirst,
+    'cost':CostWeighted
+}
+
+default_scheduler = 'cost'
+
+
+def get_scheduler(name):
+    """
+    Scheduler by name, see schedulers ; the default one when name is unknown.
+    """
+    if name not in schedulers:
+        log.warning('EASYTRIEVE_SCHEDULER=' + str(name) + ' is not available, ' + default_scheduler + ' is used instead')
+        name = default_scheduler
+    return schedulers[name]()
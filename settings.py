@@ -0,0 +1,27 @@
+"""
+Tuning settings of the analyzer.
+
+Each setting has a default value that can be overridden by an environment
+variable named EASYTRIEVE_<NAME>, for example::
+
+    EASYTRIEVE_AST_MEMORY_BUDGET=64
+"""
+import os
+
+
+def get_setting(name, default):
+    """
+    Value of a setting, converted to the type of its default value.
+    """
+    value = os.environ.get('EASYTRIEVE_' + name.upper())
+    if value is None:
+        return default
+    
+    value = value.strip()
+    if isinstance(default, bool):
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return value
@@ -0,0 +1,128 @@
+"""
+Recognition of the content of a source file from its first characters.
+
+A file with an Easytrieve extension is not always Easytrieve : members of a
+library may have been unloaded with a wrong extension, or several members
+concatenated in an IEBUPDTE input. The first few KB tell :
+
+- program : an Easytrieve program
+- macro : an Easytrieve macro
+- iebupdte : members separated by './ ADD NAME=...' lines, see split_members
+- jcl, cobol, data : not Easytrieve, not analysed
+"""
+import re
+from collections import namedtuple
+
+
+PROGRAM = 'program'
+MACRO = 'macro'
+IEBUPDTE = 'iebupdte'
+JCL = 'jcl'
+COBOL = 'cobol'
+DATA = 'data'
+
+# kinds of content that are analysed
+easytrieve = [PROGRAM, MACRO]
+
+# number of characters read for recognition
+prefix_size = 4096
+
+
+# division header, in the code area after the sequence number
+_cobol = re.compile(r'[ \d]{0,10}(IDENTIFICATION|ID)\s+DIVISION\s*\.', re.IGNORECASE)
+_comment = re.compile(r'[ \d]*\*')
+# compiler options statement starting a COBOL program
+_cobol_options = re.compile(r'^\s*(CBL|PROCESS)\s', re.IGNORECASE)
+# IEBUPDTE control statement starting a member
+_member = re.compile(r'^\./\s+(ADD|REPL)\b.*\bNAME=([^\s,]+)', re.IGNORECASE)
+
+
+def sniff(prefix):
+    """
+    Kind of content of a file.
+
+    :param prefix: the first characters of the file, see prefix_size
+    """
+    if '\0' in prefix:
+        return DATA
+
+    if prefix.startswith('BEGIN_PROGRAM('):
+        # previously modified code by preprocessor, see easytrieve_parser.parse
+        prefix = prefix[prefix.find('\n')+1:]
+
+    if prefix.startswith('MACRO'):
+        return MACRO
+
+    first_line = next((line for line in prefix.split('\n') if line.strip()), '')
+    if _member.match(first_line):
+        return IEBUPDTE
+    if first_line.startswith('//'):
+        return JCL
+    if _cobol_options.match(first_line) or _is_cobol(prefix):
+        return COBOL
+
+    return PROGRAM
+
+
+def _is_cobol(prefix):
+    """
+    True when a line starts with a COBOL division header.
+
+    Comments and lines starting inside a quoted literal continued from the 
+    previous line are ignored, so that Easytrieve text is not taken for 
+    COBOL.
+    """
+    in_string = False
+    for line in prefix.split('\n'):
+        if not in_string:
+            if _comment.match(line):
+                continue
+            if _cobol.match(line):
+                return True
+        if line.count("'") % 2:
+            in_string = not in_string
+    return False
+
+
+# a member of an IEBUPDTE input
+Member = namedtuple('Member', ['name', 'first_line', 'text'])
+
+
+def split_members(text):
+    """
+    Members of an IEBUPDTE input, in order.
+
+    The control statements are blanked in the members ; first_line is the
+    number, in the whole file, of the first line of the member.
+
+    :rtype: list of Member
+    """
+    result = []
+    name = None
+    first_line = 0
+    lines = []
+
+    for line_number, line in enumerate(text.split('\n'), start=1):
+        if not line.startswith('./'):
+            if name is not None:
+                lines.append(line)
+            continue
+
+        match = _member.match(line)
+        if match is None:
+            # other control statements : NUMBER, ENDUP... blanked for keeping
+            # the lines of the member in place
+            if name is not None:
+                lines.append('')
+            continue
+
+        if name is not None:
+            result.append(Member(name, first_line, '\n'.join(lines)))
+        name = match.group(2)
+        first_line = line_number + 1
+        lines = []
+
+    if name is not None:
+        result.append(Member(name, first_line, '\n'.join(lines)))
+
+    return result
@@ -1,13 +1,23 @@
-import os, re, traceback
+import os, re, traceback, hashlib, functools
 from collections import OrderedDict, defaultdict
 from pathlib import Path
-from cast.analysers import log, CustomObject, Bookmark, create_link
+from cast.analysers import log, Bookmark
 from cast.application import open_source_file
 from easytrieve_parser import parse
 from easytrieve_parser import is_file, is_macro, is_program, is_root
 from easytrieve_parser import is_report, is_procedure, is_sql, is_node
 from light_parser import Node, Token, Walker
 from resolution import resolve as resolution_resolve
+from declarations import scan_declarations, create_tree
+from budget import BudgetExceeded
+from kb_writer import KbWriter
+from settings import get_setting
+import normaliser
+import mapping
+
+
+# writer of modules without library
+_kb_writer = None
 
 
 class Namespace:
@@ -111,6 +121,9 @@ class Symbol(Namespace):
         
         # stats of symbols
         self.rpg_symbol_stats = defaultdict(int)
+        
+        # (guid, properties, file properties, position) once saved
+        self.kb_record = None
     
     def get_metamodel_type(self):
         raise NotImplementedError("Subclasses must implement get_metamodel_type method")
@@ -329,46 +342,29 @@ class Symbol(Namespace):
             else:
                 parent = file
                 
-            kb_symbol = CustomObject()
-            self.__kb_symbol = kb_symbol
-            kb_symbol.set_name(self.__name)
+            writer = self.get_kb_writer()
             if not self.__name:
                 log.debug(str(self.get_ast()))
-            kb_symbol.set_type(self.get_metamodel_type())
-            kb_symbol.set_parent(parent)
-            kb_symbol.set_guid(guid)
-            kb_symbol.set_fullname(self.get_qualified_name())
-            kb_symbol.save()
+            kb_symbol = writer.create_object(self.__name, 
+                                             self.get_metamodel_type(), 
+                                             parent, 
+                                             guid, 
+                                             self.get_qualified_name())
+            self.__kb_symbol = kb_symbol
             current_stats[self.get_metamodel_type()] += 1
 
-            if type(self) != Sql:
-                crc = self.get_code_only_crc()
-                kb_symbol.save_property('checksum.CodeOnlyChecksum', crc)
-    
-                codeLines = self.get_line_count()
-                kb_symbol.save_property('metric.CodeLinesCount', codeLines)
+            properties = self.get_kb_properties()
+            for name, value in properties:
+                writer.save_property(kb_symbol, name, value)
             
-            # special case for sourceFiles
-            if type(self) == Module:
-
-                # in those version range, UA do not calculate LOC on sourceFile so we do it ourself
-                # due to the usage of <languagePattern id="Python" UsedByUA="false">
-                file.save_property('metric.CodeLinesCount', self.get_line_count())
-                file.save_property('metric.BodyCommentLinesCount', self.get_body_comments_line_count())
-                file.save_property('metric.LeadingCommentLinesCount', self.get_header_comments_line_count())
-                file.save_property('comment.sourceCodeComment', ''.join(comment.text+'\n' for comment in self.get_body_comments()))
-                file.save_property('comment.commentBeforeObject', '')
+            file_properties = self.get_file_properties()
+            self.save_file_properties(file, file_properties)
             
-            headerCommentsLines = self.get_header_comments_line_count()
-            if headerCommentsLines:
-                kb_symbol.save_property('metric.LeadingCommentLinesCount', headerCommentsLines)
-                kb_symbol.save_property('comment.commentBeforeObject', ''.join(comment.text+'\n' for comment in self.get_header_comments()))
-            bodyCommentsLines = self.get_body_comments_line_count()
-            if bodyCommentsLines:
-                kb_symbol.save_property('metric.BodyCommentLinesCount', bodyCommentsLines)
-                kb_symbol.save_property('comment.sourceCodeComment', ''.join(comment.text+'\n' for comment in self.get_body_comments()))
+            position = self.get_position()
+            writer.save_position(kb_symbol, file, position)
             
-            self._save_position(file)
+            # what has been saved, see incremental
+            self.kb_record = (guid, properties, file_properties, position)
 
         # recurse...
         for symbol in self.get_all_symbols():
@@ -376,9 +372,59 @@ class Symbol(Namespace):
 
         return kb_symbol
 
+    def get_kb_properties(self):
+        """
+        Properties of the knowledge base object, as a list of (name, value)
+        """
+        result = []
+        
+        if type(self) != Sql:
+            result.append(('checksum.CodeOnlyChecksum', self.get_code_only_crc()))
+            result.append(('metric.CodeLinesCount', self.get_line_count()))
+        
+        headerCommentsLines = self.get_header_comments_line_count()
+        if headerCommentsLines:
+            result.append(('metric.LeadingCommentLinesCount', headerCommentsLines))
+            result.append(('comment.commentBeforeObject', ''.join(comment.text+'\n' for comment in self.get_header_comments())))
+        bodyCommentsLines = self.get_body_comments_line_count()
+        if bodyCommentsLines:
+            result.append(('metric.BodyCommentLinesCount', bodyCommentsLines))
+            result.append(('comment.sourceCodeComment', ''.join(comment.text+'\n' for comment in self.get_body_comments())))
+        
+        return result
+    
+    def get_file_properties(self):
+        """
+        Properties of the knowledge base file, as a list of (name, value)
+        """
+        return []
+    
+    def save_file_properties(self, file, properties):
+        
+        writer = self.get_kb_writer()
+        for name, value in properties:
+            writer.save_property(file, name, value)
+    
+    def get_kb_links(self):
+        """
+        Links created on save, as (link type, caller, callee, position)
+        """
+        return []
+    
+    def get_position(self):
+        """
+        Position of the knowledge base object as (begin line, begin column, end line, end column)
+        """
+        # problem with last line try to fix it with end_line +1 and end_column= 1
+        return (self._ast.get_begin_line(),
+                self._ast.get_begin_column(),
+                self._ast.get_end_line()+1,
+                1)
+    
     def clean(self):
         
         self._ast = None
+        self.kb_record = None
         self.__violations = defaultdict(list)
         # use the first code line or not
         self.__first_code_line = set()
@@ -391,12 +437,13 @@ class Symbol(Namespace):
     
     def _save_position(self, file):
         
-        # problem with last line try to fix it with end_line +1 and end_column= 1
-        self.__kb_symbol.save_position(Bookmark(file,
-                                                self._ast.get_begin_line(),
-                                                self._ast.get_begin_column(),
-                                                self._ast.get_end_line()+1,
-                                                1))
+        self.get_kb_writer().save_position(self.__kb_symbol, file, self.get_position())
+    
+    def get_kb_writer(self):
+        """
+        Writer in knowledge base, see kb_writer
+        """
+        return self.get_root_symbol().get_kb_writer()
 
     def set_property(self, property_name, value):
         """
@@ -493,6 +540,10 @@ class Library:
         
         self.modules = []
         self.modules_per_name = defaultdict(list)
+        self.modules_per_path = {}
+        
+        # writes in knowledge base for all modules
+        self.kb_writer = KbWriter()
         
         self.stats = defaultdict(int)
     
@@ -506,6 +557,7 @@ class Library:
         """
         self.modules.append(module)
         self.modules_per_name[module.get_name().upper()].append(module)
+        self.modules_per_path[module.get_path()] = module
         module.library = self
         
     def get_modules(self):
@@ -548,6 +600,12 @@ class Library:
         if len(candidates) >= 1:
             return candidates[0]
         
+    def find_module_by_path(self, path):
+        """
+        Search a module by its exact path.
+        """
+        return self.modules_per_path.get(path)
+        
     def find_program(self, name, in_cl=True):
         """
         Search a program.
@@ -568,9 +626,16 @@ class Module(Symbol):
     shared_link_stats = defaultdict(int)
     shared_error_link_stats = defaultdict(int)
     
-    def __init__(self, path, _file=None, text=None):
-        
-        name, _ = os.path.splitext(os.path.basename(path))
+    def __init__(self, path, _file=None, text=None, name=None, first_line=1):
+        """
+        :param path: path of the file, or of the member for a member of a file
+        :param _file: KB object representing the file
+        :param text: code, read from path by default
+        :param name: name of the module, the file name by default
+        :param first_line: number of the first line of text, for a member of a file
+        """
+        if name is None:
+            name, _ = os.path.splitext(os.path.basename(path))
         Symbol.__init__(self, name)
 
         # KB object representing the file
@@ -578,9 +643,28 @@ class Module(Symbol):
         # optionnaly the code (for tests)
         self.__text = text
         self.__path = path
+        self.first_line = first_line
+        # normalisation of the code read from file, see normaliser : None for 
+        # none, else last column kept, 0 for whole lines
+        self.right_margin = None
+        if get_setting('normalise', False):
+            self.right_margin = get_setting('right_margin', normaliser.right_margin)
+        # EBCDIC code page of the file, see ebcdic ; None for a file read by 
+        # open_source_file
+        self.code_page = None
 
         self.library = None
         self.already_checked = defaultdict(list)
+        # declarations found by light parsing
+        self.declarations = []
+        # number of links created in knowledge base
+        self.created_links = 0
+        # scheduling.Size measured in first pass
+        self.size = None
+        # reason why the module has only its declarations, see budget 
+        self.degraded = None
+        # MemberFile of a member of an IEBUPDTE input, see sniffer
+        self.member_file = None
         
     def update_shared_stats(self):
         for key, value in self.rpg_symbol_stats.items():
@@ -597,6 +681,9 @@ class Module(Symbol):
         """
         if self.__text is not None:
             return self.__text
+        if self.code_page is not None:
+            # decoded once, normalised by lines
+            return '\n'.join(self.get_mapped_lines(self.code_page))
         text = ''
         try:
             with open_source_file(self.get_path()) as f:
@@ -605,43 +692,169 @@ class Module(Symbol):
             log.info("Lookup error with wrong unknown encoding, try by forcing UTF-8 encoding")
             with open_source_file(self.get_path(), encoding="UTF-8") as f:
                 text = f.read()
-
+        
+        if self.right_margin is not None:
+            text = normaliser.normalise(text, self.right_margin)
         return text
     
-    def get_path(self):
+    def get_lines(self):
+        """
+        Return something to pass to parsing method, without reading the whole 
+        text of a large file.
+        - lines of a file larger than EASYTRIEVE_LARGE_FILE_SIZE Mb, or of 
+          an EBCDIC file, read through a memory map, see mapping
+        - or text, see get_text
+        """
+        if self.__text is not None:
+            return self.__text
+        if self.code_page is not None:
+            return self.get_mapped_lines(self.code_page)
+        
+        large_file_size = int(get_setting('large_file_size', 16.0) * 1024 * 1024)
+        encoding = get_setting('encoding', 'latin-1')
+        if not large_file_size or not mapping.is_supported(encoding):
+            return self.get_text()
+        if os.path.getsize(self.get_path()) < large_file_size:
+            return self.get_text()
+        return self.get_mapped_lines(encoding)
+    
+    def get_mapped_lines(self, encoding):
+        """
+        Lines of the file read through a memory map, see mapping.
+        """
+        normalise = None
+        if self.right_margin is not None:
+            normalise = functools.partial(normaliser.normalise, right_margin=self.right_margin)
+        record_length = get_setting('record_length', 80) if self.code_page is not None else 0
+        return mapping.MappedLines(self.get_path(), encoding, normalise, record_length)
+    
+    def get_text_prefix(self, size=4096):
+        """
+        The first characters of the code, enough for recognising its kind 
+        without reading the whole file, see sniffer.
+        """
+        if self.__text is not None:
+            return self.__text[:size]
+        if self.code_page is not None:
+            with open(self.get_path(), 'rb') as f:
+                return f.read(size).translate(mapping.get_translation(self.code_page)).decode('latin-1')
+        try:
+            with open_source_file(self.get_path()) as f:
+                return f.read(size)
+        except LookupError:
+            with open_source_file(self.get_path(), encoding="UTF-8") as f:
+                return f.read(size)
+    
+    def get_content_digest(self):
+        """
+        Digest of the content of the file.
+        """
+        digest = hashlib.sha1()
+        if self.__text is not None:
+            digest.update(self.__text.encode('UTF-8'))
+        else:
+            with open(self.get_path(), 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
         
-        if self.__file:
-            return self.__file.get_path()
+        return digest.hexdigest()
+    
+    def get_path(self):
         
         return self.__path
     
     def get_metamodel_type(self):
         # @todo
         return 'Eztprogram'
+    
+    def get_file_properties(self):
+        
+        # in those version range, UA do not calculate LOC on sourceFile so we do it ourself
+        # due to the usage of <languagePattern id="Python" UsedByUA="false">
+        return [('metric.CodeLinesCount', self.get_line_count()),
+                ('metric.BodyCommentLinesCount', self.get_body_comments_line_count()),
+                ('metric.LeadingCommentLinesCount', self.get_header_comments_line_count()),
+                ('comment.sourceCodeComment', ''.join(comment.text+'\n' for comment in self.get_body_comments())),
+                ('comment.commentBeforeObject', '')]
+        
+    def save_file_properties(self, file, properties):
+        
+        if self.member_file is not None:
+            # saved once for all the members
+            self.member_file.add(properties)
+        else:
+            Symbol.save_file_properties(self, file, properties)
         
-    def light_parse(self):
+    def light_parse(self, text=None):
+        """
+        Scan the declarations of the module, without parsing.
         
+        Enough for populating the library.
+        """
         try:
-            self._ast = list(parse(self.get_text()))
-#             print(self._ast)
-            for node in self._ast:
-                if is_root(node):
-                    self._ast = node
-                    break            
+            if text is None:
+                text = self.get_text()
+            self.declarations = scan_declarations(text, self.first_line)
         except:
-            log.info("Issue during parsing: " + str(traceback.format_exc()))
-                
-    def fully_parse(self):
+            log.info("Issue during scanning: " + str(traceback.format_exc()))
+    
+    def parse(self, text=None, budget=None):
+        """
+        Parse the text and return the root node.
         
+        :param text: the code, read from the file by default 
+        :param budget: optional budget.Budget, BudgetExceeded is raised when exceeded
+        """
+        ast = None
         try:
-            self._ast = list(parse(self.get_text()))
-#             print(self._ast)
-            for node in self._ast:
+            if text is None:
+                text = self.get_text()
+            ast = list(parse(text, budget, self.first_line))
+#             print(ast)
+            for node in ast:
                 if is_root(node):
-                    self._ast = node
+                    ast = node
                     break
+            if budget is not None:
+                budget.check_nodes(ast)
+        except BudgetExceeded:
+            raise
         except:
             log.info("Issue during parsing: " + str(traceback.format_exc()))
+        
+        return ast
+    
+    def parse_declarations(self, text=None):
+        """
+        A tree made of the declarations only, for modules too costly to parse.
+        """
+        if text is None:
+            text = self.get_text()
+        lines = _CountedLines(text.split('\n') if isinstance(text, str) else text)
+        self.light_parse(lines)
+        # lines left by the scan, of a macro
+        for _ in lines:
+            pass
+        return create_tree(self.declarations, self.first_line, self.first_line + lines.last)
+                
+    def fully_parse(self, ast=None, text=None, budget=None):
+        """
+        Parse and create symbols.
+        
+        :param ast: optional root node of a previous parsing of the same text, 
+                    symbols are then reattached to it instead of parsing again
+        :param text: the code, read from the file by default 
+        :param budget: optional budget.Budget, when exceeded only the declarations are kept
+        """
+        if ast is None and not self.degraded:
+            try:
+                ast = self.parse(text, budget)
+            except BudgetExceeded as exception:
+                self.degraded = str(exception)
+        if ast is None and self.degraded:
+            ast = self.parse_declarations(text)
+        if ast is not None:
+            self._ast = ast
 
 #         self._ast.print_tree()
         if self._ast:
@@ -653,11 +866,108 @@ class Module(Symbol):
         
     def save_links(self):
         
+        self.create_links(self.collect_links())
+    
+    def collect_links(self):
+        """
+        Links of the module, see LinkInterpreter.
+        
+        Does not access the knowledge base.
+        """
+        interpreter = LinkInterpreter(self, self.library)
         walker = Walker()
-        walker.register_interpreter(LinkInterpreter(self, self.library))
+        walker.register_interpreter(interpreter)
         walker.walk([self.get_ast()])
+        return interpreter.links
+    
+    def get_kb_writer(self):
+        
+        if self.library is not None:
+            return self.library.kb_writer
+        
+        global _kb_writer
+        if _kb_writer is None:
+            _kb_writer = KbWriter()
+        return _kb_writer
+    
+    def create_links(self, links):
+        """
+        Create collected links in the knowledge base.
+        
+        Links to symbols that have not been saved are skipped, except for 
+        unknown programs which are saved on their first link.
+        """
+        file = self.get_file()
+        writer = self.get_kb_writer()
+        for link_type, caller, callee, position in links:
+            
+            if type(callee) is UnknownProgram and not callee.get_kb_object():
+                callee.get_parent_symbol().add_symbol(callee.get_name(), callee)
+                callee.save(file=file)
+            
+            if not callee.get_kb_object():
+                continue
+            
+            writer.create_link(link_type, 
+                               caller.get_kb_object(), 
+                               callee.get_kb_object(),
+                               file, 
+                               position)
+            self.created_links += 1
+    
+    def reattach(self, symbols, ast):
+        """
+        Take the symbols and AST of an analysis done elsewhere (see parallel)
+        """
+        self.symbols = symbols
+        self._ast = ast
+    
+    def release(self):
+        """
+        Reduce the module to what is needed once saved : name, path and 
+        knowledge base objects, enough for resolving calls to it. 
+        """
+        self.symbols = OrderedDict()
+        self.subObjectsGuids = {}
+        self.sub_objects_names = {}
+        self.rpg_symbol_stats = defaultdict(int)
+        self.already_checked = defaultdict(list)
+        self.declarations = []
+        self._ast = None
+        self.kb_record = None
                     
 
+class MemberFile:
+    """
+    Knowledge base file of the members of an IEBUPDTE input.
+    
+    Members add their file properties, saved once for the file after the 
+    last member : counts are summed and comments joined, leading comments 
+    are the ones of the first member.
+    """
+    def __init__(self, file, last_member_path):
+        """
+        :param last_member_path: path of the last member analysed
+        """
+        self.file = file
+        self.last_member_path = last_member_path
+        # name -> value, in order
+        self.properties = {}
+    
+    def add(self, properties):
+        
+        for name, value in properties:
+            if name not in self.properties:
+                self.properties[name] = value
+            elif name != 'metric.LeadingCommentLinesCount':
+                self.properties[name] += value
+    
+    def save(self, writer):
+        
+        for name, value in self.properties.items():
+            writer.save_property(self.file, name, value)
+
+
 class Procedure(Symbol):
         
     def get_metamodel_type(self):
@@ -681,19 +991,28 @@ class Sql(Symbol):
     def get_metamodel_type(self):
         return 'EasySQLQuery'
 
+    def get_kb_properties(self):
+        
+        return Symbol.get_kb_properties(self) + [('CAST_SQL_MetricableQuery.sqlQuery', self._ast.get_sql_text().text)]
+    
+    def get_kb_links(self):
+        
+        return [('callLink', 
+                 self.get_parent_symbol(), 
+                 self, 
+                 (self.get_begin_line(), 1, self.get_begin_line()+1, 1))]
+
     def save(self, file=None, current_stats=None):
 
         kb_symbol = Symbol.save(self, file, current_stats)
-        parent_kb_symbol = self.get_parent_symbol().get_kb_object()
-        bookmark = Bookmark(self.get_root_symbol().get_file(),
-                            self.get_begin_line(),
-                            1,
-                            self.get_begin_line()+1,
-                            1
-                            )
-        create_link('callLink', parent_kb_symbol, kb_symbol, bookmark)
-        kb_symbol.save_property('CAST_SQL_MetricableQuery.sqlQuery',
-                                self._ast.get_sql_text().text)
+        for link_type, caller, callee, position in self.get_kb_links():
+            self.get_kb_writer().create_link(link_type, 
+                                             caller.get_kb_object(), 
+                                             callee.get_kb_object(), 
+                                             self.get_root_symbol().get_file(), 
+                                             position)
+            self.get_root_symbol().created_links += 1
+        return kb_symbol
 
 
 class UnknownProgram(Symbol):
@@ -701,16 +1020,18 @@ class UnknownProgram(Symbol):
     def get_metamodel_type(self):
         return 'EasyCalltoProgram'
 
-    def save(self, file=None, current_stats=None):
-
-        kb_symbol = Symbol.save(self, file, current_stats)
-        kb_symbol.save_property('CAST_CallToProgram.programName',
-                                self.get_name())
+    def get_kb_properties(self):
+        
+        return Symbol.get_kb_properties(self) + [('CAST_CallToProgram.programName', self.get_name())]
 
 
 class LinkInterpreter:
     """
-    Creates links.
+    Collects links.
+    
+    Links are collected as (link type, caller symbol, callee symbol, position) 
+    and created afterwards by Module.create_links, so that collecting does not 
+    need the knowledge base.
     """
     def __init__(self, module, library):
         
@@ -719,6 +1040,12 @@ class LinkInterpreter:
         
         # stack of symbols
         self.__symbol_stack = [module]
+        
+        # collected links
+        self.links = []
+        
+        # unknown programs created : (parent, name) -> UnknownProgram
+        self.__unknown_programs = {}
     
     def push_symbol(self, symbol):
         
@@ -763,6 +1090,20 @@ class LinkInterpreter:
                         ast.get_code_begin_line(), 
                         80)            
     
+    def add_links(self, link_type, identifier):
+        """
+        Collect a link from current symbol to each symbol the identifier is resolved as.
+        """
+        caller = self.get_current_symbol()
+        position = (identifier.get_begin_line(), 
+                    identifier.get_begin_column(), 
+                    identifier.get_end_line(), 
+                    identifier.get_end_column())
+        
+        for symbol in identifier.resolved_as:
+            
+            self.links.append((link_type, caller, symbol, position))
+    
     def start_Procedure(self, procedure):
         
         symbol = self.get_current_symbol().find_local_symbol(procedure.get_name(),
@@ -776,17 +1117,7 @@ class LinkInterpreter:
     
     def start_Perform(self, statement):
         
-        procedure = statement.get_procedure()
-        caller = self.get_current_kb_symbol()
-        for symbol in procedure.resolved_as:
-            
-            if not symbol.get_kb_object():
-                continue
-        
-            create_link('callLink', 
-                        caller, 
-                        symbol.get_kb_object(),
-                        self.create_bookmark(procedure))
+        self.add_links('callLink', statement.get_procedure())
         
     def start_Finish(self, statement):
         self.start_Perform(statement)
@@ -795,141 +1126,58 @@ class LinkInterpreter:
         self.start_Perform(statement)
 
     def start_Put(self, statement):
-        file = statement.get_file()
-        caller = self.get_current_kb_symbol()
-        
-        for symbol in file.resolved_as:
-            
-            if not symbol.get_kb_object():
-                continue
         
-            create_link('accessWriteLink', 
-                        caller, 
-                        symbol.get_kb_object(),
-                        self.create_bookmark(file))
+        self.add_links('accessWriteLink', statement.get_file())
 
         # optional from
         file = statement.get_from()
         if not file:
             return
         
-        for symbol in file.resolved_as:
-            
-            if not symbol.get_kb_object():
-                continue
-        
-            create_link('accessReadLink', 
-                        caller, 
-                        symbol.get_kb_object(),
-                        self.create_bookmark(file))
+        self.add_links('accessReadLink', file)
         
     def start_Write(self, statement):
         self.start_Put(statement)
 
     def start_Get(self, statement):
-        file = statement.get_file()
-        caller = self.get_current_kb_symbol()
-        
-        for symbol in file.resolved_as:
-            
-            if not symbol.get_kb_object():
-                continue
         
-            create_link('accessReadLink', 
-                        caller, 
-                        symbol.get_kb_object(),
-                        self.create_bookmark(file))
+        self.add_links('accessReadLink', statement.get_file())
 
     def start_Point(self, statement):
-        file = statement.get_file()
-        caller = self.get_current_kb_symbol()
         
-        for symbol in file.resolved_as:
-            
-            if not symbol.get_kb_object():
-                continue
-        
-            create_link('accessWriteLink', 
-                        caller, 
-                        symbol.get_kb_object(),
-                        self.create_bookmark(file))
+        self.add_links('accessWriteLink', statement.get_file())
 
     def start_Job(self, statement):
         file = statement.get_input()
         if not file:
             return
-        caller = self.get_current_kb_symbol()
         
-        for symbol in file.resolved_as:
-            
-            if not symbol.get_kb_object():
-                continue
-        
-            create_link('accessReadLink', 
-                        caller, 
-                        symbol.get_kb_object(),
-                        self.create_bookmark(file))
+        self.add_links('accessReadLink', file)
 
     def start_Sort(self, statement):
-        caller = self.get_current_kb_symbol()
         file = statement.get_sorted()
         if not file:
             return
         
-        for symbol in file.resolved_as:
-            
-            if not symbol.get_kb_object():
-                continue
-        
-            create_link('accessReadLink', 
-                        caller, 
-                        symbol.get_kb_object(),
-                        self.create_bookmark(file))
+        self.add_links('accessReadLink', file)
 
         file = statement.get_to()
         if not file:
             return
         
-        for symbol in file.resolved_as:
-            
-            if not symbol.get_kb_object():
-                continue
-        
-            create_link('accessWriteLink', 
-                        caller, 
-                        symbol.get_kb_object(),
-                        self.create_bookmark(file))
+        self.add_links('accessWriteLink', file)
 
     def start_Print(self, statement):
-        file = statement.get_report()
-        caller = self.get_current_kb_symbol()
         
-        for symbol in file.resolved_as:
-            
-            if not symbol.get_kb_object():
-                continue
-        
-            create_link('accessReadLink', 
-                        caller, 
-                        symbol.get_kb_object(),
-                        self.create_bookmark(file))
+        self.add_links('accessReadLink', statement.get_report())
 
     def start_Call(self, statement):
         program = statement.get_called_program()
-        caller = self.get_current_kb_symbol()
         
         # ensure we have something
         self.create_unkonwn_program_if_needed(program)
         
-        for symbol in program.resolved_as:
-            
-            if not symbol.get_kb_object():
-                continue
-        
-            create_link('callLink', 
-                        caller, 
-                        symbol.get_kb_object(),
-                        self.create_bookmark(program))
+        self.add_links('callLink', program)
 
     def create_unkonwn_program_if_needed(self, identifier):
         # create an unknown program if needed
@@ -938,13 +1186,15 @@ class LinkInterpreter:
         
         parent = self.get_current_symbol()
         name = identifier.get_name()
-        unknown = parent.find_local_symbol(name, [UnknownProgram])
+        unknown = self.__unknown_programs.get((parent, name.upper()))
+        if not unknown:
+            unknown = parent.find_local_symbol(name, [UnknownProgram])
         if not unknown:
+            # registered in parent and saved when its link is created
             unknown = UnknownProgram(name, parent)
             unknown.__start_line = identifier.get_begin_line()
             unknown._ast = identifier
-            parent.add_symbol(name, unknown)
-            unknown.save(file=self.file)
+            self.__unknown_programs[(parent, name.upper())] = unknown
         
         identifier.resolved_as = [unknown]
             
@@ -971,3 +1221,24 @@ def get_closests(modules, path):
     return [module for module in modules if file_distance(module, path) == m]
 
 
+
+
+class _CountedLines:
+    """
+    Lines of a module, counted while iterated.
+    """
+    def __init__(self, lines):
+        
+        self.lines = iter(lines)
+        # number of lines iterated
+        self.count = 0
+        # index of the last line that is not blank
+        self.last = 0
+    
+    def __iter__(self):
+        
+        for line in self.lines:
+            if line and not line.isspace():
+                self.last = self.count
+            self.count += 1
+            yield line
@@ -0,0 +1,71 @@
+import unittest
+from ast_cache import AstCache
+from easytrieve_parser import parse, is_root, Procedure, Perform
+from symbols import Module, Procedure as ProcedureSymbol
+
+
+text = '''
+* 
+PERFORM CLOSE-CUXAD-CURS
+
+CLOSE-CUXAD-CURS. PROC.
+  SQL CLOSE CUXAD-CURS
+END-PROC.
+'''
+
+def parse_root(text):
+    
+    for node in parse(text):
+        if is_root(node):
+            return node
+
+
+class TestAstCache(unittest.TestCase):
+
+    def test_in_memory(self):
+
+        cache = AstCache(1024 * 1024)
+        cache.put('PGM.ezt', parse_root(text))
+        
+        self.assertEqual(1, cache.stats['in memory'])
+        
+        ast = cache.pop('PGM.ezt')
+        perform = list(ast.get_sub_nodes(Perform))[0]
+        self.assertEqual('CLOSE-CUXAD-CURS', perform.get_procedure().get_name())
+        self.assertEqual(3, perform.get_begin_line())
+        
+        # consumed
+        self.assertIsNone(cache.pop('PGM.ezt'))
+        self.assertEqual(0, cache.memory_size)
+
+    def test_spilled(self):
+
+        cache = AstCache(0)
+        cache.put('PGM.ezt', parse_root(text))
+        
+        self.assertEqual(1, cache.stats['spilled'])
+        self.assertIn('PGM.ezt', cache)
+        
+        ast = cache.pop('PGM.ezt')
+        procedure = list(ast.get_sub_nodes(Procedure))[0]
+        self.assertEqual('CLOSE-CUXAD-CURS', procedure.get_name())
+        cache.close()
+
+    def test_reattach_symbols(self):
+        
+        cache = AstCache(1024 * 1024)
+        
+        module = Module('PGM.ezt', text=text)
+        cache.put('PGM.ezt', module.parse())
+        module.clean()
+        
+        module.fully_parse(cache.pop('PGM.ezt'))
+        
+        procedure = module.find_local_symbols("CLOSE-CUXAD-CURS", [ProcedureSymbol])[0]
+        self.assertEqual(5, procedure.get_begin_line())
+        self.assertEqual(1, len(procedure.get_all_symbols()))
+        self.assertEqual(module.get_ast().get_code_only_crc(), parse_root(text).get_code_only_crc())
+
+
+if __name__ == "__main__":
+    unittest.main()
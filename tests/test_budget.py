@@ -0,0 +1,80 @@
+import unittest
+import os
+from unittest import mock
+from budget import Budget, BudgetExceeded
+from easytrieve_parser import parse
+from lexer import EasyTrieveLexer
+from symbols import Module, File, Procedure, Report
+
+
+text = '''*
+FILE PERSNL FB(150 1800)
+  NAME 17 8 A
+REPORT PAY-RPT
+JOB INPUT PERSNL
+  DISPLAY 'TOTAL'
+  PERFORM CLOSE-CUXAD-CURS
+CLOSE-CUXAD-CURS. PROC.
+END-PROC.
+'''
+
+
+class TestBudget(unittest.TestCase):
+    
+    def test_tokens(self):
+        
+        self.assertRaises(BudgetExceeded, list, parse(text, Budget(tokens=10)))
+        self.assertTrue(list(parse(text, Budget(tokens=1000))))
+    
+    def test_seconds(self):
+        
+        self.assertRaises(BudgetExceeded, list, parse(text * 100, Budget(seconds=1e-9)))
+    
+    def test_seconds_after_last_token(self):
+        
+        clock = [0.0]
+        get_tokens = EasyTrieveLexer.get_tokens
+        def get_tokens_then_wait(lexer, text):
+            yield from get_tokens(lexer, text)
+            # time is over once all the tokens have been read
+            clock[0] = 100.0
+        
+        with mock.patch('budget.time.perf_counter', lambda: clock[0]), \
+             mock.patch.object(EasyTrieveLexer, 'get_tokens', get_tokens_then_wait), \
+             mock.patch.dict(os.environ, {'EASYTRIEVE_FUSED_PARSER':'0'}):
+            
+            # stacked filters group statements after the last token
+            self.assertRaises(BudgetExceeded, list, parse(text, Budget(seconds=10)))
+            clock[0] = 0.0
+            self.assertTrue(list(parse(text, Budget(seconds=1000))))
+    
+    def test_nodes(self):
+        
+        module = Module('PGM.ezt', text=text)
+        self.assertRaises(BudgetExceeded, module.parse, None, Budget(nodes=2))
+    
+    def test_fallback_to_declarations(self):
+        
+        module = Module('PGM.ezt', text=text)
+        module.fully_parse(budget=Budget(tokens=10))
+        
+        self.assertEqual('more than 10 tokens', module.degraded)
+        self.assertEqual([('PERSNL', File, 2), ('PAY-RPT', Report, 4), ('CLOSE-CUXAD-CURS', Procedure, 8)], 
+                         [(symbol.get_name(), type(symbol), symbol.get_begin_line()) for symbol in module.get_all_symbols()])
+        self.assertEqual((1, 1, 10, 1), module.get_position())
+        
+        # nothing to resolve
+        module.resolve()
+        self.assertEqual([], module.collect_links())
+    
+    def test_within_budget(self):
+        
+        module = Module('PGM.ezt', text=text)
+        module.fully_parse(budget=Budget(seconds=10, tokens=1000, nodes=100))
+        
+        self.assertIsNone(module.degraded)
+        self.assertEqual(3, len(module.get_all_symbols()))
+
+
+if __name__ == "__main__":
+    unittest.main()
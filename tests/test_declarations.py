@@ -0,0 +1,97 @@
+import os, glob, unittest
+from declarations import scan_declarations, Declaration
+from easytrieve_parser import parse, is_root, is_file, is_procedure, is_report
+
+
+def parse_declarations(text):
+    """
+    Declarations found by full parsing.
+    """
+    result = []
+    for node in parse(text):
+        if not is_root(node):
+            continue
+        for sub_node in node.get_sub_nodes():
+            if is_file(sub_node) or is_report(sub_node):
+                name = list(sub_node.get_children())[1]
+            elif is_procedure(sub_node):
+                name = list(sub_node.get_children())[0]
+            else:
+                continue
+            kind = 'file' if is_file(sub_node) else 'report' if is_report(sub_node) else 'procedure'
+            result.append(Declaration(kind, sub_node.get_name(), name.get_begin_line(), name.get_begin_column()))
+    
+    return result
+
+
+class TestDeclarations(unittest.TestCase):
+    
+    def test_declarations(self):
+        
+        text = """*
+FILE PERSNL FB(150 1800)
+  NAME 17 8 A
+WORK-NAME W 8 A
+REPORT PAY-RPT
+JOB INPUT PERSNL
+  PERFORM CLOSE-CUXAD-CURS
+CLOSE-CUXAD-CURS. PROC.
+  DISPLAY 'FILE X'
+END-PROC.
+OTHER PROC
+END-PROC
+"""
+        self.assertEqual([Declaration('file', 'PERSNL', 2, 6),
+                          Declaration('report', 'PAY-RPT', 5, 8),
+                          Declaration('procedure', 'CLOSE-CUXAD-CURS', 8, 1),
+                          Declaration('procedure', 'OTHER', 11, 1)], 
+                         scan_declarations(text))
+        self.assertEqual(parse_declarations(text), scan_declarations(text))
+
+    def test_first_token_is_program(self):
+        
+        text = """FILE PERSNL
+FILE OTHER
+"""
+        self.assertEqual([Declaration('file', 'OTHER', 2, 6)], scan_declarations(text))
+        self.assertEqual(parse_declarations(text), scan_declarations(text))
+
+    def test_sql(self):
+        
+        text = """*
+SQL DECLARE CURSOR1 CURSOR FOR +
+    SELECT FILE FROM REPORT
+FILE X SQL (SELECT PROC +
+    FROM T)
+"""
+        self.assertEqual([Declaration('file', 'X', 4, 6)], scan_declarations(text))
+        self.assertEqual(parse_declarations(text), scan_declarations(text))
+
+    def test_macro(self):
+        
+        self.assertEqual([], scan_declarations("""MACRO 0 LOC()
+FILE X
+MEND
+"""))
+
+    def test_lines(self):
+        
+        for text in ["FILE A\nFILE B\n", "BEGIN_PROGRAM(X)\nFILE A\n\nFILE\n\n  B\nP1\n.\nPROC\n", 
+                     "MACRO 0\nFILE X\n", "", "BEGIN_PROGRAM(X)"]:
+            self.assertEqual(scan_declarations(text), scan_declarations(iter(text.split('\n'))), repr(text))
+        
+        self.assertEqual([Declaration('file', 'B', 5, 3), Declaration('procedure', 'P1', 6, 1)], 
+                         scan_declarations(iter(['FILE A', 'FILE', '* X', '', '  B', 'P1', '.', 'PROC'])))
+
+    def test_same_as_parser(self):
+        
+        directory = os.path.join(os.path.dirname(__file__), 'IBM.sample')
+        for path in sorted(glob.glob(os.path.join(directory, '*'))):
+            with open(path, encoding='latin-1') as f:
+                text = f.read()
+            
+            self.assertEqual(parse_declarations(text), scan_declarations(text), path)
+
+
+if __name__ == "__main__":
+    unittest.main()
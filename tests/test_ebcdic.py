@@ -0,0 +1,87 @@
+import unittest
+import os, tempfile
+from ebcdic import detect, get_characters, Detector
+from mapping import MappedLines
+from symbols import Module
+
+
+class TestEbcdic(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(os.path.dirname(__file__), 'IBM.sample', 'DEMODB2A.ezt')
+        with open(path, encoding='latin-1') as f:
+            self.text = f.read()
+
+    def tearDown(self):
+
+        self.directory.cleanup()
+
+    def write(self, data, name='PROGA.ezt'):
+
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_detect(self):
+
+        self.assertIsNone(detect(self.text.encode('latin-1')))
+        self.assertIsNone(detect(b''))
+        self.assertEqual('cp037', detect(self.text.encode('cp037')))
+        self.assertEqual('cp500', detect(self.text.encode('cp037'), 'cp500'))
+        # not sign of cp037 is circumflex in cp500
+        self.assertEqual('cp037', detect("IF A \xac= B\n".encode('cp037'), 'cp500'))
+
+    def test_cp1047(self):
+
+        characters = get_characters('cp1047')
+        self.assertEqual('[', characters[0xAD])
+        self.assertEqual(']', characters[0xBD])
+        self.assertEqual(get_characters('cp037')[0xC1:0xFA], characters[0xC1:0xFA])
+
+    def test_detector(self):
+
+        detector = Detector()
+        path = self.write(self.text.encode('cp037'))
+        self.assertEqual('cp037', detector.get_code_page(path))
+        # decision of the directory, the file is not read
+        self.assertEqual('cp037', detector.get_code_page(os.path.join(self.directory.name, 'PROGB.ezt')))
+        self.assertEqual({'cp037':2}, dict(detector.stats))
+
+    def test_line_ends(self):
+
+        lines = self.text.split('\n')
+        # NL and LF
+        path = self.write(self.text.encode('cp037').replace(b'\x25', b'\x15'))
+        self.assertEqual(lines, list(MappedLines(path, 'cp037')))
+        path = self.write(self.text.encode('cp037'))
+        self.assertEqual(lines, list(MappedLines(path, 'cp037', record_length=80)))
+
+    def test_records(self):
+
+        records = [line.ljust(80) for line in self.text.rstrip('\n').split('\n')]
+        path = self.write(''.join(records).encode('cp500'))
+        self.assertEqual(records, list(MappedLines(path, 'cp500', record_length=80)))
+        self.assertEqual(len(records), MappedLines(path, 'cp500', record_length=80).measure_size().lines - 1)
+
+    def test_module(self):
+
+        path = self.write(self.text.encode('cp037').replace(b'\x25', b'\x15'))
+        module = Module(path)
+        module.code_page = 'cp037'
+
+        self.assertEqual(self.text, module.get_text())
+        self.assertEqual(self.text[:100], module.get_text_prefix(100))
+        self.assertEqual(self.text.split('\n'), list(module.get_lines()))
+
+        module.fully_parse(text=module.get_lines())
+        expected = Module('DEMODB2A.ezt', text=self.text)
+        expected.fully_parse()
+        self.assertEqual([(symbol.get_name(), symbol.get_ast().get_begin_line()) for symbol in expected.get_all_symbols()],
+                         [(symbol.get_name(), symbol.get_ast().get_begin_line()) for symbol in module.get_all_symbols()])
+
+
+if __name__ == "__main__":
+    unittest.main()
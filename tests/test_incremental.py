@@ -0,0 +1,195 @@
+import json, os, tempfile, unittest
+from unittest import mock
+from incremental import Manifest, is_valid, record_module, replay, CallCollector
+from kb_writer import KbWriter, LocalBackend
+from light_parser import Walker
+from symbols import Library, Module, MemberFile
+
+
+def get_calls(module):
+    
+    collector = CallCollector()
+    walker = Walker()
+    walker.register_interpreter(collector)
+    walker.walk([module.get_ast()])
+    return collector.calls
+
+
+class SourceFile:
+    """
+    Stands for the file given by the analyser.
+    """
+    def __init__(self, path):
+        self.path = path
+    
+    def get_path(self):
+        return self.path
+
+
+class TestIncremental(unittest.TestCase):
+
+    def test_manifest(self):
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'manifest.json')
+            
+            manifest = Manifest(path, version='1')
+            manifest.load()
+            manifest.set_record('PGM.ezt', {'digest': 'abc', 'calls': []})
+            manifest.save()
+            
+            manifest = Manifest(path, version='1')
+            manifest.load()
+            self.assertEqual([], manifest.get_record('PGM.ezt', 'abc')['calls'])
+            # file changed
+            self.assertIsNone(manifest.get_record('PGM.ezt', 'def'))
+            
+            # plugin changed
+            manifest = Manifest(path, version='2')
+            manifest.load()
+            self.assertIsNone(manifest.get_record('PGM.ezt', 'abc'))
+
+    def test_settings_version(self):
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'manifest.json')
+            
+            manifest = Manifest(path)
+            manifest.set_record('PGM.ezt', {'digest': 'abc', 'calls': []})
+            manifest.save()
+            
+            manifest = Manifest(path)
+            manifest.load()
+            self.assertIsNotNone(manifest.get_record('PGM.ezt', 'abc'))
+            
+            # output of the same file changes
+            for name, value in [('NORMALISE', '1'), ('RIGHT_MARGIN', '0'), ('DETECT_EBCDIC', '0'), 
+                                ('EBCDIC_CODE_PAGE', 'cp500'), ('RECORD_LENGTH', '100'), ('ENCODING', 'cp1252')]:
+                with mock.patch.dict(os.environ, {'EASYTRIEVE_' + name: value}):
+                    manifest = Manifest(path)
+                    manifest.load()
+                    self.assertIsNone(manifest.get_record('PGM.ezt', 'abc'), name)
+            
+            # not the output
+            with mock.patch.dict(os.environ, {'EASYTRIEVE_WORKERS': '4'}):
+                manifest = Manifest(path)
+                manifest.load()
+                self.assertIsNotNone(manifest.get_record('PGM.ezt', 'abc'))
+
+    def test_digest(self):
+        
+        self.assertEqual(Module('A.ezt', text='CALL B').get_content_digest(), 
+                         Module('A.ezt', text='CALL B').get_content_digest())
+        self.assertNotEqual(Module('A.ezt', text='CALL B').get_content_digest(), 
+                            Module('A.ezt', text='CALL C').get_content_digest())
+
+    def test_call_invalidation(self):
+        
+        library = Library()
+        caller = Module('app/A.ezt', text='''
+JOB INPUT NULL
+  CALL B
+''')
+        library.add_module(caller)
+        caller.fully_parse()
+        caller.resolve()
+        
+        # B does not exist
+        record = {'calls': get_calls(caller)}
+        self.assertEqual([['B', None]], record['calls'])
+        self.assertTrue(is_valid(record, caller, library))
+        
+        # B is added
+        library.add_module(Module('app/B.ezt', text=''))
+        self.assertFalse(is_valid(record, caller, library))
+        
+        caller.resolve()
+        record = {'calls': get_calls(caller)}
+        self.assertEqual([['B', 'app/B.ezt']], record['calls'])
+        self.assertTrue(is_valid(record, caller, library))
+        
+        # B is renamed
+        library = Library()
+        library.add_module(caller)
+        library.add_module(Module('app/C.ezt', text=''))
+        self.assertFalse(is_valid(record, caller, library))
+
+    def test_replay_same_writes(self):
+        
+        def create_library():
+            library = Library()
+            library.kb_writer = KbWriter(LocalBackend())
+            source_file = SourceFile('app/A.ezt')
+            library.add_module(Module('app/B.ezt', _file=SourceFile('app/B.ezt'), text='''
+JOB INPUT NULL
+  DISPLAY 'B'
+'''))
+            library.add_module(Module('app/A.ezt', _file=source_file, text='''
+* caller
+FILE FILEA
+  F1 1 2 A
+JOB INPUT FILEA
+  CALL B
+  PERFORM PROCA
+
+PROCA. PROC
+  DISPLAY F1
+END-PROC
+'''))
+            # members of an IEBUPDTE input
+            lib_file = SourceFile('app/LIB.ezt')
+            member_file = MemberFile(lib_file, 'app/LIB.ezt(M2)')
+            for name, first_line, text in [('M1', 2, "JOB INPUT NULL\n  CALL A\n"), 
+                                           ('M2', 5, "* member\nREPORT R1\nJOB INPUT NULL\n  PRINT R1\n")]:
+                member = Module('app/LIB.ezt(' + name + ')', lib_file, text, name, first_line)
+                member.member_file = member_file
+                library.add_module(member)
+            return library
+        
+        def get_writes(library):
+            backend = library.kb_writer.backend
+            
+            def key(kb_object):
+                return kb_object.get_path() if type(kb_object) is SourceFile else kb_object.guid
+            
+            return ([(o.name, o.type, key(o.parent), o.guid, o.fullname, key(o.position[0]), tuple(o.position[1])) 
+                     for o in backend.objects],
+                    # file properties come after the objects on replay
+                    sorted((key(o), name, value) for o, name, value in backend.properties),
+                    [(link_type, key(caller), key(callee), key(file), tuple(position)) 
+                     for link_type, caller, callee, file, position in backend.links])
+        
+        # analysis
+        library = create_library()
+        records = {}
+        for module in library.get_modules():
+            module.fully_parse()
+            module.resolve()
+            module.save()
+            links = module.collect_links()
+            module.create_links(links)
+            records[module.get_path()] = json.loads(json.dumps(record_module(module, 'digest', links)))
+            if module.member_file and module.member_file.last_member_path == module.get_path():
+                module.member_file.save(library.kb_writer)
+        library.kb_writer.flush()
+        analysed = get_writes(library)
+        
+        # replay of the same files
+        library = create_library()
+        for module in library.get_modules():
+            replay(module, records[module.get_path()], library)
+            if module.member_file and module.member_file.last_member_path == module.get_path():
+                module.member_file.save(library.kb_writer)
+        library.kb_writer.flush()
+        replayed = get_writes(library)
+        
+        objects, properties, links = analysed
+        self.assertIn('app/LIB.ezt(M2)', [o.get_path() for o in library.get_modules()])
+        self.assertIn('callLink', [link[0] for link in links])
+        self.assertIn('checksum.CodeOnlyChecksum', [p[1] for p in properties])
+        self.assertIn('app/LIB.ezt', [p[0] for p in properties])
+        self.assertEqual(analysed, replayed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import csv, json, os, tempfile, unittest
+from instrumentation import Instrumentation, count_tree
+from easytrieve_parser import parse
+
+
+class TestInstrumentation(unittest.TestCase):
+    
+    def test_phases(self):
+        
+        instrumentation = Instrumentation()
+        with instrumentation.phase('A.ezt', 'parse'):
+            sum(range(100000))
+        instrumentation.add('A.ezt', 'parse', tokens=10, nodes=2)
+        instrumentation.add('B.ezt', 'save', wall=0.0, objects=3)
+        
+        phases = instrumentation.get_phases('A.ezt')
+        self.assertEqual(['parse'], list(phases))
+        self.assertGreater(phases['parse']['wall'], 0)
+        self.assertEqual(10, phases['parse']['tokens'])
+        self.assertEqual(['A.ezt', 'B.ezt'], [path for path, _ in instrumentation.get_slowest(2)])
+        self.assertEqual(1, len(instrumentation.get_slowest(1)))
+    
+    def test_report(self):
+        
+        instrumentation = Instrumentation()
+        instrumentation.add('A.ezt', 'parse', wall=1.5, tokens=10)
+        instrumentation.add('A.ezt', 'save', wall=0.5, objects=3)
+        
+        with tempfile.TemporaryDirectory() as directory:
+            
+            path = os.path.join(directory, 'timings.json')
+            instrumentation.save_report(path)
+            with open(path) as f:
+                report = json.load(f)
+            self.assertEqual(10, report['files']['A.ezt']['parse']['tokens'])
+            self.assertEqual(2.0, sum(total['wall'] for total in report['totals'].values()))
+            
+            path = os.path.join(directory, 'timings.csv')
+            instrumentation.save_report(path)
+            with open(path) as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual(['parse', 'save'], [row['phase'] for row in rows])
+            self.assertEqual('3', rows[1]['objects'])
+    
+    def test_count_tree(self):
+        
+        ast = list(parse("""*
+FILE PERSNL
+JOB INPUT PERSNL
+"""))
+        counts = count_tree(ast)
+        self.assertGreater(counts['nodes'], 2)
+        self.assertGreater(counts['tokens'], counts['nodes'])
+        self.assertEqual({'tokens':0, 'nodes':0}, count_tree(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
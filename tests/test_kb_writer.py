@@ -0,0 +1,95 @@
+import unittest
+from kb_writer import KbWriter, LocalBackend
+from symbols import Library, Module, MemberFile
+
+
+class SourceFile:
+    """
+    Stands for the file given by the analyser.
+    """
+    def get_path(self):
+        return 'PGM.ezt'
+
+
+class TestKbWriter(unittest.TestCase):
+    
+    def test_batches(self):
+        
+        backend = LocalBackend()
+        writer = KbWriter(backend, batch_size=3)
+        
+        parent = writer.create_object('A', 'Eztprogram', None, 'A', 'A')
+        writer.save_property(parent, 'metric.CodeLinesCount', 10)
+        self.assertEqual([], backend.objects)
+        
+        child = writer.create_object('B', 'Easyproc', parent, 'A.B', 'A.B')
+        self.assertEqual([parent, child], backend.objects)
+        self.assertEqual([(parent, 'metric.CodeLinesCount', 10)], backend.properties)
+        self.assertEqual(parent, child.parent)
+        
+        writer.create_link('callLink', parent, child, None, (1, 1, 2, 1))
+        self.assertEqual([], backend.links)
+        writer.flush()
+        self.assertEqual([('callLink', parent, child, None, (1, 1, 2, 1))], backend.links)
+        
+        self.assertEqual(2, writer.stats['batches'])
+        self.assertEqual(2, writer.stats['objects'])
+    
+    def test_save_module(self):
+        
+        library = Library()
+        backend = LocalBackend()
+        library.kb_writer = KbWriter(backend, batch_size=1000)
+        
+        module = Module('PGM.ezt', _file=SourceFile(), text='''
+* 
+FILE ME7232
+JOB INPUT ME7232
+  PERFORM CLOSE-CUXAD-CURS
+  CALL OTHER
+
+CLOSE-CUXAD-CURS. PROC.
+END-PROC.
+''')
+        library.add_module(module)
+        module.fully_parse()
+        module.resolve()
+        module.save()
+        module.create_links(module.collect_links())
+        library.kb_writer.flush()
+        
+        self.assertEqual(['PGM', 'ME7232', 'CLOSE-CUXAD-CURS', 'OTHER'], [kb_object.name for kb_object in backend.objects])
+        self.assertEqual([('accessReadLink', 'ME7232'), ('callLink', 'CLOSE-CUXAD-CURS'), ('callLink', 'OTHER')], 
+                         [(link[0], link[2].name) for link in backend.links])
+
+    def test_save_members(self):
+        
+        library = Library()
+        backend = LocalBackend()
+        library.kb_writer = KbWriter(backend, batch_size=1000)
+        
+        source_file = SourceFile()
+        member_file = MemberFile(source_file, 'PGM.ezt(B)')
+        members = [Module('PGM.ezt(A)', source_file, '* first\nJOB INPUT NULL\n  STOP\n', 'A', 2),
+                   Module('PGM.ezt(B)', source_file, 'JOB INPUT NULL\n  DISPLAY 1\n  STOP\n', 'B', 6)]
+        for member in members:
+            member.member_file = member_file
+            library.add_module(member)
+            member.fully_parse()
+            member.resolve()
+            member.save()
+        library.kb_writer.flush()
+        self.assertEqual([], [p for p in backend.properties if p[0] is source_file])
+        
+        member_file.save(library.kb_writer)
+        library.kb_writer.flush()
+        
+        file_properties = [(name, value) for kb_object, name, value in backend.properties if kb_object is source_file]
+        names = [name for name, _ in file_properties]
+        self.assertEqual(len(set(names)), len(names))
+        counts = [dict(member.get_file_properties())['metric.CodeLinesCount'] for member in members]
+        self.assertEqual(sum(counts), dict(file_properties)['metric.CodeLinesCount'])
+
+
+if __name__ == "__main__":
+    unittest.main()
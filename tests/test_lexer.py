@@ -1,5 +1,19 @@
 import unittest
-from lexer import EasyTrieveLexer, Comment, SQLText, String, Keyword
+import os, glob, pickle
+from unittest import mock
+import lexer as lexer_module
+from lexer import EasyTrieveLexer, get_logical_lines, Comment, SQLText, String, Keyword, Generic
+from light_parser.splitter import default_backend
+
+
+def get_tokens(text, backend, splitter='python'):
+    
+    lexer = EasyTrieveLexer()
+    lexer.backend = backend
+    lexer.splitter = splitter
+    return [(token.text, token.type, token.begin_line, token.begin_column, token.end_line, token.end_column, 
+             token.is_whitespace(), token.is_comment(), token.lower_text) 
+            for token in lexer.get_tokens(text)]
 
 
 class TestLexer(unittest.TestCase):
@@ -138,5 +152,152 @@ SORT UT01 TO UT01 USING (IN-REC)
         self.assertEqual(11, tokens[18].get_end_line())
 
 
+    def test_sql_with_comment_inside(self):
+
+        text = """ SQL SELECT A +
+* comment
+     FROM T +
+   INTO :A
+ DISPLAY A
+"""
+        for backend in ['regex', 'splitter']:
+            tokens = [token for token in get_tokens(text, backend) if not token[6]]
+            self.assertEqual(('SQL', Keyword, 1, 2, 1, 4), tokens[0][:6])
+            self.assertEqual(Comment, tokens[1][1])
+            self.assertEqual((' SELECT A\n     FROM T\n   INTO :A', SQLText, 1, 5, 4, 10), tokens[2][:6])
+            self.assertEqual('DISPLAY', tokens[3][0])
+
+    def test_logical_lines(self):
+
+        lines = """* comment
+ DISPLAY A +
+* continued
+   B -
+ C
+ SQL COMMIT +""".split('\n')
+        logical_lines = list(get_logical_lines(lines, 10))
+        
+        self.assertEqual([[(10, '* comment', None, False)], 
+                          [(11, ' DISPLAY A +', ' DISPLAY A ', True), 
+                           (12, '* continued', None, False), 
+                           (13, '   B -', '   B ', True), 
+                           (14, ' C', ' C', False)], 
+                          [(15, ' SQL COMMIT +', ' SQL COMMIT ', True)]], 
+                         logical_lines)
+        
+        lexer = EasyTrieveLexer()
+        lexer.first_line = 10
+        tokens = list(lexer.get_tokens('\n'.join(lines)))
+        # SQL continued at the end of the text
+        self.assertEqual('SQL', tokens[-1].text)
+
+
+    def test_backends(self):
+        
+        text = """
+* comment
+FILE FILEA SQL SELECT 'X' +
+   FROM T
+  DISPLAY 'IT''S' 'A+
+ SQL COMMIT' SQL +
+   COMMIT
+  SQLCODE = 0  \r
+ W-A W 2 A VALUE 'AB'.'
+"""
+        self.assertEqual(get_tokens(text, 'splitter'), get_tokens(text, 'regex'))
+    
+    def test_unavailable_backends(self):
+        
+        text = "FILE FILEA\n  F1 1 2 A VALUE 'X'\n"
+        settings = {'EASYTRIEVE_LEXER':'splitter', 'EASYTRIEVE_SPLITTER':'unknown'}
+        with mock.patch.dict(os.environ, settings), mock.patch.object(lexer_module, 'log') as log, \
+             mock.patch.object(lexer_module, '_warned', set()):
+            lexer = EasyTrieveLexer()
+            self.assertEqual(('splitter', default_backend), (lexer.backend, lexer.splitter))
+            self.assertEqual(get_tokens(text, 'regex'), get_tokens(text, 'splitter', lexer.splitter))
+            # once per process
+            EasyTrieveLexer()
+            self.assertEqual(1, log.warning.call_count)
+        
+        with mock.patch.dict(os.environ, {'EASYTRIEVE_LEXER':'unknown'}):
+            self.assertEqual('regex', EasyTrieveLexer().backend)
+
+    def test_backends_on_samples(self):
+        
+        directory = os.path.join(os.path.dirname(__file__), 'IBM.sample')
+        for path in glob.glob(os.path.join(directory, '*')):
+            with open(path, encoding='latin-1') as f:
+                text = f.read()
+            tokens = get_tokens(text, 'splitter')
+            self.assertEqual(tokens, get_tokens(text, 'regex'), path)
+            self.assertEqual(tokens, get_tokens(text, 'splitter', 'regex'), path)
+
+    
+    def test_text_from_line(self):
+        
+        lexer = EasyTrieveLexer()
+        comment, word, blanks = list(lexer.get_tokens('* COMMENT\nA   B'))[:3]
+        
+        with self.assertRaises(AttributeError):
+            object.__getattribute__(blanks, 'text')
+        self.assertTrue(blanks.is_whitespace())
+        self.assertEqual((2, 2, 2, 4), (blanks.begin_line, blanks.begin_column, blanks.end_line, blanks.end_column))
+        self.assertEqual('   ', blanks.text)
+        self.assertEqual('* comment', comment.lower_text)
+        self.assertEqual('* COMMENT', comment.text)
+        
+        blanks = list(lexer.get_tokens('A   B'))[1]
+        self.assertEqual('   ', pickle.loads(pickle.dumps(blanks)).text)
+
+    
+    def test_shared_texts(self):
+        
+        lexer = EasyTrieveLexer()
+        tokens = [token for token in lexer.get_tokens('* COMMENT\nPERFORM Proc1\nPERFORM proc1 1\n') if not token.is_whitespace()]
+        perform1, proc1, perform2, proc2, one = tokens[1:]
+        
+        self.assertIs(perform1.text, perform2.text)
+        self.assertIs(perform1.lower_text, perform2.lower_text)
+        self.assertEqual('proc1', proc1.lower_text)
+        # already in lower case
+        self.assertIs(proc2.text, proc2.lower_text)
+        self.assertIs(one.text, one.lower_text)
+        
+        self.assertFalse(hasattr(one, '__dict__'))
+        copy = pickle.loads(pickle.dumps(proc1))
+        self.assertEqual((proc1.text, proc1.type, proc1.begin_line, proc1.begin_column, proc1.end_line, proc1.end_column, proc1.lower_text), 
+                         (copy.text, copy.type, copy.begin_line, copy.begin_column, copy.end_line, copy.end_column, copy.lower_text))
+        self.assertIs(Generic, copy.type)
+
+    
+    def test_without_whitespace(self):
+        
+        text = "  FILE FILEA   \n   \nF1 1 2 A"
+        lexer = EasyTrieveLexer()
+        lexer.whitespace = False
+        tokens = [(token.text, token.begin_line, token.begin_column) for token in lexer.get_tokens(text)]
+        
+        # blanks starting a line are kept
+        self.assertEqual([('  ', 1, 1), ('FILE', 1, 3), ('FILEA', 1, 8), 
+                          ('   ', 2, 1), 
+                          ('F1', 3, 1), ('1', 3, 4), ('2', 3, 6), ('A', 3, 8)], tokens)
+    
+    def test_without_whitespace_on_samples(self):
+        
+        directory = os.path.join(os.path.dirname(__file__), 'IBM.sample')
+        for path in glob.glob(os.path.join(directory, '*.ezt')):
+            with open(path, encoding='latin-1') as f:
+                text = f.read()
+            for backend in ['regex', 'splitter']:
+                lexer = EasyTrieveLexer()
+                lexer.backend = backend
+                lexer.whitespace = False
+                # blanks inside lines are dropped
+                tokens = [token for token in get_tokens(text, backend) if not (token[1] is Generic and token[6] and token[3] > 1)]
+                self.assertEqual(tokens, [(token.text, token.type, token.begin_line, token.begin_column, token.end_line, token.end_column, 
+                                           token.is_whitespace(), token.is_comment(), token.lower_text) 
+                                          for token in lexer.get_tokens(text)], path)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import os, glob, tempfile
+from unittest import mock
+import mapping
+from mapping import MappedLines, is_supported
+from scheduling import measure_size
+from symbols import Module
+from easytrieve_parser import parse
+
+
+class TestMapping(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+
+        self.directory.cleanup()
+
+    def write(self, data):
+
+        path = os.path.join(self.directory.name, 'PROGA.ezt')
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_lines(self):
+
+        for text in ['', '\n', 'A', 'A\n', 'A\r\nB\n\nC', "FILE FILEA\n* \xe9t\xe9\n"]:
+            path = self.write(text.encode('latin-1'))
+            self.assertEqual(text.replace('\r\n', '\n').split('\n'), list(MappedLines(path)), repr(text))
+
+    def test_chunks(self):
+
+        text = 'FILE FILEA\n  F1 1 2 A\n\nJOB INPUT FILEA\n'
+        path = self.write(text.encode('latin-1'))
+        with mock.patch.object(mapping, 'chunk_size', 3):
+            self.assertEqual(text.split('\n'), list(MappedLines(path)))
+            self.assertEqual(measure_size(text), MappedLines(path).measure_size())
+
+    def test_ebcdic(self):
+
+        text = "FILE FILEA\n  F1 1 2 A VALUE '\xe9'\n SQL SELECT 1\n"
+        for encoding in ['cp037', 'cp500']:
+            path = self.write(text.encode(encoding))
+            self.assertEqual(text.split('\n'), list(MappedLines(path, encoding)), encoding)
+            self.assertEqual(measure_size(text), MappedLines(path, encoding).measure_size(), encoding)
+
+    def test_size_measured_while_iterated(self):
+
+        text = "FILE FILEA\n  F1 1 2 A\n SQL SELECT 1\n"
+        path = self.write(text.encode('cp037'))
+        lines = MappedLines(path, 'cp037')
+        with mock.patch.object(MappedLines, 'get_chunks', side_effect=MappedLines.get_chunks, autospec=True) as get_chunks:
+            self.assertEqual(text.split('\n'), list(lines))
+            self.assertEqual(measure_size(text), lines.measure_size())
+        # file read once
+        self.assertEqual(1, get_chunks.call_count)
+
+        records = [line.ljust(80) for line in text.rstrip('\n').split('\n')]
+        path = self.write(''.join(records).encode('cp037'))
+        lines = MappedLines(path, 'cp037', record_length=80)
+        expected = lines.measure_size()
+        self.assertEqual(records, list(lines))
+        self.assertEqual(expected, lines.measure_size())
+
+    def test_is_supported(self):
+
+        self.assertTrue(is_supported('ascii'))
+        self.assertTrue(is_supported('cp037'))
+        self.assertFalse(is_supported('utf-8'))
+        self.assertFalse(is_supported('unknown'))
+
+    def test_parse_samples(self):
+
+        directory = os.path.join(os.path.dirname(__file__), 'IBM.sample')
+        for path in glob.glob(os.path.join(directory, '*.ezt')):
+            with mock.patch.dict(os.environ, {'EASYTRIEVE_LARGE_FILE_SIZE':'0.000001'}):
+                lines = Module(path).get_lines()
+            self.assertIsInstance(lines, MappedLines)
+
+            expected = [str(node) for node in parse(Module(path).get_text())]
+            self.assertEqual(expected, [str(node) for node in parse(lines)], path)
+
+    def test_declarations_of_lines(self):
+
+        path = os.path.join(os.path.dirname(__file__), 'IBM.sample', 'DEMOESY2.ezt')
+        module = Module(path)
+        expected = module.parse_declarations(module.get_text())
+
+        module = Module(path)
+        with mock.patch.object(MappedLines, 'get_chunks', side_effect=MappedLines.get_chunks, autospec=True) as get_chunks:
+            tree = module.parse_declarations(MappedLines(path))
+        self.assertEqual(1, get_chunks.call_count)
+        self.assertTrue(module.declarations)
+        self.assertEqual([(type(node), node.get_begin_line()) for node in expected.get_children()],
+                         [(type(node), node.get_begin_line()) for node in tree.get_children()])
+        self.assertEqual(expected.get_end_line(), tree.get_end_line())
+
+    def test_small_files_are_read(self):
+
+        path = os.path.join(os.path.dirname(__file__), 'IBM.sample', 'DEMODB2A.ezt')
+        self.assertIsInstance(Module(path).get_lines(), str)
+
+
+if __name__ == "__main__":
+    unittest.main()
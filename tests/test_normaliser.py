@@ -0,0 +1,43 @@
+import unittest
+import os
+from unittest import mock
+from normaliser import normalise
+from symbols import Module
+
+
+class TestNormaliser(unittest.TestCase):
+
+    def test_normalise(self):
+
+        text = "FILE FILEA  \r\n" + "\tF1 1 2 A".ljust(72) + "00000020\r\nJOB INPUT FILEA\n"
+        self.assertEqual("FILE FILEA\n F1 1 2 A\nJOB INPUT FILEA\n", normalise(text))
+        self.assertEqual("FILE FILEA\n" + " F1 1 2 A".ljust(72) + "00000020\nJOB INPUT FILEA\n", normalise(text, 0))
+
+    def test_positions(self):
+
+        text = "* comment\n" + "FILE FILEA".ljust(72) + "SEQ00002\n\tF1 1 2 A\nJOB INPUT FILEA\n"
+        module = Module('PROGA.ezt', text=normalise(text))
+        module.fully_parse()
+
+        file = module.find_local_symbols('FILEA')[0].get_ast()
+        self.assertEqual(2, file.get_begin_line())
+        tokens = [token for token in file.get_children() if not token.is_whitespace()]
+        # no token for the sequence number
+        self.assertEqual(['FILE', 'FILEA', 'F1', '1', '2', 'A'], [token.text for token in tokens])
+        self.assertEqual((3, 2), (tokens[2].begin_line, tokens[2].begin_column))
+
+    def test_module_text(self):
+
+        path = os.path.join(os.path.dirname(__file__), 'IBM.sample', 'DEMOESY2.ezt')
+        text = Module(path).get_text()
+        self.assertTrue(any(len(line) > 72 for line in text.split('\n')))
+
+        with mock.patch.dict(os.environ, {'EASYTRIEVE_NORMALISE':'1'}):
+            normalised_text = Module(path).get_text()
+        self.assertEqual(text.count('\n'), normalised_text.count('\n'))
+        self.assertFalse(any(len(line) > 72 for line in normalised_text.split('\n')))
+        self.assertNotIn('00002230', normalised_text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+import os
+from unittest import mock
+from symbols import Library, Module, Procedure, UnknownProgram
+from parallel import analyse_modules
+from budget import Budget
+import light_parser
+
+
+def create_library():
+    
+    library = Library()
+    library.add_module(Module('PGM1.ezt', text='''
+JOB INPUT NULL
+  CALL PGM2
+  CALL UNKNOWN1
+  PERFORM P1
+
+P1. PROC
+  DISPLAY 'P1'
+END-PROC
+'''))
+    library.add_module(Module('PGM2.ezt', text='''
+FILE FILE1
+JOB INPUT FILE1
+  PUT FILE1
+'''))
+    return library
+
+
+def describe(links):
+    
+    return [(link_type, caller.get_name(), type(callee).__name__, callee.get_name(), position) 
+            for link_type, caller, callee, position in links]
+
+
+class KillingBudget(Budget):
+    """
+    Kills the worker parsing KILL, as the system does when out of memory.
+    """
+    def check_tokens(self, tokens, check_time=None):
+        
+        for token in Budget.check_tokens(self, tokens, check_time):
+            if token.text == 'KILL':
+                os._exit(1)
+            yield token
+
+
+class TestParallel(unittest.TestCase):
+
+    def test_same_as_serial(self):
+        
+        serial = []
+        library = create_library()
+        for module in library.get_modules():
+            module.fully_parse()
+            module.resolve()
+            serial.append(describe(module.collect_links()))
+        
+        parallel = []
+        library = create_library()
+        for module, links, error in analyse_modules(library, 2):
+            self.assertIsNone(error)
+            parallel.append(describe(links))
+        
+        self.assertEqual(serial, parallel)
+        
+    def test_match_stats(self):
+        
+        with mock.patch.object(light_parser, 'match_stats', light_parser.defaultdict(int)):
+            for module in create_library().get_modules():
+                module.fully_parse()
+            serial = dict(light_parser.match_stats)
+        
+        with mock.patch.object(light_parser, 'match_stats', light_parser.defaultdict(int)):
+            list(analyse_modules(create_library(), 2))
+            parallel = dict(light_parser.match_stats)
+        
+        # counted by the workers, added in the main process
+        self.assertTrue(serial['attempted'])
+        self.assertEqual(serial, parallel)
+        
+    def test_scheduled_order(self):
+        
+        library = create_library()
+        modules = library.get_modules()
+        
+        # given to workers in reverse order, yielded in library order
+        results = list(analyse_modules(library, 1, order=list(reversed(modules))))
+        
+        self.assertEqual(modules, [module for module, _, _ in results])
+        self.assertEqual([None, None], [error for _, _, error in results])
+        
+    def test_window(self):
+        
+        library = Library()
+        for index in range(10):
+            library.add_module(Module('PGM%d.ezt' % index, text="JOB INPUT NULL\n  DISPLAY 'A'\n"))
+        modules = library.get_modules()
+        ast_cache = mock.Mock()
+        ast_cache.pop_data.return_value = None
+        
+        results = analyse_modules(library, 1, ast_cache, order=list(reversed(modules)))
+        for received, (module, _, error) in enumerate(results):
+            self.assertIsNone(error)
+            # at most 4 modules per worker in flight
+            self.assertLessEqual(ast_cache.pop_data.call_count - received, 4)
+        
+        # the last modules of the library come first in scheduled order, 
+        # one slot is left for the modules in library order
+        self.assertEqual([9, 8, 7, 0, 1, 2, 3, 4, 5, 6], 
+                         [modules.index(library.find_module_by_path(call.args[0])) for call in ast_cache.pop_data.call_args_list])
+        
+    def test_symbols_are_reattached(self):
+        
+        library = create_library()
+        pgm1, pgm2 = library.get_modules()
+        
+        results = list(analyse_modules(library, 2))
+        
+        _, links, _ = results[0]
+        
+        # call to the other module is resolved to the module of the library
+        self.assertIs(pgm2, links[0][2])
+        # unknown program is not yet in the symbols, it will be on link creation
+        self.assertEqual(UnknownProgram, type(links[1][2]))
+        self.assertFalse(pgm1.find_local_symbols('UNKNOWN1'))
+        
+        procedure = pgm1.find_local_symbols('P1', [Procedure])[0]
+        self.assertIs(pgm1, procedure.get_parent_symbol())
+        self.assertIs(procedure, links[2][2])
+
+    
+    def test_killed_worker(self):
+        
+        library = create_library()
+        library.add_module(Module('PGM3.ezt', text="JOB INPUT NULL\n  DISPLAY KILL\n"))
+        library.add_module(Module('PGM4.ezt', text="JOB INPUT NULL\n  DISPLAY 'PGM4'\n"))
+        
+        results = list(analyse_modules(library, 2, budget=KillingBudget()))
+        
+        # iteration stops on the first module lost with the pool
+        *analysed, (module, links, error) = results
+        self.assertLessEqual(len(results), 3)
+        self.assertEqual([None] * len(analysed), [error for _, _, error in analysed])
+        self.assertIn('BrokenProcessPool', error)
+        self.assertEqual([], links)
+
+
+if __name__ == "__main__":
+    unittest.main()
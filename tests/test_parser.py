@@ -1,4 +1,11 @@
 import unittest
+import os, glob, functools
+from unittest import mock
+import light_parser
+from light_parser import Node, Token, Lookahead, Seq, Or, Optional, Not, NotFollowedBy, Any, Repeat
+from light_parser import StatementFilter, get_second_admissible_tokens
+from lexer import EasyTrieveLexer, Generic
+from symbols import Module
 from easytrieve_parser import parse, Macro, Procedure, Program, File, Job, Sort, Data, SQL
 from easytrieve_parser import Put, Write
 
@@ -258,8 +265,169 @@ PRINT REPORT1
         self.assertEqual('PERSNL', jobs[0].get_sorted().get_name())
         self.assertEqual('SORTWRK', jobs[0].get_to().get_name())
 
+    def test_parse_without_whitespace(self):
+        
+        def get_lines(node):
+            result = [(type(node).__name__, node.get_begin_line(), node.get_begin_column(), node.get_end_line())]
+            for sub_node in node.get_sub_nodes():
+                result += get_lines(sub_node)
+            return result
+        
+        def get_metrics(path, text):
+            module = Module(path, text=text)
+            module.fully_parse()
+            return (get_lines(module.get_ast()), module.get_line_count(), module.get_code_only_crc(), 
+                    [comment.text for comment in module.get_body_comments()], module.get_header_comments_line_count())
+        
+        directory = os.path.join(os.path.dirname(__file__), 'IBM.sample')
+        for path in glob.glob(os.path.join(directory, '*.ezt')):
+            with open(path, encoding='latin-1') as f:
+                text = f.read()
+            with mock.patch.dict(os.environ, {'EASYTRIEVE_WHITESPACE_TOKENS':'1'}):
+                expected = get_metrics(path, text)
+            with mock.patch.dict(os.environ, {'EASYTRIEVE_WHITESPACE_TOKENS':'0'}):
+                self.assertEqual(expected, get_metrics(path, text), path)
+
+    def test_compiled_patterns(self):
+        
+        def interpreted(pattern):
+            return functools.partial(Node.do_match, pattern)
+        
+        def match(pattern, text):
+            tokens = [token for token in EasyTrieveLexer().get_tokens(text) if not token.is_whitespace()]
+            stream = Lookahead(tokens[1:])
+            result = Node._match(pattern, tokens[0], stream)
+            if type(result) is list:
+                result = [token.text for token in result]
+            return result, [token.text for token in stream]
+        
+        patterns = ['PUT', Generic, Token('PUT', Generic), Any(), None, 
+                    Seq('PUT', Generic), Seq('PUT', Optional('.'), Generic), Seq('PUT', Optional('FROM')), 
+                    Seq('USING', NotFollowedBy('(')), Seq('PUT', Not('FROM'), Generic), 
+                    Or(Seq('PUT', 'FROM'), Seq('PUT', Generic)), Seq('PUT', Repeat(Or('A', 'B')), 'FROM'), 
+                    lambda token: token.text == 'PUT', lambda token, stream: next(stream).text == 'FILEA']
+        texts = ['PUT FILEA FROM FILEB', 'PUT . FILEA', 'PUT FROM', 'PUT', "'PUT' FILEA", 'USING (A)', 'USING A', 
+                 'PUT A B A FROM', 'PUT A C FROM', 'GET FILEA']
+        for pattern in patterns:
+            for text in texts:
+                with mock.patch.object(light_parser, 'get_matcher', interpreted):
+                    expected = match(pattern, text)
+                self.assertEqual(expected, match(pattern, text), (pattern, text))
+    
+    def test_compiled_patterns_on_samples(self):
+        
+        def dump(node):
+            if type(node) is Token:
+                return (node.text, node.begin_line, node.begin_column)
+            return (type(node).__name__, [dump(child) for child in node.children])
+        
+        directory = os.path.join(os.path.dirname(__file__), 'IBM.sample')
+        for path in glob.glob(os.path.join(directory, '*.ezt')):
+            with open(path, encoding='latin-1') as f:
+                text = f.read()
+            with mock.patch.object(light_parser, 'get_matcher', lambda pattern: functools.partial(Node.do_match, pattern)):
+                expected = [dump(node) for node in parse(text)]
+            self.assertEqual(expected, [dump(node) for node in parse(text)], path)
+
+    def test_second_admissible_tokens(self):
+        
+        self.assertEqual({'w', 'f', 'c', 's'}, set(get_second_admissible_tokens(Data.begin)))
+        self.assertEqual({'.', 'proc'}, set(get_second_admissible_tokens(Procedure.begin)))
+        self.assertIsNone(get_second_admissible_tokens(Program.begin))
+        self.assertIsNone(get_second_admissible_tokens(File.begin))
+        self.assertIsNone(get_second_admissible_tokens(Seq(Any(), Optional('.'))))
+    
+    def test_dispatch_on_second_token(self):
+        
+        statement_filter = StatementFilter([Program, Data, Procedure, File])
+        
+        def get_candidates(text):
+            stream = Lookahead(EasyTrieveLexer().get_tokens(text))
+            token = next(stream)
+            candidates = statement_filter.get_current_statements(token, stream)
+            # the stream is unchanged
+            self.assertEqual(text.split(), [token.text] + [token.text for token in stream if not token.is_whitespace()])
+            return candidates
+        
+        self.assertEqual([Program, Data], get_candidates('WS-A W 4 A'))
+        self.assertEqual([Program, Procedure], get_candidates('PROCA . PROC'))
+        self.assertEqual([Program, Procedure], get_candidates('PROCA PROC'))
+        self.assertEqual([File, Program], get_candidates('FILE FILEA'))
+        self.assertEqual([Program], get_candidates('PROCA'))
+
+    def test_match_stats(self):
+        
+        text = """* comment
+FILE FILEA
+  F1 1 2 A
+WS-A W 4 A
+JOB INPUT FILEA
+  PERFORM PROCA
+PROCA . PROC
+END-PROC
+"""
+        with mock.patch.object(light_parser, 'match_stats', light_parser.defaultdict(int)):
+            expected = [str(node) for node in parse(text)]
+            stats = dict(light_parser.match_stats)
+        # no end for FILE, Data, Job : never attempted
+        self.assertGreater(stats['skipped'], stats['attempted'])
+        
+        with mock.patch.object(light_parser, 'get_possible_texts', lambda pattern: None):
+            self.assertEqual(expected, [str(node) for node in parse(text)])
+
+    def test_fused_parser(self):
+        
+        def dump(node):
+            if type(node) is Token:
+                return (node.text, node.type, node.begin_line, node.begin_column)
+            return (type(node).__name__, node.header_comments_length, node.header_length, node.begin_length, node.end_length, 
+                    [dump(child) for child in node.children])
+        
+        def get_nodes(text, fused):
+            with mock.patch.dict(os.environ, {'EASYTRIEVE_FUSED_PARSER':fused}):
+                return [dump(node) for node in parse(text)]
+        
+        directory = os.path.dirname(__file__)
+        paths = glob.glob(os.path.join(directory, '**', '*.ezt'), recursive=True) + \
+                glob.glob(os.path.join(directory, '**', '*.esy'), recursive=True)
+        texts = []
+        for path in paths:
+            with open(path, encoding='latin-1') as f:
+                texts.append(f.read())
+        texts += ['', 'FILE', '* comment\n', 'FILE FILEA\n* comment\n\n  * comment\n', 
+                  '* comment\nJOB INPUT FILEA\n  * comment\n  PERFORM PROCA\n  PUT\n', 
+                  '* comment\nWS-A W 4 A\nPROCA. PROC\n* comment\n  GET FILEA\nEND-PROC\nSQL SELECT 1 +\n  FROM T\n']
+        
+        for text in texts:
+            self.assertEqual(get_nodes(text, '0'), get_nodes(text, '1'), text[:200])
+    
+    def test_can_fuse(self):
+        
+        parser = light_parser.Parser(EasyTrieveLexer, [Program], [File, Data, Procedure], [Put, Write])
+        self.assertTrue(parser.can_fuse())
+        self.assertFalse(light_parser.Parser(EasyTrieveLexer, [Macro]).can_fuse())
+        self.assertFalse(light_parser.Parser(EasyTrieveLexer, [File], [Put]).can_fuse())
+        self.assertFalse(light_parser.Parser(EasyTrieveLexer, [Program], [Program]).can_fuse())
+    
+    def test_shared_grammar(self):
+        
+        statement_filter = StatementFilter([File, Data, Procedure])
+        self.assertIs(statement_filter.grammar, StatementFilter([File, Data, Procedure]).grammar)
+        self.assertIs(statement_filter.grammar, statement_filter._get_clone(Procedure()).grammar)
+        
+        # contextual grammar : tables of all the matching contexts
+        statement_filter = StatementFilter({Procedure:[Put], Job:[Write], Program:[Put, Write]})
+        self.assertEqual([], statement_filter.terms)
+        clone = statement_filter._get_clone(Procedure())
+        self.assertEqual([Put], clone.terms)
+        self.assertIs(clone.grammar, statement_filter._get_clone(Procedure()).grammar)
+        self.assertEqual([Write], statement_filter._get_clone(Job()).terms)
+        
+        # parsing does not modify the tables
+        tables = {text:list(nodes) for text, nodes in clone.grammar.text_to_terms.items()}
+        list(parse("PROC1. PROC\nPUT FILEA\nDISPLAY 'A'\nEND-PROC\n"))
+        self.assertEqual(tables, clone.grammar.text_to_terms)
 
 
 if __name__ == "__main__":
     unittest.main()
-
@@ -68,6 +68,37 @@ END-PROC
 
         self.assertEqual([file],identifier.resolved_as)
 
+    def test_resolve_call_to_released_module(self):
+        
+        lib = Library()
+        
+        called = Module('app/B.ezt', text='''
+* 
+FILE ME7232
+
+EXTRACT-ROUTINE. PROC
+  PUT ME7232
+END-PROC      
+''')
+        lib.add_module(called)
+        caller = Module('app/A.ezt', text='''
+JOB INPUT NULL
+  CALL B
+''')
+        lib.add_module(caller)
+        
+        called.fully_parse()
+        called.resolve()
+        called.release()
+        
+        self.assertEqual([], called.get_all_symbols())
+        self.assertIsNone(called.get_ast())
+        
+        caller.fully_parse()
+        caller.resolve()
+        
+        links = caller.collect_links()
+        self.assertEqual([called], [callee for _, _, callee, _ in links])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,47 @@
+import unittest
+from unittest import mock
+import scheduling
+from scheduling import Size, measure_size, Scheduler, LargestFirst, CostWeighted, get_scheduler
+from symbols import Module
+
+
+def create_module(name, text):
+    
+    module = Module(name, text=text)
+    module.size = measure_size(text)
+    return module
+
+
+class TestScheduling(unittest.TestCase):
+    
+    def test_measure_size(self):
+        
+        self.assertEqual(Size(51, 4, 2), measure_size('''JOB INPUT NULL
+  SQL SELECT 1
+  SQL FETCH
+  SQLCODE'''))
+    
+    def test_order(self):
+        
+        small = create_module('SMALL.ezt', 'JOB INPUT NULL')
+        large = create_module('LARGE.ezt', 'JOB INPUT NULL\n' * 100)
+        sql = create_module('SQL.ezt', 'SQL SELECT 1\n' * 20)
+        unknown = Module('UNKNOWN.ezt', text='')
+        modules = [small, unknown, sql, large]
+        
+        self.assertEqual(modules, Scheduler().order(modules))
+        self.assertEqual([large, sql, small, unknown], LargestFirst().order(modules))
+        self.assertEqual([sql, large, small, unknown], CostWeighted(line_weight=0).order(modules))
+        self.assertEqual(0, CostWeighted().predict_cost(None))
+    
+    def test_get_scheduler(self):
+        
+        self.assertEqual(CostWeighted, type(get_scheduler('cost')))
+        # misspelt setting
+        with mock.patch.object(scheduling, 'log') as log:
+            self.assertEqual(CostWeighted, type(get_scheduler('larget')))
+        self.assertEqual(1, log.warning.call_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import os
+from sniffer import sniff, split_members, Member, PROGRAM, MACRO, IEBUPDTE, JCL, COBOL, DATA
+from symbols import Module
+
+
+class TestSniffer(unittest.TestCase):
+
+    def test_sniff(self):
+
+        self.assertEqual(PROGRAM, sniff('* comment\nFILE FILEA\n'))
+        self.assertEqual(PROGRAM, sniff(''))
+        self.assertEqual(MACRO, sniff("MACRO 0 LOC()\n"))
+        self.assertEqual(MACRO, sniff("BEGIN_PROGRAM(EZTCOPYA)\nMACRO 0 LOC()\n"))
+        self.assertEqual(JCL, sniff("\n//JOB1 JOB\n//STEP1 EXEC PGM=EZTPA00\n"))
+        self.assertEqual(COBOL, sniff("       IDENTIFICATION DIVISION.\n       PROGRAM-ID. A.\n"))
+        self.assertEqual(COBOL, sniff("       PROCESS ADV\n"))
+        self.assertEqual(DATA, sniff("AB\0\0CD"))
+        self.assertEqual(IEBUPDTE, sniff("./ ADD NAME=PROGA\nJOB INPUT NULL\n"))
+
+    def test_commented_division(self):
+
+        self.assertEqual(PROGRAM, sniff("* IDENTIFICATION DIVISION of the called program\nJOB INPUT NULL\n"))
+
+    def test_quoted_division(self):
+
+        self.assertEqual(PROGRAM, sniff("JOB INPUT NULL\n  DISPLAY 'ID DIVISION.'\n"))
+        self.assertEqual(PROGRAM, sniff("JOB INPUT NULL\n  DISPLAY 'HEADER +\nID DIVISION.'\n"))
+        self.assertEqual(COBOL, sniff("000100 IDENTIFICATION DIVISION.\n000200 PROGRAM-ID. A.\n"))
+
+    def test_sniff_samples(self):
+
+        directory = os.path.join(os.path.dirname(__file__), 'IBM.sample')
+        for name in ['DEMODB2A.ezt', 'DEMOESY3.ezt']:
+            self.assertEqual(PROGRAM, sniff(Module(os.path.join(directory, name)).get_text_prefix()))
+        self.assertEqual(MACRO, sniff(Module(os.path.join(directory, 'EZTCOPYA.ezt')).get_text_prefix()))
+        self.assertEqual(COBOL, sniff(Module(os.path.join(directory, 'DEMODB2A.COB')).get_text_prefix()))
+        self.assertEqual(IEBUPDTE, sniff(Module(os.path.join(directory, 'DEMOESY3.JCL')).get_text_prefix()))
+
+    def test_split_members(self):
+
+        members = split_members("""./ ADD NAME=PROGA
+JOB INPUT NULL
+./ NUMBER NEW1=10
+  DISPLAY 1
+./ ADD NAME=PROGB,LIST=ALL
+JOB INPUT NULL
+./ ENDUP
+""")
+        self.assertEqual([Member('PROGA', 2, 'JOB INPUT NULL\n\n  DISPLAY 1'),
+                          Member('PROGB', 6, 'JOB INPUT NULL\n\n')],
+                         members)
+
+    def test_member_positions(self):
+
+        member = split_members("""./ ADD NAME=PROGA
+* comment
+FILE FILEA
+F1 1 2 A
+JOB INPUT FILEA
+""")[0]
+        module = Module('LIB.ezt(PROGA)', text=member.text, name=member.name, first_line=member.first_line)
+        module.fully_parse()
+
+        self.assertEqual('PROGA', module.get_name())
+        self.assertEqual('LIB.ezt(PROGA)', module.get_path())
+        self.assertEqual(2, module.get_ast().get_begin_line())
+        self.assertEqual(3, module.find_local_symbols('FILEA')[0].get_ast().get_begin_line())
+
+        module.light_parse()
+        self.assertEqual([('file', 'FILEA', 3, 6)], [tuple(declaration) for declaration in module.declarations])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import random
+from light_parser.splitter import Splitter, PythonSplitter, RegexSplitter, splitters, default_backend
+
+
+class TestSplitter(unittest.TestCase):
+    
+    def assertSameSplit(self, separators, text):
+        
+        self.assertEqual(PythonSplitter(separators).split(text), RegexSplitter(separators).split(text), repr(text))
+    
+    def test_usage(self):
+        
+        for splitter in [PythonSplitter, RegexSplitter]:
+            self.assertEqual(['IF', ' ', '(', 'VAR', '=', '1', ' ', 'OR', ' ', '2', ')'], 
+                             splitter(['(','=',')']).split("IF (VAR=1 OR 2)"))
+    
+    def test_lexer_separators(self):
+        
+        for text in ["", " ", "A", "W-A  W 2 A VALUE 'X.Y'.", "\tA\r", "  'IT''S'  ", "A.B.", "..''"]:
+            self.assertSameSplit(["'", '.'], text)
+    
+    def test_multi_char_separators(self):
+        
+        separators = ['(', '=>', '=', '==>', ')', 'END IF', '..']
+        for text in ["A=>B", "A==>B", "A===>B", "END IF", "END  IF", "ENDIF", "X..Y...Z", "=>=>(=)", "END IF=>"]:
+            self.assertSameSplit(separators, text)
+    
+    def test_special_separators(self):
+        
+        # regular expression characters and blanks
+        separators = [']', '^', '-', '\\', '*', ' ', ' X', '', '[[']
+        for text in ["A]B^C-D\\E*F", "A X", "[[[A", "- -", "a\\\\b"]:
+            self.assertSameSplit(separators, text)
+    
+    def test_random(self):
+        
+        generator = random.Random(12)
+        characters = "AB'.=>( )\t\r-+* "
+        separators_list = [["'", '.'], ['(', '=>', ')'], ['=', '=>', '==', '(('], []]
+        for _ in range(2000):
+            text = ''.join(generator.choice(characters) for _ in range(generator.randint(0, 30)))
+            for separators in separators_list:
+                self.assertSameSplit(separators, text)
+    
+    def test_split_spans(self):
+        
+        text = "W-A  W 2 A VALUE 'X.Y'."
+        for splitter in [PythonSplitter, RegexSplitter]:
+            spans = splitter(["'", '.']).split_spans(text)
+            self.assertEqual(PythonSplitter(["'", '.']).split(text), [text[start:end] for start, end in spans])
+    
+    def test_default(self):
+        
+        self.assertIs(Splitter, splitters[default_backend])
+        self.assertIn(default_backend, ['native', 'regex'])
+
+
+if __name__ == "__main__":
+    unittest.main()